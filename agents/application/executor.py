@@ -2,10 +2,10 @@ import os
 import json
 import ast
 import re
+from concurrent.futures import ThreadPoolExecutor
 from tabnanny import verbose
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-import math
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -15,10 +15,14 @@ from langchain.agents import agent_types, initialize_agent, AgentType
 
 from agents.polymarket.gamma import GammaMarketClient as Gamma
 from agents.connectors.chroma import PolymarketRAG as Chroma
-from agents.utils.objects import SimpleEvent, SimpleMarket
+from agents.utils.objects import SimpleEvent, SimpleMarket, TradeCandidate
+from agents.application.pipeline import Pipeline, Stage
 from agents.application.prompts import Prompter
 from agents.polymarket.polymarket import Polymarket
 from agents.calculator import calculator
+from agents.connectors.llm_cache import LLMResponseCache
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.utils.tokens import count_tokens, pack_records
 
 def retain_keys(data, keys_to_retain):
     if isinstance(data, dict):
@@ -32,11 +36,69 @@ def retain_keys(data, keys_to_retain):
     else:
         return data
 
+_TRADE_FIELDS = {
+    "price": re.compile(r"price:\s*'?(\d+(?:\.\d+)?)"),
+    "size": re.compile(r"size:\s*'?(\d+(?:\.\d+)?)"),
+    "side": re.compile(r"side:\s*'?(BUY|SELL)", re.IGNORECASE),
+}
+
+
+_FORECAST = re.compile(
+    r"likelihood\s*(?:of\s*)?`?\s*([\d\.]+)\s*(%?)`?(?:\s*for outcome of\s*`?\s*([^`\n\.,]+))?",
+    re.IGNORECASE,
+)
+
+
+def parse_forecast(text: str) -> Optional[tuple]:
+    """ (probability, outcome or None) from a superforecaster answer """
+    match = _FORECAST.search(text)
+    if match is None:
+        return None
+    try:
+        probability = float(match.group(1))
+    except ValueError:
+        return None
+    if match.group(2) or probability > 1:
+        probability /= 100
+    outcome = match.group(3).strip() if match.group(3) else None
+    return probability, outcome
+
+
+def parse_trade_fields(text: str, final: bool = False) -> Optional[dict]:
+    """
+    price/size/side from a one_best_trade answer, None until all three are
+    complete. never raises, it runs as the stop predicate of a stream.
+    final=True parses a finished answer, where a number may end the text
+    """
+    fields = {}
+    for name, pattern in _TRADE_FIELDS.items():
+        match = pattern.search(text)
+        if match is None:
+            return None
+        # a number at the very end ("0.5" or "0.") may still be growing
+        if not final and name != "side" and text[match.end():] in ("", "."):
+            return None
+        fields[name] = match.group(1)
+    try:
+        fields["price"] = float(fields["price"])
+        fields["size"] = float(fields["size"])
+    except ValueError:
+        return None
+    fields["side"] = fields["side"].upper()
+    return fields
+
+
 class Executor:
     def __init__(self, default_model='gpt-3.5-turbo-0125') -> None:
         load_dotenv()
-        max_token_model = {'gpt-3.5-turbo-0125':15000, 'gpt-4-1106-preview':95000}
-        self.token_limit = max_token_model.get(default_model)
+        max_token_model = {'gpt-3.5-turbo-0125':15000, 'gpt-4-1106-preview':95000, 'llama3.1':8192}
+        # token budgets follow the model actually serving requests
+        self.model = "llama3.1"
+        self.num_predict = 512
+        self.temperature = 0.8
+        # chunk prompts in flight at once, ollama also needs OLLAMA_NUM_PARALLEL > 1
+        self.max_concurrency = 4
+        self.token_limit = max_token_model.get(self.model, max_token_model.get(default_model))
         self.prompter = Prompter()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.tools = [calculator]
@@ -45,9 +107,10 @@ class Executor:
         #     temperature=0,
         # )
         self.llm = OllamaLLM(
-            model="llama3.1",
-            temperature = 0.8,
-            num_predict = 512,
+            model=self.model,
+            temperature = self.temperature,
+            num_predict = self.num_predict,
+            num_ctx = self.token_limit,
         )
         self.agent = initialize_agent(
             tools=self.tools,
@@ -56,47 +119,116 @@ class Executor:
             verbose=True
         )
         self.gamma = Gamma()
-        self.chroma = Chroma()
+        # market and event retrieval (filters included) runs on the in-process ann index
+        self.chroma = Chroma(use_ann=True)
         self.polymarket = Polymarket()
+        # identical prompts on an unchanged market are answered from sqlite
+        self.cache = LLMResponseCache(PolymarketDb())
+        self.bypass_cache = False
 
-    def get_llm_response(self, user_input: str) -> str:
+    def _invoke(self, prompt, bypass: Optional[bool] = None) -> str:
+        """ llm.invoke through the response cache, bypass=True always calls the model """
+        if bypass is None:
+            bypass = self.bypass_cache
+        if self.cache is None or bypass:
+            return self.llm.invoke(prompt)
+        key = self.cache.key(self.model, self.temperature, self.num_predict, prompt)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.llm.invoke(prompt)
+            self.cache.put(key, self.model, response)
+        return response
+
+    def _stream(self, prompt, stop_when=None, echo: bool = True, bypass: Optional[bool] = None) -> str:
+        """
+        streams a completion, echoing chunks as they arrive. generation is
+        cancelled as soon as stop_when(text so far) is true. with stop_when
+        the answer is cached under a key naming the condition, so _invoke
+        (which reads the plain prompt key) never gets a truncated completion
+        """
+        if bypass is None:
+            bypass = self.bypass_cache
+        key = stop_key = None
+        if self.cache is not None and not bypass:
+            key = self.cache.key(self.model, self.temperature, self.num_predict, prompt)
+            if stop_when is not None:
+                stop = f"stop:{stop_when.__module__}.{stop_when.__qualname__}"
+                stop_key = self.cache.key(self.model, self.temperature, self.num_predict, prompt, stop=stop)
+            response = self.cache.get(stop_key or key)
+            if response is not None:
+                if echo:
+                    print(response)
+                return response
+
+        text = ""
+        stopped = False
+        stream = self.llm.stream(prompt)
+        try:
+            for chunk in stream:
+                text += chunk
+                if echo:
+                    print(chunk, end="", flush=True)
+                if stop_when is not None and stop_when(text):
+                    stopped = True
+                    break
+        finally:
+            # closing the generator drops the http stream, ollama stops generating
+            stream.close()
+        if echo:
+            print()
+        if stop_key is not None:
+            self.cache.put(stop_key, self.model, text)
+        if key is not None and not stopped:
+            self.cache.put(key, self.model, text)
+        return text
+
+    def get_llm_response(self, user_input: str, stream: bool = False) -> str:
         system_message = SystemMessage(content=str(self.prompter.market_analyst()))
         human_message = HumanMessage(content=user_input)
         messages = [system_message, human_message]
-        result = self.llm.invoke(messages)
+        if stream:
+            return self._stream(messages)
+        result = self._invoke(messages)
         return result
 
     def get_superforecast(
-        self, event_title: str, market_question: str, outcome: str
+        self, event_title: str, market_question: str, outcome: str, stream: bool = False
     ) -> str:
         messages = self.prompter.superforecaster(
             description=event_title, question=market_question, outcome=outcome
         )
-        result = self.llm.invoke(messages)
+        if stream:
+            return self._stream(messages)
+        result = self._invoke(messages)
         return result
 
 
     def estimate_tokens(self, text: str) -> int:
-        # This is a rough estimate. For more accurate results, consider using a tokenizer.
-        return len(text) // 4  # Assuming average of 4 characters per token
+        return count_tokens(text, self.model)
 
     def process_data_chunk(self, data1: List[Dict[Any, Any]], data2: List[Dict[Any, Any]], user_input: str) -> str:
-        system_message = SystemMessage(
-            content=str(self.prompter.prompts_polymarket(data1=data1, data2=data2))
-        )
-        human_message = HumanMessage(content=user_input)
-        messages = [system_message, human_message]
-        result = self.llm.invoke(messages)
+        result = self._invoke(self._chunk_messages(data1, data2, user_input))
         return result
 
 
-    def divide_list(self, original_list, i):
-        # Calculate the size of each sublist
-        sublist_size = math.ceil(len(original_list) / i)
-        
-        # Use list comprehension to create sublists
-        return [original_list[j:j+sublist_size] for j in range(0, len(original_list), sublist_size)]
-    
+    def pack_polymarket_data(
+        self, data1: List[Dict[Any, Any]], data2: List[Dict[Any, Any]], user_input: str
+    ) -> List[tuple]:
+        """ bin-packs events and markets into as few prompts as fit under token_limit """
+        overhead = (
+            self.estimate_tokens(str(self.prompter.prompts_polymarket(data1=[], data2=[])))
+            + self.estimate_tokens(user_input)
+            + self.num_predict
+        )
+        records = [(1, r) for r in data1] + [(2, r) for r in data2]
+        groups = pack_records(
+            records, self.token_limit - overhead, self.model, render=lambda r: str(r[1])
+        )
+        return [
+            ([r for k, r in group if k == 1], [r for k, r in group if k == 2])
+            for group in groups
+        ]
+
     def get_polymarket_llm(self, user_input: str) -> str:
         data1 = self.gamma.get_current_events()
         data2 = self.gamma.get_current_markets()
@@ -104,74 +236,116 @@ class Executor:
         combined_data = str(self.prompter.prompts_polymarket(data1=data1, data2=data2))
         
         # Estimate total tokens
-        total_tokens = self.estimate_tokens(combined_data)
+        total_tokens = self.estimate_tokens(combined_data) + self.estimate_tokens(user_input)
         
-        # Set a token limit (adjust as needed, leaving room for system and user messages)
-        token_limit = self.token_limit
+        # leave room for the answer
+        token_limit = self.token_limit - self.num_predict
         if total_tokens <= token_limit:
             # If within limit, process normally
             return self.process_data_chunk(data1, data2, user_input)
         else:
             # If exceeding limit, process in chunks
-            chunk_size = len(combined_data) // ((total_tokens // token_limit) + 1)
             print(f'total tokens {total_tokens} exceeding llm capacity, now will split and answer')
-            group_size = (total_tokens // token_limit) + 1 # 3 is safe factor
-            keys_no_meaning = ['image','pagerDutyNotificationEnabled','resolvedBy','endDate','clobTokenIds','negRiskMarketID','conditionId','updatedAt','startDate']
             useful_keys = ['id','questionID','description','liquidity','clobTokenIds','outcomes','outcomePrices','volume','startDate','endDate','question','questionID','events']
             data1 = retain_keys(data1, useful_keys)
-            cut_1 = self.divide_list(data1, group_size)
-            cut_2 = self.divide_list(data2, group_size)
-            cut_data_12 = zip(cut_1, cut_2)
-
-            results = []
-
-            for cut_data in cut_data_12:
-                sub_data1 = cut_data[0]
-                sub_data2 = cut_data[1]
-                sub_tokens = self.estimate_tokens(str(self.prompter.prompts_polymarket(data1=sub_data1, data2=sub_data2)))
-
-                result = self.process_data_chunk(sub_data1, sub_data2, user_input)
-                results.append(result)
-            
-            combined_result = " ".join(results)
-            
-        
-            
-            return combined_result
+            chunks = self.pack_polymarket_data(data1, data2, user_input)
+
+            return self.map_reduce_polymarket(chunks, user_input)
+
+    def _chunk_messages(self, data1, data2, user_input: str) -> list:
+        system_message = SystemMessage(
+            content=str(self.prompter.prompts_polymarket(data1=data1, data2=data2))
+        )
+        return [system_message, HumanMessage(content=user_input)]
+
+    def _invoke_many(self, prompts: list) -> List[str]:
+        """ invokes the llm on every prompt with at most max_concurrency in flight, keeps order """
+        # llm.batch/abatch run completion models' prompts one after another
+        if len(prompts) <= 1:
+            return [self._invoke(p) for p in prompts]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(self._invoke, prompts))
+
+    def map_reduce_polymarket(self, chunks: List[tuple], user_input: str) -> str:
+        """ answers every chunk concurrently, then merges the answers with a reduce prompt """
+        partials = self._invoke_many(
+            [self._chunk_messages(d1, d2, user_input) for d1, d2 in chunks]
+        )
+        return self.reduce_answers(partials, user_input)
+
+    def reduce_answers(self, partials: List[str], user_input: str) -> str:
+        if len(partials) == 1:
+            return partials[0]
+        prompt = self.prompter.reduce_polymarket(partials, user_input)
+        if self.estimate_tokens(prompt) + self.num_predict <= self.token_limit:
+            return self._invoke(prompt)
+
+        # too many partial answers for one prompt, reduce them in rounds
+        overhead = self.estimate_tokens(self.prompter.reduce_polymarket([], user_input)) + self.num_predict
+        groups = pack_records(partials, self.token_limit - overhead, self.model)
+        if len(groups) == len(partials):
+            # answers too long to ever combine, keep the old concatenation
+            return " ".join(partials)
+        multi = [g for g in groups if len(g) > 1]
+        merged = self._invoke_many(
+            [self.prompter.reduce_polymarket(g, user_input) for g in multi]
+        )
+        singles = [g[0] for g in groups if len(g) == 1]
+        return self.reduce_answers(merged + singles, user_input)
+
     def filter_events(self, events: "list[SimpleEvent]") -> str:
         prompt = self.prompter.filter_events(events)
-        result = self.llm.invoke(prompt)
+        result = self._invoke(prompt)
         return result
 
-    def filter_events_with_rag(self, events: "list[SimpleEvent]") -> str:
-        prompt = self.prompter.filter_events()
+    def filter_events_with_rag(self, events: "list[SimpleEvent]", query: Optional[str] = None) -> str:
+        query = query or self.prompter.filter_events()
         print()
-        print("... prompting ... ", prompt)
+        print("... prompting ... ", query)
         print()
-        return self.chroma.events(events, prompt)
+        return self.chroma.hybrid_events(events, query)
 
     def map_filtered_events_to_markets(
         self, filtered_events: "list[SimpleEvent]"
     ) -> "list[SimpleMarket]":
+        # one batched, cached lookup for the markets of every event
+        event_tags = {
+            i: self._event_tags(e) for e in filtered_events for i in self._event_market_ids(e)
+        }
+        return self._map_markets(self.gamma.get_markets_by_ids(list(event_tags)), event_tags)
+
+    def _event_market_ids(self, event_object) -> "list[str]":
+        data = json.loads(event_object[0].json())
+        return data["metadata"]["markets"].split(",")
+
+    def _event_tags(self, event_object) -> "list[str]":
+        data = json.loads(event_object[0].json())
+        return [t for t in (data["metadata"].get("tags") or "").split(",") if t]
+
+    def _map_markets(self, records: "list[dict]", event_tags: dict) -> "list[SimpleMarket]":
+        """ gamma /markets records have no tags, each market takes its event's """
         markets = []
-        for e in filtered_events:
-            data = json.loads(e[0].json())
-            market_ids = data["metadata"]["markets"].split(",")
-            for market_id in market_ids:
-                market_data = self.gamma.get_market(market_id)
-                formatted_market_data = self.polymarket.map_api_to_market(market_data)
-                markets.append(formatted_market_data)
+        for market_data in records:
+            market = self.polymarket.map_api_to_market(market_data)
+            market["tags"] = market["tags"] or event_tags.get(str(market_data.get("id")))
+            markets.append(market)
         return markets
 
-    def filter_markets(self, markets) -> "list[tuple]":
-        prompt = self.prompter.filter_markets()
+    def event_markets(self, event_object) -> "list[SimpleMarket]":
+        """ fetches the markets of one filtered (Document, score) event """
+        tags = self._event_tags(event_object)
+        event_tags = {i: tags for i in self._event_market_ids(event_object)}
+        return self._map_markets(self.gamma.get_markets_by_ids(list(event_tags)), event_tags)
+
+    def filter_markets(self, markets, query: Optional[str] = None, k: int = 4) -> "list[tuple]":
+        """ the k most relevant tradeable markets as (Document, score), best first """
+        query = query or self.prompter.filter_markets()
         print()
-        print("... prompting ... ", prompt)
+        print("... prompting ... ", query)
         print()
-        return self.chroma.markets(markets, prompt)
-
-    def source_best_trade(self, market_object) -> str:
+        return self.chroma.hybrid_markets(markets, query, k=k)
 
+    def _forecast_and_trade(self, market_object, echo: bool = True) -> tuple:
         market_document = market_object[0].dict()
 
         market = market_document["metadata"]
@@ -181,23 +355,99 @@ class Executor:
         description = market_document["page_content"]
 
         prompt = self.prompter.superforecaster(question, description, outcomes)
-        print()
-        print("... prompting ... ", prompt)
-        print()
-        result = self.llm.invoke(prompt)
-        content = result
+        if echo:
+            print()
+            print("... prompting ... ", prompt)
+            print()
+            print("result: ", end="")
+        forecast = self._stream(prompt, echo=echo)
 
-        print("result: ", content)
-        print()
-        prompt = self.prompter.one_best_trade(content, outcomes, outcome_prices)
-        print("... prompting ... ", prompt)
-        print()
-        result = self.llm.invoke(prompt)
-        content = content + result
+        prompt = self.prompter.one_best_trade(forecast, outcomes, outcome_prices)
+        if echo:
+            print()
+            print("... prompting ... ", prompt)
+            print()
+            # stop paying for tokens once price, size and side are known
+            print("result: ", end="")
+        trade = self._stream(prompt, stop_when=parse_trade_fields, echo=echo)
+        if echo:
+            print()
+        return market, forecast, trade
 
-        print("result: ", result)
-        print()
-        return content
+    def source_best_trade(self, market_object) -> str:
+        _, forecast, trade = self._forecast_and_trade(market_object)
+        return forecast + trade
+
+    def evaluate_market(self, market_object, echo: bool = False) -> Optional[TradeCandidate]:
+        """ forecast and trade for one market, None when the answers can't be parsed """
+        market, forecast, trade = self._forecast_and_trade(market_object, echo=echo)
+        fields = parse_trade_fields(trade, final=True)
+        likelihood = parse_forecast(forecast)
+        if fields is None or likelihood is None:
+            return None
+
+        outcomes = ast.literal_eval(market["outcomes"])
+        outcome_prices = [float(p) for p in ast.literal_eval(market["outcome_prices"])]
+        probability, outcome = likelihood
+        # the forecast names its outcome, default to the first (usually "Yes")
+        index = next(
+            (i for i, o in enumerate(outcomes) if outcome and o.lower() == outcome.lower()), 0
+        )
+        price = outcome_prices[index]
+        edge = probability - price if fields["side"] == "BUY" else price - probability
+        return TradeCandidate(
+            market_id=market["id"],
+            question=market["question"],
+            outcome=outcomes[index],
+            forecast=probability,
+            price=price,
+            edge=edge,
+            side=fields["side"],
+            size=fields["size"],
+            trade=forecast + trade,
+            market=market,
+        )
+
+    def pipelined_best_trade(
+        self, filtered_events: list, k: int = 5, fetch_workers: int = 4
+    ) -> Optional[TradeCandidate]:
+        """
+        fetch -> rank -> score as a staged pipeline. markets are fetched per
+        event concurrently. as each event's markets arrive the rank stage
+        re-ranks every market seen so far (only new shortlisted descriptions
+        are embedded) and passes on the ones that just entered the running
+        top k, so the llm scores them while later events are still being
+        fetched. a market that is pushed out again keeps its score.
+        prints per-stage timing, returns the actionable candidate with the most edge
+        """
+        seen = {}
+        scored = set()
+
+        def rank(markets):
+            # single worker, seen and scored are only touched here
+            seen.update((m["id"], m) for m in markets)
+            entered = [
+                market_object
+                for market_object in self.filter_markets(list(seen.values()), k=k)
+                if market_object[0].metadata["id"] not in scored
+            ]
+            scored.update(market_object[0].metadata["id"] for market_object in entered)
+            return entered
+
+        pipeline = Pipeline([
+            Stage("fetch", self.event_markets, workers=fetch_workers),
+            Stage("rank", rank, fan_out=True),
+            Stage("score", self.evaluate_market, workers=max(1, min(self.max_concurrency, k))),
+        ])
+        evaluated = pipeline.run(filtered_events)
+        print(pipeline.report())
+        return self.rank_candidates(evaluated)
+
+    def rank_candidates(self, evaluated: "list[TradeCandidate]") -> Optional[TradeCandidate]:
+        actionable = sorted((c for c in evaluated if c.edge > 0), key=lambda c: c.edge, reverse=True)
+        for c in actionable:
+            print(f"edge {c.edge:+.3f} {c.side} {c.outcome} @ {c.price} (forecast {c.forecast}) {c.question}")
+        return actionable[0] if actionable else None
 
     def format_trade_prompt_for_execution(self, best_trade: str) -> float:
         # data = best_trade.split(",")
@@ -216,6 +466,6 @@ class Executor:
         print()
         print("... prompting ... ", prompt)
         print()
-        result = self.llm.invoke(prompt)
+        result = self._invoke(prompt)
         content = result
         return content
@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+
+from typing import Any, Callable, Iterable, List, Optional
+
+from logger import logging
+
+
+_DONE = object()
+
+
+class Stage:
+    """
+    one step of a Pipeline
+
+    attributes:
+        name (str): label used in the timing report
+        fn (callable): item -> result, None drops the item
+        workers (int): threads running fn concurrently
+        queue_size (int): bound of the input queue, a full queue blocks the stage before it
+        fan_out (bool): fn returns an iterable and each element is passed on
+        batch (bool): fn is called once with the list of every upstream output,
+            for steps such as ranking that need the whole set. the stages after
+            it start when its input is complete
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        queue_size: int = 8,
+        fan_out: bool = False,
+        batch: bool = False,
+    ) -> None:
+        if batch and workers != 1:
+            raise ValueError("a batch stage runs on a single worker")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.fan_out = fan_out
+        self.batch = batch
+        self.items = 0
+        self.outputs = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def _record(self, elapsed: float, outputs: int, failed: bool) -> None:
+        with self._lock:
+            self.items += 1
+            self.outputs += outputs
+            self.errors += failed
+            self.busy += elapsed
+
+    def per_item(self) -> float:
+        """wall seconds per item once spread over the stage's workers"""
+        return self.busy / self.items / self.workers if self.items else 0.0
+
+
+class Pipeline:
+    """
+    runs items through stages connected by bounded queues
+
+    every stage has its own worker threads, so while a slow stage (the llm)
+    works on item n the stages before it are already preparing item n+1.
+    throughput is bound by the slowest stage instead of the sum of all stages.
+    a failing item is logged and dropped, the rest keep flowing.
+    """
+
+    def __init__(self, stages: List[Stage]) -> None:
+        self.stages = stages
+        self.wall = 0.0
+
+    def _process(
+        self, stage: Stage, item: Any, outbox: Optional[queue.Queue], results: list
+    ) -> None:
+        start = time.perf_counter()
+        outputs = []
+        failed = False
+        try:
+            result = stage.fn(item)
+            if stage.fan_out:
+                outputs = [r for r in (result or []) if r is not None]
+            elif result is not None:
+                outputs = [result]
+        except Exception as e:
+            failed = True
+            logging.exception(f"pipeline stage '{stage.name}' failed")
+        stage._record(time.perf_counter() - start, len(outputs), failed)
+        for output in outputs:
+            if outbox is None:
+                results.append(output)
+            else:
+                outbox.put(output)
+
+    def _worker(
+        self,
+        stage: Stage,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        results: list,
+        remaining: list,
+    ) -> None:
+        batch = []
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if stage.batch:
+                batch.append(item)
+            else:
+                self._process(stage, item, outbox, results)
+        if stage.batch and batch:
+            self._process(stage, batch, outbox, results)
+
+        # the last worker of a stage closes the next one
+        with stage._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and outbox is not None:
+            for _ in range(self._next_workers(stage)):
+                outbox.put(_DONE)
+
+    def _next_workers(self, stage: Stage) -> int:
+        return self.stages[self.stages.index(stage) + 1].workers
+
+    def run(self, source: Iterable) -> list:
+        """feeds source through every stage, returns the last stage's outputs"""
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        results = []
+        threads = []
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            remaining = [stage.workers]
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[i], outbox, results, remaining),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in source:
+                queues[0].put(item)
+        except Exception as e:
+            logging.exception("pipeline source failed")
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        self.wall = time.perf_counter() - start
+        return results
+
+    def bottleneck(self) -> Optional[Stage]:
+        return max(self.stages, key=lambda s: s.per_item(), default=None)
+
+    def report(self) -> str:
+        lines = [f"pipeline wall {self.wall:.2f}s"]
+        for stage in self.stages:
+            lines.append(
+                f"  {stage.name:<12} items {stage.items:>4}  out {stage.outputs:>4}  errors {stage.errors:>3}  "
+                f"busy {stage.busy:7.2f}s  workers {stage.workers}  {stage.per_item() * 1000:8.1f} ms/item"
+            )
+        bottleneck = self.bottleneck()
+        if bottleneck is not None:
+            lines.append(f"  bottleneck: {bottleneck.name}")
+        return "\n".join(lines)
@@ -65,6 +65,24 @@ class Prompter:
         Provide specific information for markets including probabilities of outcomes.
         """
 
+    def reduce_polymarket(self, partial_answers: List[str], user_input: str) -> str:
+        answers = "\n\n".join(
+            f"Analyst {i + 1}:\n{answer}" for i, answer in enumerate(partial_answers)
+        )
+        return f"""
+        You are an AI assistant for users of a prediction market called Polymarket.
+        Several analysts each reviewed a different slice of the current Polymarket
+        markets and events and answered the same user query: {user_input}
+
+        Here are their answers:
+
+        {answers}
+
+        Merge them into one answer. Rank the recommended markets from best to worst
+        for the user's query, drop duplicates and markets that do not fit the query,
+        and keep the specific probabilities of outcomes the analysts gave.
+        """
+
     def routing(self, system_message: str) -> str:
         return f"""You are an expert at routing a user question to the appropriate data source. System message: ${system_message}"""
 
@@ -1,7 +1,8 @@
 from agents.application.executor import Executor as Agent
 from agents.polymarket.gamma import GammaMarketClient as Gamma
 from agents.polymarket.polymarket import Polymarket
-from agents.connectors.polymarket_db import PolymarketDb
+from agents.connectors.polymarket_db import PolymarketDb, PolymarketDbWriter
+from agents.connectors.polymarket_sync import PolymarketSync
 
 import shutil
 import traceback
@@ -10,7 +11,7 @@ import sys
 from agents.utils.objects import ActivityUser, TradedUser
 
 from typing import Literal
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from rich import print
 from rich.panel import Panel
@@ -21,9 +22,26 @@ class Trader:
         self.gamma = Gamma()
         self.agent = Agent()
         self.db = PolymarketDb()
+        self.sync = PolymarketSync(self.db, self.gamma)
+        # trader data is persisted behind the network fetches
+        self.writer = PolymarketDbWriter(self.db.db_name)
+
+    def close(self) -> None:
+        """ drains pending trader data, saves the ann snapshots and releases the db connections """
+        self.agent.chroma.close()
+        self.writer.close()
+        self.db.close()
+
+    def __enter__(self) -> "Trader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
     def pre_trade_logic(self) -> None:
-        self.clear_local_dbs()
+        # the rag collections are persistent and updated incrementally,
+        # clear_local_dbs is only needed to force a full re-embed
+        pass
 
     def clear_local_dbs(self) -> None:
         try:
@@ -50,33 +68,26 @@ class Trader:
         while True:
             try:
                 
-                events = self.polymarket.get_all_tradeable_events()
-                print(Panel(f"1. FOUND {events} EVENTS", expand=False))
+                self.sync.sync_events()
+                events = self.db.read_tradeable_events()
+                print(Panel(f"1. FOUND {len(events)} EVENTS", expand=False))
 
                 filtered_events = self.agent.filter_events_with_rag(events)
                 print(Panel(f"2. FILTERED {len(filtered_events)} EVENTS", expand=False))
 
-                markets = self.agent.map_filtered_events_to_markets(filtered_events)
-                print()
-                print(Panel(f"3. FOUND {len(markets)} MARKETS", expand=False))
-
-                print()
-                filtered_markets = self.agent.filter_markets(markets)
-                print(Panel(f"4. FILTERED {len(filtered_markets)} MARKETS", expand=False))
-
-                market = filtered_markets[0]
-                best_trade = self.agent.source_best_trade(market)
-                print(Panel(f"5. CALCULATED TRADE {best_trade}", expand=False))
-
-                if "not" in best_trade:
-                    continue
-                else:
-                    amount = self.agent.format_trade_prompt_for_execution(best_trade)
-                    print(f"amount: {amount}")
+                # fetch markets per event, keep the most relevant and score those
+                candidate = self.agent.pipelined_best_trade(filtered_events)
+                if candidate is None:
+                    print(Panel("3. NO ACTIONABLE TRADE", expand=False))
                     break
+                print(Panel(f"3. CALCULATED TRADE {candidate.trade}", expand=False))
+
+                amount = self.agent.format_trade_prompt_for_execution(candidate.trade)
+                print(f"amount: {amount}")
+                break
                 # Please refer to TOS before uncommenting: polymarket.com/tos
                 # trade = self.polymarket.execute_market_order(market, amount)
-                # print(f"6. TRADED {trade}")
+                # print(f"4. TRADED {trade}")
 
             except Exception as e:
                 exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -98,12 +109,10 @@ class Trader:
     def _store_trader_data(self, trader_address: str) -> None:
         """  """
         activity_user = self.polymarket.get_proxy_addr_activity(trader_address)
-        for obj in activity_user:
-            self.db.write_activity_user(obj)
+        self.writer.write_activity_users(activity_user)
 
         positions = self.polymarket.get_proxy_addr_positions(trader_address)
-        for obj in positions:
-            self.db.write_user_position(obj)
+        self.writer.write_user_positions(positions)
 
         # traded_user = self.polymarket.get_proxy_addr_traded_user(trader_address)
         # self.db.write_traded_user(traded_user[0])
@@ -116,27 +125,24 @@ class Trader:
         """ copy trades based on a trader's activity from the past epoch """
         
         self._store_trader_data(trader_address)
-        cur_time = datetime.now()
 
         balance = self.polymarket.get_available_funds() 
         
         if not balance:
             raise Exception(f"Insufficient funds found at {self.polymarket.client.get_address()}")
 
-        if "y" == epoch:
-            cur_time = int(cur_time.replace(year=cur_time.year - 1).timestamp())
-            activity = self.db.read_activity_positions_by_user_timestamp(cur_time)
-        elif "m" == epoch:
-            cur_time = int(cur_time.replace(month=cur_time.month - 1).timestamp())
-            activity = self.db.read_activity_positions_by_user_timestamp(cur_time)
-        elif "d" == epoch:
-            cur_time = int(cur_time.replace(day=cur_time.day - 1).timestamp())
-            activity = self.db.read_activity_positions_by_user_timestamp(cur_time)
-        elif "h" == epoch:
-            cur_time = int(cur_time.replace(hour=cur_time.hour - 1).timestamp())
-            activity = self.db.read_activity_positions_by_user_timestamp(cur_time)
-        else:
+        windows = {
+            "y": timedelta(days=365),
+            "m": timedelta(days=30),
+            "d": timedelta(days=1),
+            "h": timedelta(hours=1),
+        }
+        if epoch not in windows:
             raise ValueError(f"Invalid epoch value: {epoch}")
+
+        self.writer.flush()
+        since = int((datetime.now() - windows[epoch]).timestamp())
+        activity = self.db.read_activity_positions_by_user_timestamp(since, proxy_wallet=trader_address)
         
         for obj in activity:
             
@@ -169,5 +175,5 @@ class Trader:
 
 
 if __name__ == "__main__":
-    t = Trader()
-    t.one_best_trade()
+    with Trader() as t:
+        t.one_best_trade()
@@ -0,0 +1,298 @@
+import json
+import os
+
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from logger import logging
+
+try:
+    import hnswlib
+except ImportError:  # optional, ships with chroma as chroma-hnswlib
+    hnswlib = None
+
+
+_VECTORS = "vectors.f32"
+_HNSW = "hnsw.bin"
+_META = "meta.json"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """
+    in-process cosine top-k index over a fixed embedding matrix
+
+    uses an hnsw graph when hnswlib is importable, otherwise a brute-force
+    scan of the float32 matrix. `save` writes the matrix as a raw float32 file
+    which `load` memory-maps, so reopening the index costs no parsing.
+    `upsert` and `remove` change the index in place: a changed vector takes
+    its slot back, a removed id leaves a deleted slot behind. new rows go into
+    spare capacity of a buffer that doubles when full, `matrix` is a view of
+    its used rows.
+    """
+
+    def __init__(
+        self,
+        ids: List,
+        matrix: np.ndarray,
+        payloads: Optional[List] = None,
+        use_hnsw: Optional[bool] = None,
+        ef: int = 64,
+        M: int = 16,
+    ) -> None:
+        self.ids = list(ids)
+        self.matrix = matrix
+        self._buffer = matrix
+        self.payloads = payloads
+        self.ef = ef
+        self.M = M
+        self.deleted = set()
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.hnsw = None
+        if use_hnsw is None:
+            use_hnsw = hnswlib is not None
+        if use_hnsw and hnswlib is None:
+            raise ImportError("hnswlib is not installed")
+        self.use_hnsw = use_hnsw
+
+    @classmethod
+    def build(
+        cls,
+        ids: Iterable,
+        vectors: Iterable[List[float]],
+        payloads: Optional[List] = None,
+        use_hnsw: Optional[bool] = None,
+        ef: int = 64,
+        M: int = 16,
+    ) -> "VectorIndex":
+        ids = list(ids)
+        if ids:
+            matrix = _normalize(
+                np.asarray(list(vectors), dtype=np.float32).reshape(len(ids), -1)
+            )
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        index = cls(ids, matrix, payloads, use_hnsw=use_hnsw, ef=ef, M=M)
+        if index.use_hnsw and ids:
+            index.hnsw = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+            index.hnsw.init_index(
+                max_elements=len(ids), ef_construction=max(ef, 100), M=M
+            )
+            index.hnsw.add_items(matrix, np.arange(len(ids)))
+            index.hnsw.set_ef(ef)
+        return index
+
+    def upsert(
+        self,
+        ids: Iterable,
+        vectors: Iterable[List[float]],
+        payloads: Optional[List] = None,
+    ) -> None:
+        """adds new ids and replaces the vector (and payload) of known ones"""
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = _normalize(
+            np.asarray(list(vectors), dtype=np.float32).reshape(len(ids), -1)
+        )
+        if not self.ids:
+            self._buffer = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        if self.payloads is None:
+            self.payloads = [None] * len(self.ids)
+
+        positions = []
+        new = []
+        for doc_id in ids:
+            if doc_id in self._positions:
+                positions.append(self._positions[doc_id])
+            else:
+                positions.append(len(self.ids) + len(new))
+                new.append(doc_id)
+        size = len(self.ids) + len(new)
+        # a loaded matrix is a read-only memmap of the snapshot
+        if size > len(self._buffer) or not self._buffer.flags.writeable:
+            buffer = np.zeros(
+                (max(size, 2 * len(self._buffer)), vectors.shape[1]), dtype=np.float32
+            )
+            buffer[: len(self.ids)] = self.matrix
+            self._buffer = buffer
+        self._buffer[positions] = vectors
+        self.matrix = self._buffer[:size]
+        for doc_id in new:
+            self._positions[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+            self.payloads.append(None)
+        for position, payload in zip(positions, payloads or [None] * len(ids)):
+            self.payloads[position] = payload
+
+        if self.use_hnsw:
+            if self.hnsw is None:
+                self.hnsw = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+                self.hnsw.init_index(
+                    max_elements=len(self.ids),
+                    ef_construction=max(self.ef, 100),
+                    M=self.M,
+                )
+                self.hnsw.set_ef(self.ef)
+            elif len(self.ids) > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(
+                    max(len(self.ids), 2 * self.hnsw.get_max_elements())
+                )
+            self.hnsw.add_items(vectors, np.asarray(positions))
+
+    def update_payloads(self, ids: Iterable, payloads: List) -> None:
+        """replaces payloads without touching the vectors"""
+        for doc_id, payload in zip(ids, payloads):
+            if doc_id in self._positions:
+                self.payloads[self._positions[doc_id]] = payload
+
+    def remove(self, ids: Iterable) -> None:
+        for doc_id in ids:
+            position = self._positions.pop(doc_id, None)
+            if position is None:
+                continue
+            self.deleted.add(position)
+            if self.payloads is not None:
+                self.payloads[position] = None
+            if self.hnsw is not None:
+                self.hnsw.mark_deleted(position)
+
+    def payload(self, doc_id):
+        return self.payloads[self._positions[doc_id]]
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._positions
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """a snapshot is complete once its meta file is written, `save` writes it last"""
+        return os.path.exists(os.path.join(directory, _META))
+
+    @staticmethod
+    def invalidate(directory: str) -> None:
+        """marks a snapshot stale, the next `save` makes it complete again"""
+        try:
+            os.remove(os.path.join(directory, _META))
+        except FileNotFoundError:
+            pass
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        # copy first, the current matrix may be a memmap of the file being replaced
+        np.array(self.matrix, dtype=np.float32).tofile(
+            os.path.join(directory, _VECTORS)
+        )
+        if self.hnsw is not None:
+            self.hnsw.save_index(os.path.join(directory, _HNSW))
+        with open(os.path.join(directory, _META), "w") as f:
+            json.dump(
+                {
+                    "ids": self.ids,
+                    "payloads": self.payloads,
+                    "deleted": sorted(self.deleted),
+                    "dim": int(self.matrix.shape[1]) if len(self.ids) else 0,
+                    "ef": self.ef,
+                    "M": self.M,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, directory: str, use_hnsw: Optional[bool] = None) -> "VectorIndex":
+        with open(os.path.join(directory, _META)) as f:
+            meta = json.load(f)
+        ids, dim = meta["ids"], meta["dim"]
+        if ids:
+            matrix = np.memmap(
+                os.path.join(directory, _VECTORS),
+                dtype=np.float32,
+                mode="r",
+                shape=(len(ids), dim),
+            )
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        hnsw_path = os.path.join(directory, _HNSW)
+        if use_hnsw is None:
+            use_hnsw = hnswlib is not None and os.path.exists(hnsw_path)
+        index = cls(
+            ids,
+            matrix,
+            meta.get("payloads"),
+            use_hnsw=use_hnsw,
+            ef=meta["ef"],
+            M=meta["M"],
+        )
+        deleted = meta.get("deleted") or []
+        if index.use_hnsw and ids:
+            index.hnsw = hnswlib.Index(space="cosine", dim=dim)
+            if os.path.exists(hnsw_path):
+                index.hnsw.load_index(hnsw_path, max_elements=len(ids))
+            else:
+                logging.info(
+                    f"no hnsw graph in {directory}, rebuilding from the matrix"
+                )
+                index.hnsw.init_index(
+                    max_elements=len(ids), ef_construction=max(index.ef, 100), M=index.M
+                )
+                index.hnsw.add_items(np.asarray(matrix), np.arange(len(ids)))
+                for position in deleted:
+                    index.hnsw.mark_deleted(position)
+            index.hnsw.set_ef(index.ef)
+        if deleted:
+            # a removed id that was added back lives on at a later position
+            index.deleted = set(deleted)
+            index._positions = {
+                doc_id: i for i, doc_id in enumerate(ids) if i not in index.deleted
+            }
+        return index
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def search(
+        self, vector: List[float], k: int = 4, allowed_ids: Optional[Iterable] = None
+    ) -> List[Tuple]:
+        """returns [(id, cosine distance)] nearest first, optionally restricted to allowed_ids"""
+        if not self._positions:
+            return []
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        allowed = None
+        if allowed_ids is not None:
+            allowed = [self._positions[i] for i in allowed_ids if i in self._positions]
+            if not allowed:
+                return []
+        k = min(k, len(self) if allowed is None else len(allowed))
+
+        if self.hnsw is not None:
+            if allowed is None:
+                labels, distances = self.hnsw.knn_query(query, k=k)
+            else:
+                allowed_set = set(allowed)
+                labels, distances = self.hnsw.knn_query(
+                    query, k=k, filter=lambda i: i in allowed_set
+                )
+            return [
+                (self.ids[int(i)], float(d)) for i, d in zip(labels[0], distances[0])
+            ]
+
+        if allowed is None:
+            allowed = (
+                sorted(self._positions.values())
+                if self.deleted
+                else range(len(self.ids))
+            )
+        positions = np.asarray(allowed)
+        distances = 1.0 - self.matrix[positions] @ query
+        top = (
+            np.argpartition(distances, k - 1)[:k]
+            if k < len(positions)
+            else np.arange(len(positions))
+        )
+        top = top[np.argsort(distances[top])]
+        return [(self.ids[int(positions[i])], float(distances[i])) for i in top]
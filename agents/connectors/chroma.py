@@ -1,21 +1,572 @@
 import json
+import math
+import operator
 import os
+import re
+import shutil
 import time
 
+from collections import Counter, defaultdict
+from typing import Iterable, Optional
+
 from langchain_openai import OpenAIEmbeddings
 from langchain_ollama import OllamaEmbeddings
 from langchain_community.document_loaders import JSONLoader
 from langchain_community.vectorstores.chroma import Chroma
+from langchain_core.documents import Document
 
+from agents.connectors.ann import VectorIndex
+from agents.connectors.embeddings import BatchedEmbeddings, CachedEmbeddings, text_hash
+from agents.connectors.polymarket_db import PolymarketDb, iso_to_unix
 from agents.polymarket.gamma import GammaMarketClient
 from agents.utils.objects import SimpleEvent, SimpleMarket
 
 
+EVENTS_COLLECTION = "events"
+MARKETS_COLLECTION = "markets"
+
+
+def clean_metadata(metadata: dict) -> dict:
+    """ chroma only stores str/int/float/bool metadata values """
+    return {k: v for k, v in metadata.items() if isinstance(v, (str, int, float, bool))}
+
+
+def tag_slugs(tags) -> "list[str]":
+    """ gamma tags come as dicts (slug/label) or plain strings """
+    slugs = []
+    for tag in tags or []:
+        if isinstance(tag, dict):
+            tag = tag.get("slug") or tag.get("label")
+        if tag:
+            slugs.append(str(tag).lower().replace(" ", "-"))
+    return slugs
+
+
+def event_text(event: dict) -> str:
+    """ what bm25 indexes for an event """
+    return f"{event.get('title') or ''} {event.get('description') or ''}"
+
+
+def market_text(market: dict) -> str:
+    """ what bm25 indexes for a market """
+    return f"{market.get('question') or ''} {market.get('description') or ''}"
+
+
+def market_metadata(record: dict) -> dict:
+    """ filterable market fields, tags are flattened to tag_<slug> booleans """
+    metadata = {
+        "id": record.get("id"),
+        "outcomes": record.get("outcomes"),
+        "outcome_prices": record.get("outcome_prices"),
+        "question": record.get("question"),
+        "clob_token_ids": record.get("clob_token_ids"),
+        "active": bool(record.get("active")),
+        "closed": bool(record.get("closed")),
+        "end_ts": iso_to_unix(record.get("end")),
+        "liquidity": record.get("liquidity"),
+        "spread": record.get("spread"),
+    }
+    for slug in tag_slugs(record.get("tags")):
+        metadata[f"tag_{slug}"] = True
+    return metadata
+
+
+def market_filter(
+    active: Optional[bool] = True,
+    end_after: Optional[int] = None,
+    min_liquidity: Optional[float] = None,
+    max_spread: Optional[float] = None,
+    tags: Optional["list[str]"] = None,
+) -> "list[dict]":
+    """
+    chroma `where` clauses for tradeable markets, end_after defaults to now.
+    markets without a field are excluded by a filter on that field
+    """
+    clauses = []
+    if active is not None:
+        clauses.append({"active": active})
+    clauses.append({"end_ts": {"$gt": int(time.time()) if end_after is None else end_after}})
+    if min_liquidity is not None:
+        clauses.append({"liquidity": {"$gte": min_liquidity}})
+    if max_spread is not None:
+        clauses.append({"spread": {"$lte": max_spread}})
+    if tags:
+        any_tag = [{f"tag_{slug}": True} for slug in tag_slugs(tags)]
+        clauses.append(any_tag[0] if len(any_tag) == 1 else {"$or": any_tag})
+    return clauses
+
+
+_COMPARATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+}
+
+
+def matches_where(metadata: dict, where) -> bool:
+    """
+    evaluates chroma `where` clauses (a list is an implicit $and) on one
+    metadata dict, a missing field fails any condition on it like in chroma
+    """
+    if isinstance(where, list):
+        return all(matches_where(metadata, clause) for clause in where)
+    for field, condition in where.items():
+        if field == "$and":
+            matched = all(matches_where(metadata, clause) for clause in condition)
+        elif field == "$or":
+            matched = any(matches_where(metadata, clause) for clause in condition)
+        else:
+            value = metadata.get(field)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            matched = value is not None and all(
+                _COMPARATORS[op](value, target) for op, target in condition.items()
+            )
+        if not matched:
+            return False
+    return True
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have if in into is it its of on or "
+    "that the their these this to was will with you your which who what when".split()
+)
+
+
+def tokenize(text: str) -> "list[str]":
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """ in-memory okapi bm25 over an inverted index, keyed by document id """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.lengths = {}
+        self.terms = {}  # doc_id -> Counter of its terms
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, doc_id, text: str) -> None:
+        """ indexes or re-indexes a document, a no-op when its terms are unchanged """
+        terms = Counter(tokenize(text))
+        if self.terms.get(doc_id) == terms:
+            return
+        self.remove(doc_id)
+        self.terms[doc_id] = terms
+        self.lengths[doc_id] = sum(terms.values())
+        self._total_length += self.lengths[doc_id]
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id) -> None:
+        terms = self.terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self.lengths.pop(doc_id)
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+
+    def search(self, query: str, k: Optional[int] = None, ids: Optional[Iterable] = None) -> "list[tuple]":
+        """
+        returns [(doc_id, score)] best first, only documents sharing a term.
+        ids restricts the result, idf still comes from the whole index
+        """
+        n = len(self.lengths)
+        if not n:
+            return []
+        allowed = None if ids is None else set(ids)
+        avg_len = self._total_length / n or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k] if k else ranked
+
+
+def reciprocal_rank_fusion(rankings: "list[list]", k: int = 60) -> "list[tuple]":
+    """ fuses ranked id lists, returns [(doc_id, score)] best first """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
 class PolymarketRAG:
-    def __init__(self, local_db_directory=None, embedding_function=None) -> None:
+    """
+    events and markets live in long-lived chroma collections keyed by id.
+    each call upserts the records it is given and only embeds descriptions
+    that are new or whose content hash changed since the last cycle.
+    """
+
+    def __init__(self, local_db_directory=None, embedding_function=None, use_ann=False) -> None:
         self.gamma_client = GammaMarketClient()
         self.local_db_directory = local_db_directory
+        if embedding_function is None:
+            # embedding_function = OpenAIEmbeddings(model="text-embedding-3-small")
+            embedding_function = CachedEmbeddings(
+                BatchedEmbeddings(OllamaEmbeddings(model="llama3.2")), db=PolymarketDb()
+            )
         self.embedding_function = embedding_function
+        self.events_directory = os.path.join(local_db_directory or ".", "local_db_events", "chroma")
+        self.markets_directory = os.path.join(local_db_directory or ".", "local_db_markets", "chroma")
+        self._stores = {}
+        # optional in-memory ann index per collection, updated in place by writes
+        self.use_ann = use_ann
+        self._ann = {}
+        # collections whose in-memory ann index is ahead of its snapshot
+        self._ann_dirty = set()
+        # bm25 index per collection, kept current by upsert/delete
+        self._bm25 = {}
+
+    def _store(self, persist_directory: str, collection_name: str) -> Chroma:
+        key = (persist_directory, collection_name)
+        if key not in self._stores:
+            self._stores[key] = Chroma(
+                collection_name=collection_name,
+                persist_directory=persist_directory,
+                embedding_function=self.embedding_function,
+            )
+        return self._stores[key]
+
+    def _store_key(self, store: Chroma) -> Optional[tuple]:
+        return next((key for key, value in self._stores.items() if value is store), None)
+
+    def _ann_directory(self, persist_directory: str, collection_name: str) -> str:
+        return os.path.join(persist_directory, f"ann_{collection_name}")
+
+    def _update_ann(
+        self,
+        store: Chroma,
+        embedded: Optional[dict] = None,
+        updated: Optional[dict] = None,
+        removed: Optional[list] = None,
+    ) -> None:
+        """
+        applies a collection write to its in-memory ann index instead of
+        rebuilding it, `save_ann` writes the snapshot once the cycle's writes
+        are done. embedded maps id -> (vector, payload), updated maps id -> payload
+        """
+        key = self._store_key(store)
+        if key is None:
+            return
+        directory = self._ann_directory(*key)
+        if key not in self._ann:
+            if not self.use_ann:
+                # nothing keeps the snapshot current in this process
+                shutil.rmtree(directory, ignore_errors=True)
+                return
+            if not VectorIndex.exists(directory):
+                # built from the collection on the first ann search
+                return
+            self._ann[key] = VectorIndex.load(directory)
+        index = self._ann[key]
+        if embedded:
+            index.upsert(list(embedded), [v for v, _ in embedded.values()], [p for _, p in embedded.values()])
+        if updated:
+            index.update_payloads(list(updated), list(updated.values()))
+        if removed:
+            index.remove(removed)
+        if key not in self._ann_dirty:
+            # a process that dies before `save_ann` leaves no stale snapshot
+            VectorIndex.invalidate(directory)
+            self._ann_dirty.add(key)
+
+    def save_ann(self, store: Optional[Chroma] = None) -> None:
+        """ writes the snapshot of every changed ann index, or only the one of store """
+        keys = list(self._ann_dirty) if store is None else [self._store_key(store)]
+        for key in keys:
+            if key in self._ann_dirty:
+                self._ann[key].save(self._ann_directory(*key))
+                self._ann_dirty.discard(key)
+
+    def close(self) -> None:
+        self.save_ann()
+
+    def build_ann_index(self, persist_directory: str, collection_name: str) -> VectorIndex:
+        """ snapshots a collection's embeddings into an ann index saved next to it """
+        store = self._store(persist_directory, collection_name)
+        data = store.get(include=["embeddings", "metadatas", "documents"])
+        index = VectorIndex.build(
+            data["ids"],
+            data["embeddings"] if len(data["ids"]) else [],
+            payloads=[[doc, meta] for doc, meta in zip(data["documents"], data["metadatas"])],
+        )
+        index.save(self._ann_directory(persist_directory, collection_name))
+        self._ann[(persist_directory, collection_name)] = index
+        self._ann_dirty.discard((persist_directory, collection_name))
+        return index
+
+    def ann_index(self, persist_directory: str, collection_name: str) -> VectorIndex:
+        key = (persist_directory, collection_name)
+        if key not in self._ann:
+            directory = self._ann_directory(persist_directory, collection_name)
+            if VectorIndex.exists(directory):
+                # writes save, invalidate or remove the snapshot, so a complete one is current
+                self._ann[key] = VectorIndex.load(directory)
+            else:
+                self.build_ann_index(persist_directory, collection_name)
+        return self._ann[key]
+
+    def ann_search(
+        self,
+        persist_directory: str,
+        collection_name: str,
+        prompt: str,
+        k: int = 4,
+        ids: Optional[list] = None,
+        where: Optional["list[dict]"] = None,
+    ) -> "list[tuple]":
+        """
+        top-k from the ann index, same (Document, distance) shape as chroma.
+        where takes the same clauses as chroma and is checked on the payloads
+        """
+        index = self.ann_index(persist_directory, collection_name)
+        allowed = None if ids is None else [str(i) for i in ids if str(i) in index]
+        if where:
+            allowed = [i for i in (index.ids if allowed is None else allowed) if i in index]
+            allowed = [i for i in allowed if matches_where(index.payload(i)[1], where)]
+        hits = index.search(self.embedding_function.embed_query(prompt), k=k, allowed_ids=allowed)
+        results = []
+        for doc_id, distance in hits:
+            page_content, metadata = index.payload(doc_id)
+            results.append((Document(page_content=page_content, metadata=metadata), distance))
+        return results
+
+    def lexical_index(self, store: Chroma) -> BM25Index:
+        """ the collection's bm25 index, holds every document upserted since startup """
+        key = self._store_key(store)
+        if key not in self._bm25:
+            self._bm25[key] = BM25Index()
+        return self._bm25[key]
+
+    def upsert_documents(
+        self,
+        store: Chroma,
+        ids: list,
+        texts: "list[str]",
+        metadatas: "list[dict]",
+        lexical: Optional["list[str]"] = None,
+    ) -> int:
+        """
+        upserts documents by id, returns how many had to be embedded.
+        lexical is the text bm25 indexes per document, defaults to texts
+        """
+        records = {}
+        index = self.lexical_index(store)
+        for doc_id, text, metadata, words in zip(ids, texts, metadatas, lexical or texts):
+            text = text or ""
+            metadata = clean_metadata(metadata)
+            metadata["content_hash"] = text_hash(text)
+            records[str(doc_id)] = (text, metadata)
+            index.add(str(doc_id), words or "")
+        if not records:
+            return 0
+
+        existing = store.get(ids=list(records), include=["metadatas"])
+        known = dict(zip(existing["ids"], existing["metadatas"]))
+
+        embed, update = [], []
+        for doc_id, (text, metadata) in records.items():
+            current = known.get(doc_id)
+            if current is None or current.get("content_hash") != metadata["content_hash"]:
+                embed.append(doc_id)
+            elif current != metadata:
+                update.append(doc_id)
+
+        vectors = []
+        if embed:
+            texts = [records[i][0] for i in embed]
+            vectors = self.embedding_function.embed_documents(texts)
+            store._collection.upsert(
+                ids=embed,
+                embeddings=vectors,
+                metadatas=[records[i][1] for i in embed],
+                documents=texts,
+            )
+        if update:
+            # prices and flags move every cycle, the description (and vector) rarely does
+            store._collection.update(ids=update, metadatas=[records[i][1] for i in update])
+        if embed or update:
+            self._update_ann(
+                store,
+                embedded={i: (v, list(records[i])) for i, v in zip(embed, vectors)},
+                updated={i: list(records[i]) for i in update},
+            )
+        return len(embed)
+
+    def delete_documents(self, store: Chroma, ids: list) -> None:
+        if ids:
+            store.delete(ids=[str(i) for i in ids])
+            self._update_ann(store, removed=[str(i) for i in ids])
+            index = self.lexical_index(store)
+            for doc_id in ids:
+                index.remove(str(doc_id))
+
+    def prune_documents(self, store: Chroma, keep_ids: list) -> int:
+        """ deletes every document whose id is not in keep_ids """
+        keep = {str(i) for i in keep_ids}
+        stale = [i for i in store.get(include=[])["ids"] if i not in keep]
+        self.delete_documents(store, stale)
+        # records bm25 saw but that were never short-listed into the collection
+        index = self.lexical_index(store)
+        for doc_id in [i for i in index.terms if i not in keep]:
+            index.remove(doc_id)
+        return len(stale)
+
+    def prune_markets(self, store: Chroma, markets: "list[SimpleMarket]") -> "list[SimpleMarket]":
+        """
+        deletes closed, inactive and ended markets from the markets collection
+        (and its ann snapshot), both the ones in `markets` and any stored
+        earlier. returns the markets that are still tradeable
+        """
+        now = int(time.time())
+        tradeable_filter = market_filter(end_after=now)
+        tradeable, stale = [], []
+        for market in markets:
+            metadata = clean_metadata(market_metadata(market))
+            if not metadata["closed"] and matches_where(metadata, tradeable_filter):
+                tradeable.append(market)
+            else:
+                stale.append(str(market.get("id")))
+        # markets bm25 saw but that never made it into the collection
+        index = self.lexical_index(store)
+        for doc_id in stale:
+            index.remove(doc_id)
+        stale = store.get(ids=stale, include=[])["ids"] if stale else []
+        expired = store.get(
+            where={"$or": [{"active": False}, {"closed": True}, {"end_ts": {"$lte": now}}]},
+            include=[],
+        )["ids"]
+        self.delete_documents(store, list(dict.fromkeys(stale + expired)))
+        return tradeable
+
+    def _query(
+        self,
+        store: Chroma,
+        ids: list,
+        prompt: str,
+        where: Optional["list[dict]"] = None,
+        k: int = 4,
+    ) -> "list[tuple]":
+        if not ids:
+            return []
+        key = self._store_key(store)
+        if self.use_ann and key is not None:
+            return self.ann_search(*key, prompt, k=k, ids=ids, where=where)
+        clauses = [{"id": {"$in": list(ids)}}] + list(where or [])
+        return store.similarity_search_with_score(
+            query=prompt, k=k, filter=clauses[0] if len(clauses) == 1 else {"$and": clauses}
+        )
+
+    def hybrid_search(
+        self,
+        store: Chroma,
+        records: dict,
+        query: str,
+        k: int = 4,
+        shortlist: int = 200,
+        where: Optional["list[dict]"] = None,
+        rrf_k: int = 60,
+    ) -> "list[tuple]":
+        """
+        bm25 + vector retrieval fused with reciprocal rank fusion
+
+        records maps id -> (lexical text, page content, metadata). every record
+        goes into the collection's persistent bm25 index, which costs no
+        embedding. only the `shortlist` best lexical matches are upserted (so
+        embedded when new or changed) and searched by vector, a cold collection
+        never embeds the whole universe. returns [(Document, fused score)],
+        higher is better
+        """
+        if not records:
+            return []
+        index = self.lexical_index(store)
+        by_key = {str(i): i for i in records}
+        for key, doc_id in by_key.items():
+            index.add(key, records[doc_id][0])
+        lexical_ranking = [by_key[i] for i, _ in index.search(query, shortlist, ids=by_key)]
+        # nothing matched lexically, fall back to a capped vector search
+        candidates = lexical_ranking or list(records)[:shortlist]
+
+        self.upsert_documents(
+            store,
+            candidates,
+            [records[i][1] for i in candidates],
+            [records[i][2] for i in candidates],
+            lexical=[records[i][0] for i in candidates],
+        )
+        self.save_ann(store)
+        vector_hits = self._query(store, candidates, query, where, k=len(candidates))
+        vector_ranking = [by_key[str(doc.metadata["id"])] for doc, _ in vector_hits]
+        if where:
+            # the structured filter applies to the fused result too
+            allowed = set(vector_ranking)
+            lexical_ranking = [i for i in lexical_ranking if i in allowed]
+
+        fused = reciprocal_rank_fusion([lexical_ranking, vector_ranking], k=rrf_k)[:k]
+        return [
+            (Document(page_content=records[i][1], metadata=clean_metadata(records[i][2])), score)
+            for i, score in fused
+        ]
+
+    def hybrid_events(
+        self, events: "list[SimpleEvent]", query: str, k: int = 4, shortlist: int = 200
+    ) -> "list[tuple]":
+        store = self._store(self.events_directory, EVENTS_COLLECTION)
+        records = {}
+        for e in events:
+            e = e.dict()
+            records[e["id"]] = (
+                event_text(e),
+                e["description"],
+                {"id": e["id"], "markets": e["markets"], "tags": e["tags"]},
+            )
+        self.prune_documents(store, list(records))
+        return self.hybrid_search(store, records, query, k=k, shortlist=shortlist)
+
+    def hybrid_markets(
+        self,
+        markets: "list[SimpleMarket]",
+        query: str,
+        k: int = 4,
+        shortlist: int = 200,
+        where: Optional["list[dict]"] = None,
+    ) -> "list[tuple]":
+        store = self._store(self.markets_directory, MARKETS_COLLECTION)
+        markets = self.prune_markets(store, markets)
+        records = {
+            m.get("id"): (
+                market_text(m),
+                m.get("description") or "",
+                market_metadata(m),
+            )
+            for m in markets
+        }
+        where = market_filter() if where is None else where
+        return self.hybrid_search(store, records, query, k=k, shortlist=shortlist, where=where)
 
     def load_json_from_local(
         self, json_file_path=None, vector_db_directory="./local_db_markets"
@@ -25,10 +576,8 @@ class PolymarketRAG:
         )
         loaded_docs = loader.load()
 
-        # embedding_function = OpenAIEmbeddings(model="text-embedding-3-small")
-        embedding_function = OllamaEmbeddings(model="llama3.2")
         Chroma.from_documents(
-            loaded_docs, embedding_function, persist_directory=vector_db_directory
+            loaded_docs, self.embedding_function, persist_directory=vector_db_directory
         )
 
     def create_local_markets_rag(self, local_directory="./local_db_markets") -> None:
@@ -42,96 +591,62 @@ class PolymarketRAG:
         with open(local_file_path, "w+") as output_file:
             json.dump(all_markets, output_file)
 
-        self.load_json_from_local(
-            json_file_path=local_file_path, vector_db_directory=local_directory
+        store = self._store(local_directory, MARKETS_COLLECTION)
+        self.upsert_documents(
+            store,
+            [m.get("id") for m in all_markets],
+            [m.get("description") for m in all_markets],
+            [{"id": m.get("id"), "question": m.get("question")} for m in all_markets],
         )
+        self.save_ann(store)
 
     def query_local_markets_rag(
         self, local_directory=None, query=None
     ) -> "list[tuple]":
-        # embedding_function = OpenAIEmbeddings(model="text-embedding-3-small")
-        embedding_function = OllamaEmbeddings(model="llama3.2")
-        local_db = Chroma(
-            persist_directory=local_directory, embedding_function=embedding_function
-        )
+        if self.use_ann:
+            return self.ann_search(local_directory, MARKETS_COLLECTION, query)
+        local_db = self._store(local_directory, MARKETS_COLLECTION)
         response_docs = local_db.similarity_search_with_score(query=query)
         return response_docs
 
     def events(self, events: "list[SimpleEvent]", prompt: str) -> "list[tuple]":
-        # create local json file
-        local_events_directory: str = "./local_db_events"
-        if not os.path.isdir(local_events_directory):
-            os.mkdir(local_events_directory)
-        local_file_path = f"{local_events_directory}/events.json"
         dict_events = [x.dict() for x in events]
-        with open(local_file_path, "w+") as output_file:
-            json.dump(dict_events, output_file)
+        store = self._store(self.events_directory, EVENTS_COLLECTION)
 
-        # create vector db
-        def metadata_func(record: dict, metadata: dict) -> dict:
-            metadata["id"] = record.get("id", None)
-            metadata["markets"] = record.get("markets", None)            
-            return metadata
-
-        loader = JSONLoader(
-            file_path=local_file_path,
-            jq_schema=".[]",
-            content_key="description",
-            text_content=False,
-            metadata_func=metadata_func,
-        )
-        loaded_docs = loader.load()
-        # embedding_function = OpenAIEmbeddings(model="text-embedding-3-small")
-        embedding_function = OllamaEmbeddings(model="llama3.2")
-
-        vector_db_directory = f"{local_events_directory}/chroma"
-        local_db = Chroma.from_documents(
-            loaded_docs, 
-            embedding_function, 
-            # persist_directory="chroma_db"
-            persist_directory=vector_db_directory
+        ids = [e["id"] for e in dict_events]
+        self.upsert_documents(
+            store,
+            ids,
+            [e["description"] for e in dict_events],
+            [{"id": e["id"], "markets": e["markets"], "tags": e["tags"]} for e in dict_events],
+            [event_text(e) for e in dict_events],
         )
+        # the events collection mirrors the current tradeable universe
+        self.prune_documents(store, ids)
+        self.save_ann(store)
 
         # query
-        return local_db.similarity_search_with_score(query=prompt)
-
-    def markets(self, markets: "list[SimpleMarket]", prompt: str) -> "list[tuple]":
-        # create local json file
-        local_events_directory: str = "./local_db_markets"
-        if not os.path.isdir(local_events_directory):
-            os.mkdir(local_events_directory)
-        local_file_path = f"{local_events_directory}/markets.json"
-        with open(local_file_path, "w+") as output_file:
-            json.dump(markets, output_file)
-
-        # create vector db
-        def metadata_func(record: dict, metadata: dict) -> dict:
-
-            metadata["id"] = record.get("id")
-            metadata["outcomes"] = record.get("outcomes")
-            metadata["outcome_prices"] = record.get("outcome_prices")
-            metadata["question"] = record.get("question")
-            metadata["clob_token_ids"] = record.get("clob_token_ids")
+        return self._query(store, ids, prompt)
 
-            return metadata
+    def markets(
+        self,
+        markets: "list[SimpleMarket]",
+        prompt: str,
+        where: Optional["list[dict]"] = None,
+    ) -> "list[tuple]":
+        """ where: extra `market_filter` clauses, defaults to active markets that have not ended """
+        store = self._store(self.markets_directory, MARKETS_COLLECTION)
+        markets = self.prune_markets(store, markets)
 
-        loader = JSONLoader(
-            file_path=local_file_path,
-            jq_schema=".[]",
-            content_key="description",
-            text_content=False,
-            metadata_func=metadata_func,
-        )
-        loaded_docs = loader.load()
-        # embedding_function = OpenAIEmbeddings(model="text-embedding-3-small")
-        embedding_function = OllamaEmbeddings(model="llama3.2")
-        vector_db_directory = f"{local_events_directory}/chroma"
-        local_db = Chroma.from_documents(
-            loaded_docs, 
-            embedding_function, 
-            persist_directory=vector_db_directory
-            # persist_directory="chroma_db"
+        ids = [m.get("id") for m in markets]
+        self.upsert_documents(
+            store,
+            ids,
+            [m.get("description") for m in markets],
+            [market_metadata(m) for m in markets],
+            [market_text(m) for m in markets],
         )
+        self.save_ann(store)
 
-        # query
-        return local_db.similarity_search_with_score(query=prompt)
+        # query, restricted to the tradeable markets of this cycle
+        return self._query(store, ids, prompt, market_filter() if where is None else where)
@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import time
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+from logger import logging
+
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.utils.cache import TTLCache
+
+
+DEFAULT_LRU_SIZE = 20_000
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_WORKERS = 4
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    splits embed_documents into fixed-size batches and sends up to
+    `max_workers` of them to the wrapped embedder concurrently. a failed batch
+    is retried with exponential backoff. throughput is tracked in docs/sec.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+    ) -> None:
+        self.embedder = embedder
+        self.model = getattr(embedder, "model", None)
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.docs = 0
+        self.seconds = 0.0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embedder.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                with self._lock:
+                    self.retries += 1
+                logging.warning(
+                    f"embedding batch of {len(texts)} failed ({e}), retrying in {delay}s"
+                )
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+        start = time.perf_counter()
+        if len(batches) == 1 or self.max_workers <= 1:
+            results = [self._embed_batch(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.docs += len(texts)
+            self.seconds += elapsed
+        logging.info(
+            f"embedded {len(texts)} docs in {len(batches)} batches, {len(texts) / max(elapsed, 1e-9):.1f} docs/sec"
+        )
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedder.embed_query(text)
+
+    def docs_per_sec(self) -> float:
+        return self.docs / self.seconds if self.seconds else 0.0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    content-addressed embedding cache keyed by (model, sha256(text))
+
+    an in-process LRU sits in front of the sqlite `embedding` table. texts that
+    miss both are de-duplicated and sent to the wrapped embedder in one
+    embed_documents call. vectors are stored as float32, so cached and fresh
+    results agree to float32 precision.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        db: Optional[PolymarketDb] = None,
+        model: Optional[str] = None,
+        lru_size: int = DEFAULT_LRU_SIZE,
+    ) -> None:
+        self.embedder = embedder
+        self.db = db
+        self.model = (
+            model or getattr(embedder, "model", None) or type(embedder).__name__
+        )
+        self.lru = TTLCache(maxsize=lru_size)
+        self.requested = 0
+        self.embedded = 0
+        self._lock = threading.Lock()
+        if self.db is not None:
+            self.db.create_db_tables()
+
+    def _lookup(self, hashes: List[str]) -> dict:
+        found = {}
+        missing = []
+        for h in hashes:
+            vector = self.lru.get(h)
+            if vector is None:
+                missing.append(h)
+            else:
+                found[h] = vector
+
+        if missing and self.db is not None:
+            with self._lock:
+                rows = self.db.read_embeddings(self.model, missing)
+            for h, blob in rows.items():
+                vector = unpack_vector(blob)
+                self.lru.set(h, vector)
+                found[h] = vector
+        return found
+
+    def _store(self, vectors: dict) -> None:
+        for h, vector in vectors.items():
+            self.lru.set(h, vector)
+        if vectors and self.db is not None:
+            with self._lock:
+                self.db.write_embeddings(
+                    self.model, {h: pack_vector(v) for h, v in vectors.items()}
+                )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        self.requested += len(hashes)
+        found = self._lookup(list(dict.fromkeys(hashes)))
+
+        misses = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                misses.setdefault(h, text)
+        if misses:
+            fresh = self.embedder.embed_documents(list(misses.values()))
+            # round through float32 so a cold call returns what a warm one would
+            fresh = {h: unpack_vector(pack_vector(v)) for h, v in zip(misses, fresh)}
+            self._store(fresh)
+            found.update(fresh)
+            self.embedded += len(fresh)
+            logging.info(
+                f"embedded {len(fresh)} of {len(texts)} texts with {self.model}"
+            )
+
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        h = text_hash(text)
+        self.requested += 1
+        found = self._lookup([h])
+        if h not in found:
+            vector = unpack_vector(pack_vector(self.embedder.embed_query(text)))
+            self._store({h: vector})
+            self.embedded += 1
+            return vector
+        return found[h]
+
+    def hit_ratio(self) -> float:
+        """share of requested texts served without calling the embedder"""
+        return 1 - self.embedded / self.requested if self.requested else 0.0
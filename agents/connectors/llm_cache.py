@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+import time
+
+from typing import Any, Optional
+
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.utils.cache import TTLCache
+
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_LRU_SIZE = 1024
+
+
+def serialize_prompt(prompt: Any) -> str:
+    """strings as-is, message lists as (type, content) pairs"""
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return json.dumps(
+            [[getattr(m, "type", ""), getattr(m, "content", str(m))] for m in prompt]
+        )
+    return str(prompt)
+
+
+class LLMResponseCache:
+    """
+    llm completions keyed by sha256(model, temperature, num_predict, prompt)
+
+    an in-process LRU sits in front of the sqlite `llm_response` table.
+    entries older than `ttl` seconds are treated as misses and deleted from
+    the table whenever a cache is opened on it.
+    """
+
+    def __init__(
+        self,
+        db: Optional[PolymarketDb] = None,
+        ttl: float = DEFAULT_TTL,
+        lru_size: int = DEFAULT_LRU_SIZE,
+    ) -> None:
+        self.db = db
+        self.ttl = ttl
+        self.lru = TTLCache(maxsize=lru_size, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if self.db is not None:
+            self.db.create_db_tables()
+            self.purge()
+
+    def key(
+        self,
+        model: str,
+        temperature: Any,
+        num_predict: Any,
+        prompt: Any,
+        stop: Optional[str] = None,
+    ) -> str:
+        """
+        stop names the condition a streamed answer was cut short by, such
+        answers never share a key with the full completion of the prompt
+        """
+        fields = [model, temperature, num_predict, serialize_prompt(prompt)]
+        if stop is not None:
+            fields.append(stop)
+        payload = json.dumps(fields)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        response = self.lru.get(key)
+        if response is None and self.db is not None:
+            with self._lock:
+                row = self.db.read_llm_response(key)
+            if row is not None:
+                age = time.time() - row[1]
+                if age < self.ttl:
+                    response = row[0]
+                    self.lru.set(key, response, ttl=self.ttl - age)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        self.lru.set(key, response)
+        if self.db is not None:
+            with self._lock:
+                self.db.write_llm_response(key, model, response, int(time.time()))
+
+    def purge(self) -> int:
+        """deletes expired rows from the table, returns how many"""
+        if self.db is None:
+            return 0
+        with self._lock:
+            return self.db.delete_llm_responses(int(time.time() - self.ttl))
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio()}
@@ -1,14 +1,50 @@
+import json
+import queue
 import sqlite3
+import threading
+import time
 
+from datetime import datetime, timezone
+from dateutil.parser import isoparse
 from sqlite3 import Connection
+from typing import Iterator, Optional
 from logger import logging
 
-from agents.utils.objects import Trade, ActivityUser, UserPosition, TradedUser, ValueUser
+from agents.utils.objects import Trade, ActivityUser, UserPosition, TradedUser, ValueUser, SimpleEvent
 import agents.utils.consts as consts
 
 
+# errors caused by one row's data, the row is skipped and the batch goes on
+_ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError, sqlite3.DataError)
+
+
+def iso_to_unix(value: Optional[str]) -> Optional[int]:
+    """ gamma returns dates as iso strings, tables store unix timestamps """
+    if not value:
+        return None
+    try:
+        return int(isoparse(value).timestamp())
+    except ValueError:
+        return None
+
+
+def unix_to_iso(value: Optional[int]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
 class PolymarketDb():
-    def __init__(self):
+    def __init__(
+        self,
+        db_name: str = consts._DB_NAME,
+        chunk_size: int = consts._WRITE_CHUNK_SIZE,
+        pragmas: Optional[dict] = None,
+    ):
+        self.db_name = db_name
+        self.chunk_size = chunk_size
+        # None uses the tuned profile, {} keeps sqlite defaults
+        self.pragmas = consts._DB_PRAGMAS if pragmas is None else pragmas
         self.connection = self._init_create_database()
         self.cursor = self.connection.cursor()
 
@@ -17,13 +53,28 @@ class PolymarketDb():
         # create sql tables
                 self._init_trade()
                 self._init_polymarket_event()
+                self._init_market()
+                self._init_sync_state()
                 self._init_activity_user()
                 self._init_value_user()
+                self._init_traded_user()
                 self._init_user_position()
+                self._init_settlement()
+                self._init_embedding()
+                self._init_llm_response()
 
     def _init_create_database(self) -> Connection:
-        logging.info(f"create sqlite3 database: \'{consts._DB_NAME}\'")
-        return sqlite3.connect(consts._DB_NAME)
+        logging.info(f"create sqlite3 database: \'{self.db_name}\'")
+        # callers that share one instance across threads serialize access themselves
+        busy_timeout = self.pragmas.get("busy_timeout", 5000) / 1000
+        connection = sqlite3.connect(self.db_name, timeout=busy_timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def read_pragmas(self) -> dict:
+        """ effective values of the configured pragmas """
+        return {name: self.connection.execute(f"PRAGMA {name}").fetchone()[0] for name in self.pragmas}
         
     def _init_trade(self) -> None:
         logging.info(f"create sql table: \'{consts._TRADE}\'")
@@ -32,6 +83,11 @@ class PolymarketDb():
     def _init_polymarket_event(self) -> None:
         logging.info(f"create sql table: \'{consts._POLYMARKET_EVENT}\'")
         self.cursor.execute(consts.CREATE_TABLE_POLYMARKET_EVENT)
+        # tables created before the sync engine lack the description column
+        columns = [r[1] for r in self.cursor.execute(f"PRAGMA table_info({consts._POLYMARKET_EVENT})")]
+        if "description" not in columns:
+            self.cursor.execute(f"ALTER TABLE {consts._POLYMARKET_EVENT} ADD COLUMN description TEXT")
+        self.cursor.execute(consts.CREATE_INDEX_POLYMARKET_EVENT_ID)
 
     def _init_market(self) -> None:
         _TABLE_NAME = "market"
@@ -42,6 +98,21 @@ class PolymarketDb():
         _TABLE_NAME = "activity_user" 
         logging.info(f"create sql table: \'{consts._ACTIVITY_USER}\'")
         self.cursor.execute(consts.CREATE_TABLE_ACTIVITY_USER)
+        self._create_natural_key(consts.DEDUPE_ACTIVITY_USER_TABLE, consts.CREATE_INDEX_ACTIVITY_USER_KEY)
+        # rows written before wallets were normalized
+        self.cursor.execute(consts.NORMALIZE_ACTIVITY_USER_WALLET)
+        self.connection.commit()
+        self.cursor.execute(consts.CREATE_INDEX_ACTIVITY_USER_WALLET_SIDE_TS)
+        self.cursor.execute(consts.CREATE_INDEX_ACTIVITY_USER_SIDE_TS)
+
+    def _create_natural_key(self, dedupe_sql: str, index_sql: str) -> None:
+        try:
+            self.cursor.execute(index_sql)
+        except sqlite3.IntegrityError:
+            # duplicates from before the key existed, keep the newest copy of each
+            self.cursor.execute(dedupe_sql)
+            logging.info(f"removed {self.cursor.rowcount} duplicate rows")
+            self.cursor.execute(index_sql)
 
     def _init_value_user(self) -> None:
         _TABLE_NAME = "value_user"
@@ -57,12 +128,85 @@ class PolymarketDb():
         _TABLE_NAME = "user_position"
         logging.info(f"create sql table \'{consts._USER_POSITION}\'")
         self.cursor.execute(consts.CREATE_TABLE_USER_POSITION)
+        self._create_natural_key(consts.DEDUPE_USER_POSITION_TABLE, consts.CREATE_INDEX_USER_POSITION_KEY)
+
+    def _init_sync_state(self) -> None:
+        logging.info(f"create sql table \'{consts._SYNC_STATE}\'")
+        self.cursor.execute(consts.CREATE_TABLE_SYNC_STATE)
+
+    def _init_settlement(self) -> None:
+        logging.info(f"create sql table \'{consts._SETTLEMENT}\'")
+        self.cursor.execute(consts.CREATE_TABLE_SETTLEMENT)
+
+    def _init_embedding(self) -> None:
+        logging.info(f"create sql table \'{consts._EMBEDDING}\'")
+        self.cursor.execute(consts.CREATE_TABLE_EMBEDDING)
+
+    def _init_llm_response(self) -> None:
+        logging.info(f"create sql table \'{consts._LLM_RESPONSE}\'")
+        self.cursor.execute(consts.CREATE_TABLE_LLM_RESPONSE)
 
     def close(self) -> None:
         self.connection.close()
 
-    def write_trade(self, trade: Trade) -> None:
-        self.cursor.execute(consts.INSERT_TRADE_TABLE, (
+    def _write_many(self, sql: str, rows: list, chunk_size: Optional[int] = None) -> int:
+        """
+        inserts rows with executemany in one transaction, returns rows written
+
+        each chunk runs inside a savepoint: a chunk with bad rows is rolled back
+        and retried row by row, skipping rows that violate a constraint or do
+        not bind. any other error (locked/full/interrupted db) rolls back the
+        whole batch and is raised, nothing is committed until every chunk is in
+        """
+        chunk_size = chunk_size or self.chunk_size
+        written = 0
+        # a caller's open transaction is extended with a savepoint instead
+        owns_transaction = not self.connection.in_transaction
+        self.cursor.execute("BEGIN" if owns_transaction else "SAVEPOINT batch")
+        try:
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i:i + chunk_size]
+                self.cursor.execute("SAVEPOINT chunk")
+                try:
+                    self.cursor.executemany(sql, chunk)
+                    written += self.cursor.rowcount
+                except _ROW_ERRORS:
+                    # undo the partial chunk, then isolate the offending rows
+                    self.cursor.execute("ROLLBACK TO chunk")
+                    for row in chunk:
+                        try:
+                            self.cursor.execute(sql, row)
+                            written += self.cursor.rowcount
+                        except _ROW_ERRORS:
+                            logging.exception("SqliteException")
+                self.cursor.execute("RELEASE chunk")
+        except BaseException:
+            if owns_transaction:
+                self.connection.rollback()
+            else:
+                self.cursor.execute("ROLLBACK TO batch")
+                self.cursor.execute("RELEASE batch")
+            raise
+        if owns_transaction:
+            self.connection.commit()
+        else:
+            self.cursor.execute("RELEASE batch")
+        return written
+
+    def _write_objects(self, sql: str, objects, to_row, chunk_size: Optional[int] = None) -> tuple[int, int]:
+        rows = []
+        skipped = 0
+        for obj in objects:
+            try:
+                rows.append(to_row(obj))
+            except Exception as e:
+                logging.exception("SqliteRowException")
+                skipped += 1
+        inserted = self._write_many(sql, rows, chunk_size)
+        return inserted, skipped + len(rows) - inserted
+
+    def _trade_row(self, trade: Trade) -> tuple:
+        return (
             trade['id'],
             trade['taker_order_id'],
             trade['market'],
@@ -81,167 +225,618 @@ class PolymarketDb():
             trade['bucket_index'],
             trade['maker_orders'],
             trade['type']
-        ))
-        self.connection.commit()
-        
-    
+        )
+
+    def _activity_user_row(self, activity_user: ActivityUser) -> tuple:
+        return (
+            # addresses are case-insensitive, reads match on the lowercase form
+            activity_user.proxyWallet.lower(),
+            activity_user.timestamp,
+            activity_user.conditionId,
+            activity_user.type,
+            activity_user.size,
+            activity_user.usdcSize,
+            activity_user.transactionHash,
+            activity_user.price,
+            activity_user.asset,
+            activity_user.side,
+            activity_user.outcomeIndex,
+            activity_user.title,
+            activity_user.slug,
+            activity_user.icon,
+            activity_user.eventSlug,
+            activity_user.outcome,
+            activity_user.name,
+            activity_user.pseudonym,
+            activity_user.bio,
+            activity_user.profileImage,
+            activity_user.profileImageOptimized
+        )
+
+    def _user_position_row(self, user_position: UserPosition) -> tuple:
+        return (
+            user_position.proxyWallet,
+            user_position.asset,
+            user_position.conditionId,
+            user_position.size,
+            user_position.avgPrice,
+            user_position.initialValue,
+            user_position.currentValue,
+            user_position.cashPnl,
+            user_position.percentPnl,
+            user_position.totalBought,
+            user_position.realizedPnl,
+            user_position.percentRealizedPnl,
+            user_position.curPrice,
+            user_position.redeemable,
+            user_position.mergeable,
+            user_position.title,
+            user_position.slug,
+            user_position.icon,
+            user_position.eventSlug,
+            user_position.outcome,
+            user_position.outcomeIndex,
+            user_position.oppositeOutcome,
+            user_position.oppositeAsset,
+            user_position.endDate,
+            user_position.negativeRisk
+        )
+
+    def _traded_user_row(self, traded_user: TradedUser) -> tuple:
+        return (traded_user.user, traded_user.traded)
+
+    def _value_user_row(self, value_user: ValueUser) -> tuple:
+        return (value_user.user, value_user.value)
+
+    def write_trades(self, trades, chunk_size: Optional[int] = None) -> tuple[int, int]:
+        """ bulk insert, returns (inserted, skipped) """
+        return self._write_objects(consts.INSERT_TRADE_TABLE, trades, self._trade_row, chunk_size)
+
+    def write_trade(self, trade: Trade) -> None:
+        self.write_trades([trade])
+
     def read_trade(self) -> list[Trade]:
         self.cursor.execute(f"SELECT * FROM {consts._TRADE}")
         rows = self.cursor.fetchall()
         return rows
 
+    def write_activity_users(self, activity_users, chunk_size: Optional[int] = None) -> tuple[int, int]:
+        """ bulk upsert on (transactionHash, asset, side), returns (written, skipped) """
+        inserted, skipped = self._write_objects(
+            consts.UPSERT_ACTIVITY_USER_TABLE, activity_users, self._activity_user_row, chunk_size
+        )
+        logging.info(f"wrote {inserted} activity rows ({skipped} skipped) to sqlite3 database: {self.db_name}")
+        return inserted, skipped
+
     def write_activity_user(self, activity_user: ActivityUser) -> None:
         if activity_user is None:
             # Handle the case where activity_user is None
             raise ValueError("activity_user cannot be None")
-    
-        try:
-            logging.info(f"writing 0x{activity_user.__hash__()} to sqlite3 database: {consts._DB_NAME}")
-            self.cursor.execute(consts.INSERT_ACTIVITY_USER_TABLE, (
-                activity_user.proxyWallet,
-                activity_user.timestamp,
-                activity_user.conditionId,
-                activity_user.type,
-                activity_user.size,
-                activity_user.usdcSize,
-                activity_user.transactionHash,
-                activity_user.price,
-                activity_user.asset,
-                activity_user.side,
-                activity_user.outcomeIndex,
-                activity_user.title,
-                activity_user.slug,
-                activity_user.icon,
-                activity_user.eventSlug,
-                activity_user.outcome,
-                activity_user.name,
-                activity_user.pseudonym,
-                activity_user.bio,
-                activity_user.profileImage,
-                activity_user.profileImageOptimized
-            ))
-            self.connection.commit()
-        except Exception as e:
-            logging.exception("SqliteException")
-
+        self.write_activity_users([activity_user])
 
     def read_activity_user(self) -> list[ActivityUser]:
         self.cursor.execute(f"SELECT * FROM {consts._ACTIVITY_USER}")
         rows = self.cursor.fetchall()
         return rows
 
+    def write_user_positions(self, user_positions, chunk_size: Optional[int] = None) -> tuple[int, int]:
+        """ bulk upsert on (proxyWallet, asset), returns (written, skipped) """
+        inserted, skipped = self._write_objects(
+            consts.UPSERT_USER_POSITION_TABLE, user_positions, self._user_position_row, chunk_size
+        )
+        logging.info(f"wrote {inserted} position rows ({skipped} skipped) to sqlite3 database: {self.db_name}")
+        return inserted, skipped
+
     def write_user_position(self, user_position: UserPosition) -> None:
         if user_position is None:
             raise ValueError(f"user_position cannot be None")
-        
-        try:
-            logging.info(f"writing 0x{user_position.__hash__()} to sqlite3 database {consts._DB_NAME}")
-            self.cursor.execute(consts.INSERT_USER_POSITION_TABLE, (
-                user_position.proxyWallet,
-                user_position.asset,
-                user_position.conditionId,
-                user_position.size,
-                user_position.avgPrice,
-                user_position.initialValue,
-                user_position.currentValue,
-                user_position.cashPnl,
-                user_position.percentPnl,
-                user_position.totalBought,
-                user_position.realizedPnl,
-                user_position.percentRealizedPnl,
-                user_position.curPrice,
-                user_position.redeemable,
-                user_position.mergeable,
-                user_position.title,
-                user_position.slug,
-                user_position.icon,
-                user_position.eventSlug,
-                user_position.outcome,
-                user_position.outcomeIndex,
-                user_position.oppositeOutcome,
-                user_position.oppositeAsset,
-                user_position.endDate,
-                user_position.negativeRisk
-            ))
-            self.connection.commit()
-        except Exception as e:
-            logging.exception("SqliteException")
+        self.write_user_positions([user_position])
+
+    def write_traded_users(self, traded_users, chunk_size: Optional[int] = None) -> tuple[int, int]:
+        """ bulk insert in a single transaction, returns (inserted, skipped) """
+        return self._write_objects(
+            consts.INSERT_TRADED_USER_TABLE, traded_users, self._traded_user_row, chunk_size
+        )
 
     def write_traded_user(self, traded_user: TradedUser) -> None:
         if traded_user is None:
             raise ValueError(f"traded_user cannot be None")
-        
-        try: 
-            logging.info(f"writing {traded_user.__hash__()} to sqlite3 database {consts._DB_NAME}")
-            self.cursor.execute(consts.INSERT_TRADED_USER_TABLE, (
-                traded_user.user,
-                traded_user.traded
+        self.write_traded_users([traded_user])
+
+    def write_value_users(self, value_users, chunk_size: Optional[int] = None) -> tuple[int, int]:
+        """ bulk insert in a single transaction, returns (inserted, skipped) """
+        return self._write_objects(
+            consts.INSERT_VALUE_USER_TABLE, value_users, self._value_user_row, chunk_size
+        )
+
+    def write_value_user(self, value_user: ValueUser) -> None:
+        if value_user is None:
+            raise ValueError(f"value_user cannot be none")
+        self.write_value_users([value_user])
+
+    def upsert_events(self, events: list[dict]) -> int:
+        """ upserts gamma /events payloads (and their nested markets), returns changed event rows """
+        rows = []
+        markets = []
+        for event in events:
+            markets.extend(event.get("markets") or [])
+            rows.append((
+                str(event["id"]),
+                event.get("ticker"),
+                event.get("slug"),
+                event.get("title"),
+                event.get("description", ""),
+                iso_to_unix(event.get("startDate")),
+                iso_to_unix(event.get("createdAt")),
+                iso_to_unix(event.get("endDate")),
+                event.get("image"),
+                event.get("icon"),
+                event.get("active"),
+                event.get("closed"),
+                event.get("archived"),
+                event.get("new"),
+                event.get("featured"),
+                event.get("restricted"),
+                event.get("liquidity"),
+                event.get("volume"),
+                iso_to_unix(event.get("updatedAt")),
+                event.get("volume24hr"),
+                event.get("enableOrderBook"),
+                event.get("liquidityClob"),
+                event.get("commentCount"),
+                ",".join(str(m["id"]) for m in event.get("markets") or []),
+                json.dumps([t.get("slug") for t in event.get("tags") or []]),
             ))
+
+        changes = self.connection.total_changes
+        with self.connection:
+            self.cursor.executemany(consts.UPSERT_POLYMARKET_EVENT_TABLE, rows)
+        changed = self.connection.total_changes - changes
+        self.upsert_markets(markets)
+        return changed
+
+    def upsert_markets(self, markets: list[dict]) -> int:
+        """ upserts gamma /markets payloads, returns written rows """
+        rows = [(
+            int(market["id"]),
+            market.get("question"),
+            market.get("conditionId"),
+            market.get("slug"),
+            iso_to_unix(market.get("endDate")),
+            market.get("liquidity"),
+            iso_to_unix(market.get("startDate")),
+            market.get("description"),
+            market.get("outcomes"),
+            market.get("outcomePrices"),
+            market.get("volume"),
+            market.get("active"),
+            market.get("closed"),
+            iso_to_unix(market.get("updatedAt")),
+            market.get("archived"),
+            market.get("restricted"),
+            market.get("questionID"),
+            market.get("enableOrderBook"),
+            market.get("clobTokenIds"),
+            market.get("acceptingOrders"),
+            market.get("negRisk"),
+            market.get("funded"),
+            market.get("rewardsMinSize"),
+            market.get("rewardsMaxSpread"),
+            market.get("spread"),
+        ) for market in markets]
+
+        changes = self.connection.total_changes
+        with self.connection:
+            self.cursor.executemany(consts.UPSERT_MARKET_TABLE, rows)
+        return self.connection.total_changes - changes
+
+    def read_tradeable_events(self, now: Optional[int] = None) -> list[SimpleEvent]:
+        """ active, open, unrestricted events from the local mirror that have not ended yet """
+        now = int(time.time()) if now is None else now
+        self.cursor.execute(
+            f"""
+                SELECT id, ticker, slug, title, description, end_date, active, closed,
+                  archived, restricted, new, featured, markets, tags
+                FROM {consts._POLYMARKET_EVENT}
+                WHERE active = 1 AND closed = 0 AND archived = 0 AND restricted = 0
+                AND end_date > ?
+                ORDER BY CAST(id AS INTEGER);
+            """,
+            (now,)
+        )
+        events = []
+        for r in self.cursor.fetchall():
+            try:
+                events.append(SimpleEvent(
+                    id=int(r[0]),
+                    ticker=r[1] or "",
+                    slug=r[2] or "",
+                    title=r[3] or "",
+                    description=r[4] or "",
+                    end=unix_to_iso(r[5]),
+                    active=bool(r[6]),
+                    closed=bool(r[7]),
+                    archived=bool(r[8]),
+                    restricted=bool(r[9]),
+                    new=bool(r[10]),
+                    featured=bool(r[11]),
+                    markets=r[12] or "",
+                    # gamma /markets payloads carry no tags, markets inherit these
+                    tags=",".join(t for t in json.loads(r[13] or "[]") if t),
+                ))
+            except Exception as e:
+                logging.exception("ReadPolymarketEventException")
+        return events
+
+    def read_sync_state(self, name: str) -> Optional[int]:
+        self.cursor.execute(
+            f"SELECT high_water FROM {consts._SYNC_STATE} WHERE name = ?", (name,)
+        )
+        row = self.cursor.fetchone()
+        return None if row is None else row[0]
+
+    def write_sync_state(self, name: str, high_water: Optional[int]) -> None:
+        with self.connection:
+            self.cursor.execute(
+                consts.UPSERT_SYNC_STATE_TABLE, (name, high_water, int(time.time()))
+            )
+
+    def read_settlements(self, condition_ids: list[str]) -> dict:
+        """ returns {condition_id: (payout denominator, payout numerators, checked_at)} """
+        settlements = {}
+        ids = list(condition_ids)
+        # stay well below SQLITE_MAX_VARIABLE_NUMBER
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            self.cursor.execute(
+                f"""
+                    SELECT condition_id, payout_denominator, payout_numerators, checked_at
+                    FROM {consts._SETTLEMENT}
+                    WHERE condition_id IN ({",".join("?" * len(chunk))})
+                """,
+                chunk
+            )
+            for r in self.cursor.fetchall():
+                settlements[r[0]] = (r[1], json.loads(r[2]), r[3])
+        return settlements
+
+    def write_settlements(self, settlements: dict, checked_at: int) -> None:
+        """ upserts {condition_id: (payout denominator, payout numerators)} """
+        try:
+            self.cursor.executemany(consts.UPSERT_SETTLEMENT_TABLE, [
+                (condition_id, denom, json.dumps(nums), checked_at)
+                for condition_id, (denom, nums) in settlements.items()
+            ])
             self.connection.commit()
         except Exception as e:
             logging.exception("SqliteException")
 
-    def write_value_user(self, value_user: ValueUser) -> None:
-        if value_user is None:
-            raise ValueError(f"value_user cannot be none")
-        
+    def read_embeddings(self, model: str, hashes: list[str]) -> dict:
+        """ returns {content_hash: packed float32 vector} """
+        vectors = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            self.cursor.execute(
+                f"""
+                    SELECT content_hash, vector FROM {consts._EMBEDDING}
+                    WHERE model = ? AND content_hash IN ({",".join("?" * len(chunk))})
+                """,
+                [model] + chunk
+            )
+            for r in self.cursor.fetchall():
+                vectors[r[0]] = r[1]
+        return vectors
+
+    def write_embeddings(self, model: str, vectors: dict) -> None:
+        """ stores {content_hash: packed float32 vector}, vectors are immutable per hash """
+        created_at = int(time.time())
         try:
-            logging.info(f"writing {value_user.__hash__()} to sqlite3 database {consts._DB_NAME}")
-            self.cursor.excute(consts.INSERT_VALUE_USER_TABLE, (
-                value_user.user,
-                value_user.value
-            ))
+            with self.connection:
+                self.cursor.executemany(consts.INSERT_EMBEDDING_TABLE, [
+                    (model, content_hash, vector, created_at)
+                    for content_hash, vector in vectors.items()
+                ])
         except Exception as e:
             logging.exception("SqliteException")
 
-    
-    def read_activity_positions_by_user_timestamp(self, timestamp: int) -> list[ActivityUser]:
-        obj = []
+    def read_llm_response(self, cache_key: str) -> Optional[tuple]:
+        """ returns (response, created_at) or None """
         self.cursor.execute(
+            f"SELECT response, created_at FROM {consts._LLM_RESPONSE} WHERE cache_key = ?",
+            (cache_key,)
+        )
+        return self.cursor.fetchone()
+
+    def write_llm_response(self, cache_key: str, model: str, response: str, created_at: int) -> None:
+        try:
+            with self.connection:
+                self.cursor.execute(
+                    consts.UPSERT_LLM_RESPONSE_TABLE, (cache_key, model, response, created_at)
+                )
+        except Exception as e:
+            logging.exception("SqliteException")
+
+    def delete_llm_responses(self, older_than: int) -> int:
+        with self.connection:
+            self.cursor.execute(f"DELETE FROM {consts._LLM_RESPONSE} WHERE created_at < ?", (older_than,))
+        return self.cursor.rowcount
+
+    def _activity_user_from_row(self, r: tuple) -> ActivityUser:
+        return ActivityUser(
+            proxyWallet=r[0], 
+            timestamp=r[1], 
+            conditionId=r[2], 
+            type=r[3], 
+            size=r[4], 
+            usdcSize=r[5], 
+            transactionHash=r[6], 
+            price=r[7], 
+            asset=r[8], 
+            side=r[9], 
+            outcomeIndex=r[10], 
+            title=r[11], 
+            slug=r[12], 
+            icon=r[13], 
+            eventSlug=r[14], 
+            outcome=r[15], 
+            name=r[16], 
+            pseudonym=r[17], 
+            bio=r[18], 
+            profileImage=r[19], 
+            profileImageOptimized=r[20]
+        )
+
+    def iter_activity_user(
+        self,
+        proxy_wallet: Optional[str] = None,
+        side: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        batch_size: int = 500,
+    ) -> Iterator[ActivityUser]:
+        """ streams activity newest first, filtered by wallet, side and (start, end] window """
+        clauses = []
+        params = []
+        if proxy_wallet is not None:
+            clauses.append("proxy_wallet = ?")
+            params.append(proxy_wallet.lower())
+        if side is not None:
+            clauses.append("side = ?")
+            params.append(side)
+        if start is not None:
+            clauses.append("timestamp > ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # own cursor so writes on self.cursor don't reset a half-read stream
+        cursor = self.connection.cursor()
+        cursor.execute(
             f"""
                 SELECT proxy_wallet, timestamp, conditionId, type, size, usdcSize, transactionHash,
                   price, asset, side, outcomeIndex, title, slug, icon, event_slug, outcome,
                   name, pseudonym, bio, profile_image, profile_image_optimized
-                FROM activity_user 
-                -- INNER JOIN user_position 
-                -- ON activity_user.asset = user_position.asset 
-                WHERE activity_user.side = 'BUY' 
-                AND activity_user.timestamp > 1747062974 -- {timestamp} 
-                GROUP BY conditionId
-                ORDER BY activity_user.timestamp desc;
-            """   
+                FROM {consts._ACTIVITY_USER}
+                {where}
+                ORDER BY timestamp DESC
+            """,
+            params,
         )
-        
-        # rows = self.cursor.fetchall()
-        for r in self.cursor.fetchall():
-            _activity_user = ActivityUser(
-                proxyWallet=r[0], 
-                timestamp=r[1], 
-                conditionId=r[2], 
-                type=r[3], 
-                size=r[4], 
-                usdcSize=r[5], 
-                transactionHash=r[6], 
-                price=r[7], 
-                asset=r[8], 
-                side=r[9], 
-                outcomeIndex=r[10], 
-                title=r[11], 
-                slug=r[12], 
-                icon=r[13], 
-                eventSlug=r[14], 
-                outcome=r[15], 
-                name=r[16], 
-                pseudonym=r[17], 
-                bio=r[18], 
-                profileImage=r[19], 
-                profileImageOptimized=r[20]
-            )
-            # _activity_user = ActivityUser(**dict(row))
-            obj.append(_activity_user)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for r in rows:
+                    yield self._activity_user_from_row(r)
+        finally:
+            cursor.close()
 
-        # ActivityUser.model_validate(dict(row)) for row in rows
+    def read_activity_positions_by_user_timestamp(
+        self, timestamp: int, proxy_wallet: Optional[str] = None, side: str = "BUY"
+    ) -> list[ActivityUser]:
+        """ latest `side` activity per conditionId after `timestamp` """
+        obj = []
+        seen = set()
+        for activity_user in self.iter_activity_user(proxy_wallet=proxy_wallet, side=side, start=timestamp):
+            if activity_user.conditionId in seen:
+                continue
+            seen.add(activity_user.conditionId)
+            obj.append(activity_user)
         return obj
     
     
     
+
+
+class PolymarketDbWriter():
+    """
+    write-behind front for PolymarketDb
+
+    write_* calls enqueue rows and return immediately. a single writer thread
+    with its own connection drains the queue, merging consecutive requests for
+    the same table into one batched transaction. the queue is bounded, so a
+    producer that outruns the disk blocks instead of growing memory.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        db_name: str = consts._DB_NAME,
+        max_queue: int = 1000,
+        batch_size: int = consts._WRITE_CHUNK_SIZE,
+        poll_interval: float = 0.5,
+    ):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.written = 0
+        self.skipped = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._ready = threading.Event()
+        self._error = None
+        # (method, rows, exception) of batches that were not committed
+        self._failed = []
+        self._failed_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="polymarket-db-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+
+    def _run(self) -> None:
+        db = None
+        try:
+            db = PolymarketDb(self.db_name, chunk_size=self.batch_size)
+            db.create_db_tables()
+        except BaseException as e:
+            self._error = e
+            if db is not None:
+                db.close()
+            return
+        finally:
+            # the constructor waits on this, it must be set on every path
+            self._ready.set()
+        try:
+            pending = None
+            while True:
+                item = pending or self._queue.get()
+                pending = None
+                if item is self._STOP:
+                    self._queue.task_done()
+                    return
+
+                method, rows = item
+                done = 1
+                # merge whatever is already queued for the same table
+                while len(rows) < self.batch_size:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(nxt, tuple) and nxt[0] == method:
+                        rows.extend(nxt[1])
+                        done += 1
+                    else:
+                        pending = nxt
+                        break
+
+                try:
+                    written, skipped = getattr(db, method)(rows)
+                    self.written += written
+                    self.skipped += skipped
+                except Exception as e:
+                    self.errors += 1
+                    logging.exception("SqliteWriterException")
+                    # recorded before task_done, so the flush waiting on it sees it
+                    with self._failed_lock:
+                        self._failed.append((method, len(rows), e))
+                for _ in range(done):
+                    self._queue.task_done()
+        except BaseException as e:
+            self._error = e
+            logging.exception("SqliteWriterException")
+        finally:
+            db.close()
+
+    def _check_alive(self) -> None:
+        """ raises instead of letting callers block on a queue nobody drains """
+        if self._error is not None:
+            raise RuntimeError("writer thread failed") from self._error
+        if not self._thread.is_alive():
+            raise RuntimeError("writer thread is not running")
+
+    def _raise_failed(self) -> None:
+        """ raises (once) for batches that failed since the last flush/close """
+        with self._failed_lock:
+            failed, self._failed = self._failed, []
+        if failed:
+            rows = sum(n for _, n, _ in failed)
+            methods = sorted({method for method, _, _ in failed})
+            raise RuntimeError(
+                f"{len(failed)} write batches failed ({', '.join(methods)}), {rows} rows not committed"
+            ) from failed[-1][2]
+
+    def _submit(self, method: str, rows) -> None:
+        if self._closed:
+            raise ValueError("writer is closed")
+        rows = [r for r in rows if r is not None]
+        if not rows:
+            return
+        while True:
+            self._check_alive()
+            try:
+                self._queue.put((method, rows), timeout=self.poll_interval)
+                return
+            except queue.Full:
+                continue
+
+    def write_trades(self, trades) -> None:
+        self._submit("write_trades", trades)
+
+    def write_activity_users(self, activity_users) -> None:
+        self._submit("write_activity_users", activity_users)
+
+    def write_user_positions(self, user_positions) -> None:
+        self._submit("write_user_positions", user_positions)
+
+    def write_traded_users(self, traded_users) -> None:
+        self._submit("write_traded_users", traded_users)
+
+    def write_value_users(self, value_users) -> None:
+        self._submit("write_value_users", value_users)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        blocks until everything enqueued so far is committed
+
+        raises RuntimeError if a batch failed to commit or the writer thread
+        died with rows still queued, and TimeoutError if they are not
+        committed within `timeout` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                self._check_alive()
+                wait = self.poll_interval
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise TimeoutError(f"{self._queue.unfinished_tasks} writes still pending")
+                    wait = min(wait, left)
+                self._queue.all_tasks_done.wait(wait)
+        self._raise_failed()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        while self._thread.is_alive():
+            try:
+                self._queue.put(self._STOP, timeout=self.poll_interval)
+                break
+            except queue.Full:
+                continue
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.warning("writer thread still draining after close timeout")
+        self._raise_failed()
+
+    def __enter__(self) -> "PolymarketDbWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self.close()
+        except RuntimeError:
+            # don't mask the exception that is already unwinding the block
+            if exc_type is None:
+                raise
+            logging.exception("SqliteWriterException")
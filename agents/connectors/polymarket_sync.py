@@ -0,0 +1,87 @@
+from dateutil.parser import isoparse
+from logger import logging
+
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.polymarket.gamma import GammaMarketClient
+from agents.polymarket.paginator import OffsetPaginator
+
+
+def _updated_at_ms(event: dict) -> int:
+    try:
+        return int(isoparse(event.get("updatedAt")).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return 0
+
+
+class PolymarketSync:
+    """
+    incremental mirror of gamma events (and their nested markets) in PolymarketDb
+
+    the first run downloads the tradeable universe. later runs page through
+    /events ordered by updatedAt (newest first) and stop at the stored
+    high-water mark, so a warm cycle costs one small request. closed or
+    archived events arrive through the same delta and are flagged in place.
+    """
+
+    EVENTS = "events"
+
+    def __init__(
+        self,
+        db: PolymarketDb,
+        gamma: GammaMarketClient,
+        page_size: int = 100,
+        max_workers: int = 8,
+    ) -> None:
+        self.db = db
+        self.gamma = gamma
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.db.create_db_tables()
+
+    def _full_events(self) -> list[dict]:
+        def fetch_page(offset: int, limit: int) -> list:
+            params = {
+                "active": "true",
+                "closed": "false",
+                "archived": "false",
+                "restricted": "false",
+                "limit": limit,
+                "offset": offset,
+            }
+            return self.gamma.get_events(querystring_params=params)
+
+        paginator = OffsetPaginator(
+            fetch_page, page_size=self.page_size, max_workers=self.max_workers
+        )
+        return paginator.fetch_all()
+
+    def _delta_events(self, high_water: int) -> list[dict]:
+        events = []
+        offset = 0
+        while True:
+            params = {
+                "order": "updatedAt",
+                "ascending": "false",
+                "limit": self.page_size,
+                "offset": offset,
+            }
+            page = self.gamma.get_events(querystring_params=params)
+            fresh = [e for e in page if _updated_at_ms(e) > high_water]
+            events.extend(fresh)
+            if len(fresh) < len(page) or len(page) < self.page_size:
+                return events
+            offset += self.page_size
+
+    def sync_events(self) -> int:
+        """brings the local event/market mirror up to date, returns changed event rows"""
+        high_water = self.db.read_sync_state(self.EVENTS)
+        if high_water is None:
+            events = self._full_events()
+        else:
+            events = self._delta_events(high_water)
+
+        changed = self.db.upsert_events(events)
+        updated = [_updated_at_ms(e) for e in events]
+        self.db.write_sync_state(self.EVENTS, max(updated + [high_water or 0]))
+        logging.info(f"synced {len(events)} events, {changed} changed")
+        return changed
@@ -1,15 +1,56 @@
-import httpx
+import asyncio
 import json
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from agents.polymarket.paginator import AsyncOffsetPaginator, OffsetPaginator
 from agents.polymarket.polymarket import Polymarket
+from agents.polymarket.transport import (
+    AsyncHttpTransport,
+    HttpTransport,
+    get_transport,
+)
+from agents.utils.cache import TTLCache
 from agents.utils.objects import Market, PolymarketEvent, ClobReward, Tag
 
 
-class GammaMarketClient:
-    def __init__(self):
+# prices move, but within one agent cycle a market fetched for one event
+# is good enough for every other event that lists it. this is the only cache
+# for gamma markets, the http response cache skips /markets
+MARKET_CACHE_TTL = 30
+MARKET_CACHE_SIZE = 2048
+# ids per /markets?id=..&id=.. request, keeps the query string well under url limits
+MARKET_ID_BATCH_SIZE = 50
+
+
+def _unique_ids(market_ids: Iterable) -> "list[str]":
+    """stringified, stripped, deduplicated ids in first-seen order"""
+    ids = (str(i).strip() for i in market_ids if i is not None)
+    return list(dict.fromkeys(i for i in ids if i))
+
+
+def _current_params(limit: int, offset: Optional[int] = None, **extra) -> dict:
+    params = {"active": True, "closed": False, "archived": False, "limit": limit}
+    if offset is not None:
+        params["offset"] = offset
+    params.update(extra)
+    return params
+
+
+class _GammaClientBase:
+    """
+    urls, payload parsing and the market id cache shared by the sync and
+    async gamma clients. request methods live in the subclasses, so no
+    sync helper is ever inherited by the async client
+    """
+
+    def __init__(self, http) -> None:
+        self.http = http
         self.gamma_url = "https://gamma-api.polymarket.com"
         self.gamma_markets_endpoint = self.gamma_url + "/markets"
         self.gamma_events_endpoint = self.gamma_url + "/events"
+        self.market_cache = TTLCache(maxsize=MARKET_CACHE_SIZE, ttl=MARKET_CACHE_TTL)
 
     def parse_pydantic_market(self, market_object: dict) -> Market:
         try:
@@ -68,28 +109,78 @@ class GammaMarketClient:
         except Exception as err:
             print(f"[parse_event] Caught exception: {err}")
 
-    def get_markets(
-        self, querystring_params={}, parse_pydantic=False, local_file_path=None
-    ) -> "list[Market]":
+    def _check_output_args(self, parse_pydantic, local_file_path) -> None:
         if parse_pydantic and local_file_path is not None:
             raise Exception(
                 'Cannot use "parse_pydantic" and "local_file" params simultaneously.'
             )
 
-        response = httpx.get(self.gamma_url + "/markets", params=querystring_params)
+    def _handle_list(self, data: list, parser, parse_pydantic, local_file_path):
+        if local_file_path is not None:
+            with open(local_file_path, "w+") as out_file:
+                json.dump(data, out_file)
+        elif not parse_pydantic:
+            return data
+        else:
+            return [parser(obj) for obj in data]
+
+    def _split_cached(self, market_ids: Iterable, batch_size: int) -> tuple:
+        """(ids, cached markets by id, batches of ids still to fetch)"""
+        ids = _unique_ids(market_ids)
+        found = {}
+        missing = []
+        for market_id in ids:
+            market = self.market_cache.get(market_id)
+            if market is None:
+                missing.append(market_id)
+            else:
+                found[market_id] = market
+        batches = [
+            missing[i : i + batch_size] for i in range(0, len(missing), batch_size)
+        ]
+        return ids, found, batches
+
+    def _merge_fetched(self, ids: list, found: dict, batches: Iterable) -> "list[dict]":
+        for batch in batches:
+            for market in batch:
+                market_id = str(market.get("id"))
+                self.market_cache.set(market_id, market)
+                found[market_id] = market
+        return [found[i] for i in ids if i in found]
+
+    @staticmethod
+    def _batch_params(market_ids: "list[str]") -> dict:
+        # httpx sends a list value as repeated keys: /markets?id=1&id=2
+        return {"id": market_ids, "limit": len(market_ids)}
+
+
+class GammaMarketClient(_GammaClientBase):
+    def __init__(self, transport: Optional[HttpTransport] = None, max_workers: int = 4):
+        super().__init__(transport or get_transport())
+        self.max_workers = max_workers
+
+    def get_markets(
+        self,
+        querystring_params={},
+        parse_pydantic=False,
+        local_file_path=None,
+        use_cache=True,
+    ) -> "list[Market]":
+        self._check_output_args(parse_pydantic, local_file_path)
+
+        response = self.http.get(
+            self.gamma_markets_endpoint,
+            params=querystring_params,
+            use_cache=use_cache,
+        )
         print(response.status_code)
         if response.status_code == 200:
-            data = response.json()
-            if local_file_path is not None:
-                with open(local_file_path, "w+") as out_file:
-                    json.dump(data, out_file)
-            elif not parse_pydantic:
-                return data
-            else:
-                markets: list[Market] = []
-                for market_object in data:
-                    markets.append(self.parse_pydantic_market(market_object))
-                return markets
+            return self._handle_list(
+                response.json(),
+                self.parse_pydantic_market,
+                parse_pydantic,
+                local_file_path,
+            )
         else:
             print(f"Error response returned from api: HTTP {response.status_code}")
             raise Exception()
@@ -97,24 +188,16 @@ class GammaMarketClient:
     def get_events(
         self, querystring_params={}, parse_pydantic=False, local_file_path=None
     ) -> "list[PolymarketEvent]":
-        if parse_pydantic and local_file_path is not None:
-            raise Exception(
-                'Cannot use "parse_pydantic" and "local_file" params simultaneously.'
-            )
+        self._check_output_args(parse_pydantic, local_file_path)
 
-        response = httpx.get(self.gamma_events_endpoint, params=querystring_params)
+        response = self.http.get(self.gamma_events_endpoint, params=querystring_params)
         if response.status_code == 200:
-            data = response.json()
-            if local_file_path is not None:
-                with open(local_file_path, "w+") as out_file:
-                    json.dump(data, out_file)
-            elif not parse_pydantic:
-                return data
-            else:
-                events: list[PolymarketEvent] = []
-                for market_event_obj in data:
-                    events.append(self.parse_event(market_event_obj))
-                return events
+            return self._handle_list(
+                response.json(),
+                self.parse_pydantic_event,
+                parse_pydantic,
+                local_file_path,
+            )
         else:
             raise Exception()
 
@@ -125,61 +208,203 @@ class GammaMarketClient:
         return self.get_events(querystring_params={"limit": limit})
 
     def get_current_markets(self, limit=4) -> "list[Market]":
-        return self.get_markets(
-            querystring_params={
-                "active": True,
-                "closed": False,
-                "archived": False,
-                "limit": limit,
-            }
+        return self.get_markets(querystring_params=_current_params(limit))
+
+    def iter_all_current_markets(self, limit=100, max_workers=8) -> "Iterator[Market]":
+        """streams active markets while later pages are still being fetched"""
+
+        def fetch_page(offset: int, page_limit: int) -> list:
+            return self.get_markets(
+                querystring_params=_current_params(page_limit, offset)
+            )
+
+        paginator = OffsetPaginator(
+            fetch_page, page_size=limit, max_workers=max_workers
         )
+        return paginator.iter_items()
 
     def get_all_current_markets(self, limit=100) -> "list[Market]":
-        offset = 0
-        all_markets = []
-        while True:
-            params = {
-                "active": True,
-                "closed": False,
-                "archived": False,
-                "limit": limit,
-                "offset": offset,
-            }
-            market_batch = self.get_markets(querystring_params=params)
-            all_markets.extend(market_batch)
-
-            if len(market_batch) < limit:
-                break
-            offset += limit
-
-        return all_markets
+        return list(self.iter_all_current_markets(limit=limit))
 
     def get_current_events(self, limit=4) -> "list[PolymarketEvent]":
-        return self.get_events(
-            querystring_params={
-                "active": True,
-                "closed": False,
-                "archived": False,
-                "limit": limit,
-            }
-        )
+        return self.get_events(querystring_params=_current_params(limit))
 
     def get_clob_tradable_markets(self, limit=2) -> "list[Market]":
         return self.get_markets(
-            querystring_params={
-                "active": True,
-                "closed": False,
-                "archived": False,
-                "limit": limit,
-                "enableOrderBook": True,
-            }
+            querystring_params=_current_params(limit, enableOrderBook=True)
         )
 
     def get_market(self, market_id: int) -> dict():
+        market = self.market_cache.get(str(market_id))
+        if market is not None:
+            return market
         url = self.gamma_markets_endpoint + "/" + str(market_id)
         print(url)
-        response = httpx.get(url)
-        return response.json()
+        # market_cache holds it, a response cache ttl would only stack on top
+        response = self.http.get(url, use_cache=False)
+        market = response.json()
+        if response.status_code == 200:
+            self.market_cache.set(str(market_id), market)
+        return market
+
+    def get_markets_by_ids(
+        self, market_ids: Iterable, batch_size: int = MARKET_ID_BATCH_SIZE
+    ) -> "list[dict]":
+        """
+        markets for many ids with one /markets request per `batch_size` ids
+
+        ids are deduplicated, cached markets are not requested again and the
+        batches are fetched concurrently. returns markets in first-seen id
+        order, ids gamma does not know are left out
+        """
+        ids, found, batches = self._split_cached(market_ids, batch_size)
+        fetched = []
+        if batches:
+            workers = min(self.max_workers, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = list(
+                    pool.map(
+                        lambda batch: self.get_markets(
+                            querystring_params=self._batch_params(batch),
+                            use_cache=False,
+                        ),
+                        batches,
+                    )
+                )
+        return self._merge_fetched(ids, found, fetched)
+
+
+class AsyncGammaMarketClient(_GammaClientBase):
+    """
+    asyncio variant of GammaMarketClient, requests are bounded by `concurrency`
+
+    every request method is a coroutine (iter_all_current_markets is an async
+    generator), paged and batched lookups run their requests concurrently.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[AsyncHttpTransport] = None,
+        concurrency: int = 10,
+    ):
+        super().__init__(transport or AsyncHttpTransport())
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    async def _get(self, url: str, **kwargs):
+        # created lazily so the semaphore binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await self.http.get(url, **kwargs)
+
+    async def get_markets(
+        self,
+        querystring_params={},
+        parse_pydantic=False,
+        local_file_path=None,
+        use_cache=True,
+    ) -> "list[Market]":
+        self._check_output_args(parse_pydantic, local_file_path)
+
+        response = await self._get(
+            self.gamma_markets_endpoint,
+            params=querystring_params,
+            use_cache=use_cache,
+        )
+        if response.status_code == 200:
+            return self._handle_list(
+                response.json(),
+                self.parse_pydantic_market,
+                parse_pydantic,
+                local_file_path,
+            )
+        else:
+            print(f"Error response returned from api: HTTP {response.status_code}")
+            raise Exception()
+
+    async def get_events(
+        self, querystring_params={}, parse_pydantic=False, local_file_path=None
+    ) -> "list[PolymarketEvent]":
+        self._check_output_args(parse_pydantic, local_file_path)
+
+        response = await self._get(
+            self.gamma_events_endpoint, params=querystring_params
+        )
+        if response.status_code == 200:
+            return self._handle_list(
+                response.json(),
+                self.parse_pydantic_event,
+                parse_pydantic,
+                local_file_path,
+            )
+        else:
+            raise Exception()
+
+    async def get_all_markets(self, limit=2) -> "list[Market]":
+        return await self.get_markets(querystring_params={"limit": limit})
+
+    async def get_all_events(self, limit=2) -> "list[PolymarketEvent]":
+        return await self.get_events(querystring_params={"limit": limit})
+
+    async def get_current_markets(self, limit=4) -> "list[Market]":
+        return await self.get_markets(querystring_params=_current_params(limit))
+
+    def iter_all_current_markets(self, limit=100, window=8) -> "AsyncIterator[Market]":
+        """streams active markets, `window` pages are requested together"""
+
+        async def fetch_page(offset: int, page_limit: int) -> list:
+            return await self.get_markets(
+                querystring_params=_current_params(page_limit, offset)
+            )
+
+        paginator = AsyncOffsetPaginator(fetch_page, page_size=limit, window=window)
+        return paginator.iter_items()
+
+    async def get_all_current_markets(self, limit=100) -> "list[Market]":
+        return [m async for m in self.iter_all_current_markets(limit=limit)]
+
+    async def get_current_events(self, limit=4) -> "list[PolymarketEvent]":
+        return await self.get_events(querystring_params=_current_params(limit))
+
+    async def get_clob_tradable_markets(self, limit=2) -> "list[Market]":
+        return await self.get_markets(
+            querystring_params=_current_params(limit, enableOrderBook=True)
+        )
+
+    async def get_market(self, market_id: int) -> dict():
+        market = self.market_cache.get(str(market_id))
+        if market is not None:
+            return market
+        url = self.gamma_markets_endpoint + "/" + str(market_id)
+        response = await self._get(url, use_cache=False)
+        market = response.json()
+        if response.status_code == 200:
+            self.market_cache.set(str(market_id), market)
+        return market
+
+    async def get_markets_by_ids(
+        self, market_ids: Iterable, batch_size: int = MARKET_ID_BATCH_SIZE
+    ) -> "list[dict]":
+        ids, found, batches = self._split_cached(market_ids, batch_size)
+        fetched = await asyncio.gather(
+            *(
+                self.get_markets(
+                    querystring_params=self._batch_params(b), use_cache=False
+                )
+                for b in batches
+            )
+        )
+        return self._merge_fetched(ids, found, fetched)
+
+    async def close(self) -> None:
+        await self.http.close()
+
+    async def __aenter__(self) -> "AsyncGammaMarketClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+from logger import logging
+
+
+# fetch_page(offset, limit) -> list of records
+FetchPage = Callable[[int, int], list]
+AsyncFetchPage = Callable[[int, int], Awaitable[list]]
+
+
+def offset_windows(start: int, page_size: int, window: int) -> Iterator[list]:
+    """offset windows of `window` pages each, starting at `start`"""
+    while True:
+        offsets = [start + i * page_size for i in range(window)]
+        yield offsets
+        start = offsets[-1] + page_size
+
+
+class _Dedupe:
+    def __init__(self, key: Optional[str]) -> None:
+        self.key = key
+        self.seen = set()
+
+    def __call__(self, page: list) -> list:
+        if self.key is None:
+            return page
+        items = []
+        for item in page:
+            item_key = item.get(self.key)
+            if item_key not in self.seen:
+                self.seen.add(item_key)
+                items.append(item)
+        return items
+
+
+class OffsetPaginator:
+    """
+    concurrent offset/limit paginator for gamma list endpoints
+
+    the first page is fetched on its own (and yielded right away); if it is
+    full the following pages are fetched speculatively, `window` pages at a
+    time with at most `max_workers` in flight, until the first short page.
+    at most window - 1 requests land past the end. pages are yielded in offset
+    order, records are de-duplicated by `key` across pages.
+    """
+
+    def __init__(
+        self,
+        fetch_page: FetchPage,
+        page_size: int = 100,
+        max_workers: int = 8,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        key: Optional[str] = "id",
+        window: Optional[int] = None,
+    ) -> None:
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.window = window or max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.key = key
+
+    def _fetch(self, offset: int, limit: int) -> list:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.fetch_page(offset, limit)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                logging.warning(
+                    f"page offset={offset} failed ({e}), retrying in {delay}s"
+                )
+                time.sleep(delay)
+
+    def iter_pages(self) -> Iterator[list]:
+        first = self._fetch(0, self.page_size)
+        yield first
+        if len(first) < self.page_size:
+            return
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for offsets in offset_windows(self.page_size, self.page_size, self.window):
+                futures = [
+                    pool.submit(self._fetch, offset, self.page_size)
+                    for offset in offsets
+                ]
+                for future in futures:
+                    page = future.result()
+                    if page:
+                        yield page
+                    if len(page) < self.page_size:
+                        return
+        finally:
+            # pages past the end and a consumer that stops early should not be waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def iter_items(self) -> Iterator[dict]:
+        dedupe = _Dedupe(self.key)
+        for page in self.iter_pages():
+            yield from dedupe(page)
+
+    def fetch_all(self) -> list:
+        return list(self.iter_items())
+
+
+class AsyncOffsetPaginator:
+    """
+    asyncio counterpart of OffsetPaginator for an async fetch_page
+
+    same speculative windows, the pages of a window are awaited together so
+    the number in flight is bound by `window` (and by the client's semaphore)
+    """
+
+    def __init__(
+        self,
+        fetch_page: AsyncFetchPage,
+        page_size: int = 100,
+        window: int = 8,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        key: Optional[str] = "id",
+    ) -> None:
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.key = key
+
+    async def _fetch(self, offset: int, limit: int) -> list:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.fetch_page(offset, limit)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                logging.warning(
+                    f"page offset={offset} failed ({e}), retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def iter_pages(self) -> AsyncIterator[list]:
+        first = await self._fetch(0, self.page_size)
+        yield first
+        if len(first) < self.page_size:
+            return
+
+        for offsets in offset_windows(self.page_size, self.page_size, self.window):
+            tasks = [
+                asyncio.ensure_future(self._fetch(offset, self.page_size))
+                for offset in offsets
+            ]
+            try:
+                for task in tasks:
+                    page = await task
+                    if page:
+                        yield page
+                    if len(page) < self.page_size:
+                        return
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def iter_items(self) -> AsyncIterator[dict]:
+        dedupe = _Dedupe(self.key)
+        async for page in self.iter_pages():
+            for item in dedupe(page):
+                yield item
+
+    async def fetch_all(self) -> list:
+        return [item async for item in self.iter_items()]
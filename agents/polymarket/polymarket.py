@@ -3,6 +3,7 @@
 
 import os
 import pdb
+import asyncio
 import time
 import ast
 import requests
@@ -43,6 +44,12 @@ from agents.utils.objects import (
     ActiveTrader
 )
 from agents.connectors.polymarket_db import PolymarketDb
+from agents.polymarket.settlement import SettlementCache, SettlementResolver
+from agents.polymarket.transport import (
+    AsyncHttpTransport,
+    HttpTransport,
+    get_transport,
+)
 
 from datetime import datetime
 from typing import List, Optional
@@ -59,7 +66,14 @@ logging.basicConfig(
 
 
 class Polymarket:
-    def __init__(self) -> None:
+    def __init__(
+        self, transport: Optional[HttpTransport] = None, db: Optional[PolymarketDb] = None
+    ) -> None:
+        self.http = transport or get_transport()
+        # opened on first settlement read, so importing/constructing creates no db file
+        self._db = db
+        self._settlement = None
+
         self.gamma_url = "https://gamma-api.polymarket.com"
         self.gamma_markets_endpoint = self.gamma_url + "/markets"
         self.gamma_events_endpoint = self.gamma_url + "/events"
@@ -113,6 +127,20 @@ class Polymarket:
         self._init_api_keys()
         self._init_approvals(False)
 
+    @property
+    def db(self) -> PolymarketDb:
+        if self._db is None:
+            self._db = PolymarketDb()
+        return self._db
+
+    @property
+    def settlement(self) -> SettlementResolver:
+        if self._settlement is None:
+            self._settlement = SettlementResolver(
+                self.w3, self.ctf_contract, cache=SettlementCache(self.db)
+            )
+        return self._settlement
+
     def get_available_funds(self):
         _balance = self.client.get_balance_allowance(
             BalanceAllowanceParams(
@@ -258,12 +286,35 @@ class Polymarket:
                 for i in range(slots)]
         return nums
     
-    def is_outcome_settled(self, condition_id) -> bool:
-        denom = self._get_payout_denominator(condition_id)
-        if denom > 0:
-            return True
-        else:
-            return False
+    def is_outcome_settled(self, condition_id) -> Optional[bool]:
+        """ None when the condition could not be read """
+        return self.settlement.is_settled(condition_id)
+
+    def _unsettled(self, markets: list) -> list:
+        """ markets whose condition is readable and not proposed or resolved """
+        condition_ids = [m.get("conditionId") for m in markets]
+        try:
+            settlements = self.get_settlements(condition_ids)
+        except Exception as e:
+            logging.warning(f"batched settlement read failed ({e}), reading per market")
+            settlements = {}
+
+        unsettled = []
+        for market, condition_id in zip(markets, condition_ids):
+            try:
+                if condition_id in settlements:
+                    settled = settlements[condition_id][0] > 0
+                else:
+                    settled = self.is_outcome_settled(condition_id)
+                if settled is False:
+                    unsettled.append(market)
+            except Exception as e:
+                print(e)
+        return unsettled
+
+    def get_settlements(self, condition_ids: "list[str]") -> dict:
+        """ returns {condition_id: (payout denominator, payout numerators)} in batched rpc calls """
+        return self.settlement.resolve(condition_ids)
 
     def get_all_markets(self) -> "list[SimpleMarket]":
         markets = []
@@ -272,16 +323,14 @@ class Polymarket:
             "order": "id",
             "ascending": "false"
         }
-        res = httpx.get(self.gamma_markets_endpoint, params=params)
+        res = self.http.get(self.gamma_markets_endpoint, params=params)
         if res.status_code == 200:
-            for market in res.json():
+            # filter all markets that are proposed or resolved
+            for market in self._unsettled(res.json()):
                 try:
-                    # filter all markets that are proposed or resolved
-                    _cond_id = market.get("conditionId")
-                    if not self.is_outcome_settled(_cond_id): 
-                        market_data = self.map_api_to_market(market)
-                        markets.append(SimpleMarket(**market_data))
-                        print(market_data)
+                    market_data = self.map_api_to_market(market)
+                    markets.append(SimpleMarket(**market_data))
+                    print(market_data)
                 except Exception as e:
                     print(e)
                     pass
@@ -307,17 +356,17 @@ class Polymarket:
 
     def get_market(self, token_id: str) -> SimpleMarket:
         params = {"clob_token_ids": token_id}
-        res = httpx.get(self.gamma_markets_endpoint, params=params)
+        res = self.http.get(self.gamma_markets_endpoint, params=params)
         if res.status_code == 200:
             data = res.json()
             market = data[0]
             _cond_id = market.get("conditionId")
-            if not self.is_outcome_settled(_cond_id):
+            if self.is_outcome_settled(_cond_id) is False:
                 return self.map_api_to_market(market, token_id)
 
     def is_accepting_orders(self, condition_id: str) -> bool:
 
-        res = httpx.get(self.clob_markets_endpoint + f"/{condition_id}")
+        res = self.http.get(self.clob_markets_endpoint + f"/{condition_id}")
         if res.status_code == 200:
             for market in res.json():
                 val = market.get("accepting_orders")
@@ -339,12 +388,15 @@ class Polymarket:
             "end": market.get("endDate"),
             "description": market.get("description"),
             "active": market.get("active"),
+            "closed": market.get("closed"),
             # "deployed": market["deployed"],
             "funded": market.get("funded"),
             "rewardsMinSize": float(market.get("rewardsMinSize")),
             "rewardsMaxSpread": float(market.get("rewardsMaxSpread")),
             # "volume": float(market["volume"]),
             "spread": float(market.get("spread")),
+            "liquidity": float(market.get("liquidity") or 0),
+            "tags": market.get("tags"),
             "outcomes": str(market.get("outcomes")),
             "outcome_prices": str(market.get("outcomePrices")),
             "clob_token_ids": str(market.get("clobTokenIds")),
@@ -356,7 +408,7 @@ class Polymarket:
 
     def get_all_events(self) -> list[SimpleEvent]:
         events = []
-        res = httpx.get(self.gamma_events_endpoint)
+        res = self.http.get(self.gamma_events_endpoint)
         if res.status_code == 200:
             print(len(res.json()))
             for event in res.json():
@@ -407,7 +459,7 @@ class Polymarket:
             "archived": "false", 
             "restricted": "false"
         }
-        res = httpx.get(self.gamma_events_endpoint, params=params)
+        res = self.http.get(self.gamma_events_endpoint, params=params)
         if res.status_code == 200:
             print(len(res.json()))
             for event in res.json():
@@ -510,7 +562,7 @@ class Polymarket:
 
         transactions = []
         params = {"user": proxy_address, "limit": limit, "offset": 0}
-        response = httpx.get(self.data_api_url + self.data_api_activity, params=params)
+        response = self.http.get(self.data_api_url + self.data_api_activity, params=params)
         if response.status_code == 200:
             for activity in response.json():
                 try:
@@ -526,7 +578,7 @@ class Polymarket:
 
         positions = []
         params = {"limit": limit, "user": proxy_address}
-        response = httpx.get(self.data_api_url + self.data_api_positions, params=params)
+        response = self.http.get(self.data_api_url + self.data_api_positions, params=params)
         if response.status_code == 200:
             for position in response.json():
                 try: 
@@ -541,7 +593,7 @@ class Polymarket:
         """ returns total numbers of trades """
 
         params = {"user": proxy_address}
-        response = httpx.get(self.data_api_url + self.data_api_trade, params=params)
+        response = self.http.get(self.data_api_url + self.data_api_trade, params=params)
         if response.status_code == 200:
             try:
                 obj = response.json()
@@ -560,7 +612,7 @@ class Polymarket:
         """ returns positions value based on proxy address """
 
         params = {"user": proxy_address}
-        response = httpx.get(self.data_api_url + self.data_api_value, params=params)
+        response = self.http.get(self.data_api_url + self.data_api_value, params=params)
         if response.status_code == 200:
             try:
                 obj = response.json()
@@ -580,7 +632,7 @@ class Polymarket:
 
         traders = []
         params = {"window": "all", "limit": limit}
-        response = httpx.get(self.lb_api_url + self.lb_api_profit, params=params)
+        response = self.http.get(self.lb_api_url + self.lb_api_profit, params=params)
         if response.status_code == 200:
             for obj in response.json():
                 try:
@@ -597,7 +649,7 @@ class Polymarket:
 
         traders = []
         params = {"window": "all", "limit": limit}
-        response = httpx.get(self.lb_api_url + self.lb_api_profit, params=params)
+        response = self.http.get(self.lb_api_url + self.lb_api_profit, params=params)
         if response.status_code == 200:
             for obj in response.json():
                 try:
@@ -616,6 +668,191 @@ class Polymarket:
                     pass
         return traders
 
+class AsyncPolymarket:
+    """
+    asyncio variant of the Polymarket read api
+
+    independent requests (per trader value/traded lookups, blocking chain
+    reads) run concurrently, bounded by `concurrency`. mapping, filtering and
+    settlement reads are delegated to a regular Polymarket instance.
+    """
+
+    def __init__(
+        self,
+        polymarket: Optional[Polymarket] = None,
+        transport: Optional[AsyncHttpTransport] = None,
+        concurrency: int = 10,
+    ) -> None:
+        self.polymarket = polymarket or Polymarket()
+        self.http = transport or AsyncHttpTransport()
+        self.concurrency = concurrency
+        self._semaphore = None
+
+        self.gamma_markets_endpoint = self.polymarket.gamma_markets_endpoint
+        self.gamma_events_endpoint = self.polymarket.gamma_events_endpoint
+        self.data_api_url = self.polymarket.data_api_url
+        self.data_api_trade = self.polymarket.data_api_trade
+        self.data_api_value = self.polymarket.data_api_value
+        self.data_api_positions = self.polymarket.data_api_positions
+        self.data_api_activity = self.polymarket.data_api_activity
+        self.lb_api_url = self.polymarket.lb_api_url
+        self.lb_api_profit = self.polymarket.lb_api_profit
+
+    def _bound(self) -> asyncio.Semaphore:
+        # created lazily so the semaphore binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _get(self, url: str, **kwargs):
+        async with self._bound():
+            return await self.http.get(url, **kwargs)
+
+    async def is_outcome_settled(self, condition_id) -> bool:
+        async with self._bound():
+            return await asyncio.to_thread(
+                self.polymarket.is_outcome_settled, condition_id
+            )
+
+    async def get_all_markets(self) -> "list[SimpleMarket]":
+        markets = []
+        params = {
+            "order": "id",
+            "ascending": "false"
+        }
+        res = await self._get(self.gamma_markets_endpoint, params=params)
+        if res.status_code == 200:
+            unsettled = await asyncio.to_thread(self.polymarket._unsettled, res.json())
+            for market in unsettled:
+                try:
+                    market_data = self.polymarket.map_api_to_market(market)
+                    markets.append(SimpleMarket(**market_data))
+                except Exception as e:
+                    print(e)
+                    pass
+        return markets
+
+    async def get_market(self, token_id: str) -> SimpleMarket:
+        params = {"clob_token_ids": token_id}
+        res = await self._get(self.gamma_markets_endpoint, params=params)
+        if res.status_code == 200:
+            market = res.json()[0]
+            if await self.is_outcome_settled(market.get("conditionId")) is False:
+                return self.polymarket.map_api_to_market(market, token_id)
+
+    async def get_all_tradeable_events(self) -> list[SimpleEvent]:
+        events = []
+        params = {
+            "active":"true",
+            "closed": "false",
+            "archived": "false",
+            "restricted": "false"
+        }
+        res = await self._get(self.gamma_events_endpoint, params=params)
+        if res.status_code == 200:
+            for event in res.json():
+                try:
+                    event_data = self.polymarket.map_api_to_event(event)
+                    simple_event = SimpleEvent(**event_data)
+                    if self.polymarket.is_event_active(simple_event):
+                        events.append(simple_event)
+                except Exception as e:
+                    print(e)
+                    pass
+        return events
+
+    async def get_proxy_addr_activity(self, proxy_address: str, limit: Optional[int]=1000) -> list[ActivityUser]:
+        """ returns activity (e.g. transactions) of proxy address """
+        logging.info(f"fetching activity transactions for proxy address: {proxy_address}")
+
+        transactions = []
+        params = {"user": proxy_address, "limit": limit, "offset": 0}
+        response = await self._get(self.data_api_url + self.data_api_activity, params=params)
+        if response.status_code == 200:
+            for activity in response.json():
+                try:
+                    transactions.append(ActivityUser(**activity))
+                except Exception as e:
+                    logging.exception("FetchActivityUserException")
+                    pass
+        return transactions
+
+    async def get_proxy_addr_positions(self, proxy_address: str, limit: Optional[int]=1000) -> list[UserPosition]:
+        """ returns positions of proxy address """
+
+        positions = []
+        params = {"limit": limit, "user": proxy_address}
+        response = await self._get(self.data_api_url + self.data_api_positions, params=params)
+        if response.status_code == 200:
+            for position in response.json():
+                try:
+                    positions.append(UserPosition(**position))
+                except Exception as e:
+                    logging.exception("FetchUserPositionException")
+                    pass
+        return positions
+
+    async def get_proxy_addr_traded_user(self, proxy_address: str) -> TradedUser:
+        """ returns total numbers of trades """
+
+        params = {"user": proxy_address}
+        response = await self._get(self.data_api_url + self.data_api_trade, params=params)
+        if response.status_code == 200:
+            obj = response.json()
+            if isinstance(obj, list):
+                obj = obj[0]
+            return TradedUser(**obj)
+
+    async def get_proxy_addr_value_user(self, proxy_address: str) -> ValueUser:
+        """ returns positions value based on proxy address """
+
+        params = {"user": proxy_address}
+        response = await self._get(self.data_api_url + self.data_api_value, params=params)
+        if response.status_code == 200:
+            obj = response.json()
+            if isinstance(obj, list):
+                obj = obj[0]
+            return ValueUser(**obj)
+
+    async def _get_active_trader(self, obj: dict, threshold: float) -> Optional[ActiveTrader]:
+        value_user, traded_user = await asyncio.gather(
+            self.get_proxy_addr_value_user(obj["proxyWallet"]),
+            self.get_proxy_addr_traded_user(obj["proxyWallet"]),
+        )
+        if value_user.value > threshold:
+            obj["current_value"] = float(value_user.value)
+            obj["trades"] = int(traded_user.traded)
+            return ActiveTrader(**obj)
+
+    async def get_top_active_traders(
+            self, limit: int=100, threshold: float=100000.00) -> list[ActiveTrader]:
+        """ returns list of top active traders based on current value  """
+
+        traders = []
+        params = {"window": "all", "limit": limit}
+        response = await self._get(self.lb_api_url + self.lb_api_profit, params=params)
+        if response.status_code == 200:
+            results = await asyncio.gather(
+                *[self._get_active_trader(obj, threshold) for obj in response.json()],
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logging.error(f"FetchTradedUserException: {result}")
+                elif result is not None:
+                    traders.append(result)
+        return traders
+
+    async def close(self) -> None:
+        await self.http.close()
+
+    async def __aenter__(self) -> "AsyncPolymarket":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
 def test():
     host = "https://clob.polymarket.com"
     key = os.getenv("POLYGON_WALLET_PRIVATE_KEY")
@@ -0,0 +1,272 @@
+import json
+import sqlite3
+import threading
+import time
+
+from collections import defaultdict
+from typing import Dict, Optional
+
+import httpx
+
+from agents.utils.cache import TTLCache
+
+
+# seconds a GET response is served without asking the api again, by url prefix.
+# the longest matching prefix wins, urls without a match are never cached
+# (data-api activity/positions and the leaderboards must always be live).
+# clob markets carry accepting_orders and are not cached. gamma markets and
+# events carry order state, so they only live for a short ttl. GammaMarketClient's
+# per-id lookups skip this cache, its own market_cache already holds them
+DEFAULT_TTLS = {
+    "https://gamma-api.polymarket.com/markets": 30,
+    "https://gamma-api.polymarket.com/events": 30,
+}
+DEFAULT_MAXSIZE = 4096
+
+# headers that describe the wire encoding, the cached body is already decoded
+_HOP_HEADERS = frozenset(
+    ["content-encoding", "content-length", "transfer-encoding", "connection"]
+)
+
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS http_response (
+        url TEXT PRIMARY KEY,
+        status INTEGER,
+        headers TEXT,
+        content BLOB,
+        stored_at REAL,
+        expires_at REAL
+    )
+"""
+
+
+class CachedResponse:
+    """a stored 200 response, kept past expiry so it can be revalidated"""
+
+    def __init__(
+        self,
+        url: str,
+        status: int,
+        headers: list,
+        content: bytes,
+        stored_at: float,
+        expires_at: float,
+    ) -> None:
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def validators(self) -> dict:
+        """conditional request headers, empty when the api sent no etag/last-modified"""
+        headers = dict((k.lower(), v) for k, v in self.headers)
+        conditional = {}
+        if "etag" in headers:
+            conditional["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            conditional["If-Modified-Since"] = headers["last-modified"]
+        return conditional
+
+    def to_response(self, request: Optional[httpx.Request] = None) -> httpx.Response:
+        return httpx.Response(
+            self.status, headers=self.headers, content=self.content, request=request
+        )
+
+
+class ResponseCache:
+    """
+    GET response cache for HttpTransport / AsyncHttpTransport
+
+    responses are kept in an LRU of `maxsize` urls (query string included)
+    for the ttl of the first matching prefix in `ttls`. expired entries stay
+    in the LRU and are revalidated with If-None-Match / If-Modified-Since, a
+    304 refreshes them without a body. `path` mirrors the LRU into a sqlite
+    file so separate cli runs share it.
+
+    attributes:
+        hits (dict): fresh responses served without a request, by prefix
+        revalidated (dict): stale responses confirmed by a 304, by prefix
+        misses (dict): responses that had to be downloaded, by prefix
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        maxsize: int = DEFAULT_MAXSIZE,
+        path: Optional[str] = None,
+    ) -> None:
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self._prefixes = sorted(self.ttls, key=len, reverse=True)
+        self.maxsize = maxsize
+        self.lru = TTLCache(maxsize=maxsize, ttl=None)
+        self.hits = defaultdict(int)
+        self.revalidated = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._lock = threading.Lock()
+        self.path = path
+        self.conn = None
+        if path is not None:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute(_CREATE_TABLE)
+            # keep the file bounded like the lru
+            self.conn.execute(
+                "DELETE FROM http_response WHERE url NOT IN "
+                "(SELECT url FROM http_response ORDER BY stored_at DESC LIMIT ?)",
+                (maxsize,),
+            )
+            self.conn.commit()
+
+    def endpoint(self, url: str) -> Optional[str]:
+        """the ttl prefix matching url, None when url is not cacheable"""
+        url = url.split("?", 1)[0]
+        for prefix in self._prefixes:
+            if url.startswith(prefix):
+                return prefix
+        return None
+
+    def ttl(self, url: str) -> float:
+        prefix = self.endpoint(url)
+        return 0 if prefix is None else self.ttls[prefix]
+
+    def lookup(self, url: str, params=None) -> tuple:
+        """
+        (key, entry, response) for a GET. response is set when a fresh entry
+        answers the request, otherwise entry (if any) should be revalidated
+        """
+        key = httpx.URL(url)
+        if params is not None:
+            key = key.copy_merge_params(params)
+        key = str(key)
+        entry = self.get(key)
+        if entry is not None and entry.fresh():
+            self.record(key, "hits")
+            return key, entry, entry.to_response(httpx.Request("GET", key))
+        return key, entry, None
+
+    def resolve(
+        self, key: str, entry: Optional[CachedResponse], response: httpx.Response
+    ) -> httpx.Response:
+        """the api's answer to a (conditional) GET, a 304 is served from the stale entry"""
+        if response.status_code == 304 and entry is not None:
+            self.record(key, "revalidated")
+            return self.refresh(entry, response).to_response(response.request)
+        self.record(key, "misses")
+        self.put(key, response)
+        return response
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        entry = self.lru.get(url)
+        if entry is None and self.conn is not None:
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT status, headers, content, stored_at, expires_at FROM http_response WHERE url = ?",
+                    (url,),
+                ).fetchone()
+            if row is not None:
+                entry = CachedResponse(
+                    url, row[0], json.loads(row[1]), row[2], row[3], row[4]
+                )
+                self.lru.set(url, entry)
+        return entry
+
+    def put(self, url: str, response: httpx.Response) -> Optional[CachedResponse]:
+        """stores a 200 response for the endpoint's ttl"""
+        ttl = self.ttl(url)
+        if response.status_code != 200 or not ttl:
+            return None
+        headers = [
+            (k, v) for k, v in response.headers.items() if k.lower() not in _HOP_HEADERS
+        ]
+        now = time.time()
+        entry = CachedResponse(
+            url, response.status_code, headers, response.content, now, now + ttl
+        )
+        self._save(entry)
+        return entry
+
+    def refresh(
+        self, entry: CachedResponse, response: httpx.Response
+    ) -> CachedResponse:
+        """a 304 for a stale entry: restart its ttl and take any new validators"""
+        updated = {
+            k.lower(): v
+            for k, v in response.headers.items()
+            if k.lower() in ("etag", "last-modified", "date")
+        }
+        headers = [(k, updated.pop(k.lower(), v)) for k, v in entry.headers] + list(
+            updated.items()
+        )
+        now = time.time()
+        entry = CachedResponse(
+            entry.url,
+            entry.status,
+            headers,
+            entry.content,
+            now,
+            now + self.ttl(entry.url),
+        )
+        self._save(entry)
+        return entry
+
+    def _save(self, entry: CachedResponse) -> None:
+        self.lru.set(entry.url, entry)
+        if self.conn is not None:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO http_response VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        entry.url,
+                        entry.status,
+                        json.dumps(entry.headers),
+                        entry.content,
+                        entry.stored_at,
+                        entry.expires_at,
+                    ),
+                )
+                self.conn.commit()
+
+    def record(self, url: str, outcome: str) -> None:
+        prefix = self.endpoint(url)
+        with self._lock:
+            getattr(self, outcome)[prefix] += 1
+
+    def hit_ratio(self, endpoint: Optional[str] = None) -> float:
+        """share of lookups answered without downloading a body (fresh hits and 304s)"""
+        with self._lock:
+            counters = (self.hits, self.revalidated, self.misses)
+            if endpoint is None:
+                hits, revalidated, misses = (sum(c.values()) for c in counters)
+            else:
+                hits, revalidated, misses = (c[endpoint] for c in counters)
+        total = hits + revalidated + misses
+        return (hits + revalidated) / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            endpoints = set(self.hits) | set(self.revalidated) | set(self.misses)
+            return {
+                endpoint: {
+                    "hits": self.hits[endpoint],
+                    "revalidated": self.revalidated[endpoint],
+                    "misses": self.misses[endpoint],
+                }
+                for endpoint in sorted(endpoints)
+            }
+
+    def clear(self) -> None:
+        self.lru.clear()
+        if self.conn is not None:
+            with self._lock:
+                self.conn.execute("DELETE FROM http_response")
+                self.conn.commit()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            with self._lock:
+                self.conn.close()
+            self.conn = None
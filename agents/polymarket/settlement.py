@@ -0,0 +1,235 @@
+import logging
+import threading
+import time
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from web3 import Web3
+
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.utils.cache import TTLCache
+
+
+# Multicall3 is deployed at the same address on every chain we use (incl. polygon)
+# https://github.com/mds1/multicall
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = """[{"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},{"internalType":"bool","name":"allowFailure","type":"bool"},{"internalType":"bytes","name":"callData","type":"bytes"}],"internalType":"struct Multicall3.Call3[]","name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},{"internalType":"bytes","name":"returnData","type":"bytes"}],"internalType":"struct Multicall3.Result[]","name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"}]"""
+
+DEFAULT_CHUNK_SIZE = 300
+DEFAULT_UNSETTLED_TTL = 300
+DEFAULT_LRU_SIZE = 50_000
+
+# condition_id -> (payoutDenominator, payoutNumerators)
+Settlement = Tuple[int, List[int]]
+
+
+class SettlementCache:
+    """
+    settlement cache keyed by condition_id, an in-process LRU in front of sqlite
+
+    a non-zero payoutDenominator can never change, so settled conditions are
+    kept forever. unsettled conditions are re-read from chain once they are
+    older than `unsettled_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        db: Optional[PolymarketDb] = None,
+        unsettled_ttl: float = DEFAULT_UNSETTLED_TTL,
+        lru_size: int = DEFAULT_LRU_SIZE,
+    ) -> None:
+        self.db = db
+        self.unsettled_ttl = unsettled_ttl
+        self.lru = TTLCache(maxsize=lru_size)
+        self._lock = threading.Lock()
+        if self.db is not None:
+            self.db.create_db_tables()
+
+    def _ttl(self, denom: int) -> Optional[float]:
+        return None if denom > 0 else self.unsettled_ttl
+
+    def get_many(self, condition_ids: List[str]) -> Dict[str, Settlement]:
+        found = {}
+        missing = []
+        for condition_id in condition_ids:
+            settlement = self.lru.get(condition_id)
+            if settlement is None:
+                missing.append(condition_id)
+            else:
+                found[condition_id] = settlement
+
+        if missing and self.db is not None:
+            now = time.time()
+            with self._lock:
+                rows = self.db.read_settlements(missing)
+            for condition_id, (denom, nums, checked_at) in rows.items():
+                age = now - checked_at
+                if denom > 0 or age < self.unsettled_ttl:
+                    found[condition_id] = (denom, nums)
+                    ttl = self._ttl(denom)
+                    self.lru.set(
+                        condition_id,
+                        (denom, nums),
+                        ttl=None if ttl is None else ttl - age,
+                    )
+        return found
+
+    def put_many(self, settlements: Dict[str, Settlement]) -> None:
+        for condition_id, (denom, nums) in settlements.items():
+            self.lru.set(condition_id, (denom, nums), ttl=self._ttl(denom))
+        if settlements and self.db is not None:
+            with self._lock:
+                self.db.write_settlements(settlements, int(time.time()))
+
+
+class SettlementResolver:
+    """
+    batched ConditionalTokens settlement reads
+
+    instead of one `payoutDenominator` eth_call per market (plus one
+    `payoutNumerators` call per outcome slot) all reads are aggregated through
+    Multicall3 in chunks of `chunk_size` calls, i.e. one round trip per chunk.
+
+    numerators are only fetched for settled conditions, unsettled conditions
+    resolve to (0, []). with a `cache` only conditions it cannot answer hit the chain.
+    conditions the multicall could not read (or every condition, when the
+    multicall itself fails) fall back to plain per-condition eth_calls.
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        ctf_contract,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        multicall_address: str = MULTICALL3_ADDRESS,
+        cache: Optional[SettlementCache] = None,
+    ) -> None:
+        self.w3 = w3
+        self.ctf_contract = ctf_contract
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.multicall = w3.eth.contract(
+            address=Web3.to_checksum_address(multicall_address), abi=MULTICALL3_ABI
+        )
+
+    def _encode(self, fn_name: str, args: list) -> tuple:
+        call_data = self.ctf_contract.encodeABI(fn_name=fn_name, args=args)
+        return (self.ctf_contract.address, True, call_data)
+
+    def _decode_uint(self, success: bool, return_data: bytes) -> Optional[int]:
+        if not success or not return_data:
+            return None
+        return self.w3.codec.decode(["uint256"], return_data)[0]
+
+    def _aggregate(self, calls: List[tuple]) -> List[Optional[int]]:
+        results = []
+        for i in range(0, len(calls), self.chunk_size):
+            chunk = calls[i : i + self.chunk_size]
+            response = self.multicall.functions.aggregate3(chunk).call()
+            results.extend(self._decode_uint(ok, data) for ok, data in response)
+        return results
+
+    def resolve(self, condition_ids: Iterable[str]) -> Dict[str, Settlement]:
+        """returns {condition_id: (denominator, numerators)}, unreadable conditions are omitted"""
+        ids = list(dict.fromkeys(x for x in condition_ids if x))
+        if not ids:
+            return {}
+
+        if self.cache is None:
+            return self._read_chain(ids)
+
+        settlements = self.cache.get_many(ids)
+        missing = [x for x in ids if x not in settlements]
+        if missing:
+            fresh = self._read_chain(missing)
+            self.cache.put_many(fresh)
+            settlements.update(fresh)
+        return settlements
+
+    def _read_chain(self, ids: List[str]) -> Dict[str, Settlement]:
+        calls = []
+        for condition_id in ids:
+            _condition_id = Web3.to_bytes(hexstr=condition_id)
+            calls.append(self._encode("payoutDenominator", [_condition_id]))
+            calls.append(self._encode("getOutcomeSlotCount", [_condition_id]))
+        try:
+            values = self._aggregate(calls)
+        except Exception as e:
+            logging.warning(
+                f"multicall settlement read failed ({e}), reading per condition"
+            )
+            return self._read_each(ids)
+
+        settlements = {}
+        failed = []
+        numerator_calls = []
+        numerator_owners = []
+        for n, condition_id in enumerate(ids):
+            denom, slots = values[2 * n], values[2 * n + 1]
+            if denom is None:
+                failed.append(condition_id)
+                continue
+            if denom > 0 and slots is None:
+                failed.append(condition_id)
+                continue
+            settlements[condition_id] = (denom, [])
+            if denom > 0 and slots:
+                _condition_id = Web3.to_bytes(hexstr=condition_id)
+                for i in range(slots):
+                    numerator_calls.append(
+                        self._encode("payoutNumerators", [_condition_id, i])
+                    )
+                    numerator_owners.append(condition_id)
+
+        try:
+            numerators = self._aggregate(numerator_calls)
+        except Exception as e:
+            logging.warning(
+                f"multicall numerator read failed ({e}), reading per condition"
+            )
+            settled = list(dict.fromkeys(numerator_owners))
+            for condition_id in settled:
+                settlements.pop(condition_id)
+            failed.extend(settled)
+        else:
+            for condition_id, num in zip(numerator_owners, numerators):
+                settlements[condition_id][1].append(num)
+            # a failed sub-call decodes to None, and settled rows are cached for good
+            partial = [
+                c for c in dict.fromkeys(numerator_owners) if None in settlements[c][1]
+            ]
+            for condition_id in partial:
+                settlements.pop(condition_id)
+            failed.extend(partial)
+
+        settlements.update(self._read_each(failed))
+        return settlements
+
+    def _read_one(self, condition_id: str) -> Settlement:
+        functions = self.ctf_contract.functions
+        _condition_id = Web3.to_bytes(hexstr=condition_id)
+        denom = functions.payoutDenominator(_condition_id).call()
+        if not denom > 0:
+            return (denom, [])
+        slots = functions.getOutcomeSlotCount(_condition_id).call()
+        return (
+            denom,
+            [functions.payoutNumerators(_condition_id, i).call() for i in range(slots)],
+        )
+
+    def _read_each(self, ids: List[str]) -> Dict[str, Settlement]:
+        settlements = {}
+        for condition_id in ids:
+            try:
+                settlements[condition_id] = self._read_one(condition_id)
+            except Exception as e:
+                logging.warning(f"settlement read failed for {condition_id}: {e}")
+        return settlements
+
+    def is_settled(self, condition_id: str) -> Optional[bool]:
+        """True/False, None when the condition could not be read"""
+        settlement = self.resolve([condition_id]).get(condition_id)
+        if settlement is None:
+            return None
+        return settlement[0] > 0
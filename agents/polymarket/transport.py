@@ -0,0 +1,252 @@
+import logging
+import os
+import threading
+
+from collections import defaultdict
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from agents.polymarket.response_cache import ResponseCache
+
+
+try:
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+
+class PoolStats:
+    """
+    connection pool counters, per host
+
+    attributes:
+        hits (dict): requests served over an already open keep-alive connection
+        misses (dict): requests that had to open a new TCP (+TLS) connection
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def record(self, host: str, reused: bool) -> None:
+        with self._lock:
+            if reused:
+                self.hits[host] += 1
+            else:
+                self.misses[host] += 1
+
+    def hit_ratio(self, host: Optional[str] = None) -> float:
+        with self._lock:
+            if host is None:
+                hits = sum(self.hits.values())
+                total = hits + sum(self.misses.values())
+            else:
+                hits = self.hits[host]
+                total = hits + self.misses[host]
+        return hits / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hosts = set(self.hits) | set(self.misses)
+            return {
+                host: {"hits": self.hits[host], "misses": self.misses[host]}
+                for host in sorted(hosts)
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+def _resolve_http2(http2: Optional[bool]) -> bool:
+    if http2 is None:
+        return _HTTP2_AVAILABLE
+    if http2 and not _HTTP2_AVAILABLE:
+        logging.warning("http2 requested but 'h2' is not installed, using HTTP/1.1")
+        return False
+    return http2
+
+
+def _traced(url: str, extensions: Optional[dict] = None, is_async: bool = False):
+    host = urlsplit(url).netloc
+    state = {"reused": True}
+
+    def trace(event_name: str, info: dict) -> None:
+        # httpcore only emits connect_tcp when the pool has no idle connection
+        if event_name == "connection.connect_tcp.started":
+            state["reused"] = False
+
+    async def atrace(event_name: str, info: dict) -> None:
+        trace(event_name, info)
+
+    extensions = dict(extensions or {})
+    extensions["trace"] = atrace if is_async else trace
+    return host, state, extensions
+
+
+class HttpTransport:
+    """
+    long-lived http client shared by Polymarket and GammaMarketClient
+
+    keeps a keep-alive connection pool per host (gamma-api, clob, data-api, lb-api),
+    negotiates HTTP/2 when the optional `h2` package is installed and counts
+    pool hits/misses so the handshake savings are observable. GETs go through
+    `cache` (a ResponseCache) when one is set, unless called with use_cache=False.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        http2: Optional[bool] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
+        self.http2 = _resolve_http2(http2)
+        self.stats = PoolStats()
+        self.cache = cache
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.client = httpx.Client(
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=self.http2,
+            transport=transport,
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        host, state, extensions = _traced(url, kwargs.pop("extensions", None))
+        response = self.client.request(method, url, extensions=extensions, **kwargs)
+        self.stats.record(host, state["reused"])
+        return response
+
+    def get(self, url: str, use_cache: bool = True, **kwargs) -> httpx.Response:
+        if not use_cache or self.cache is None or self.cache.endpoint(url) is None:
+            return self.request("GET", url, **kwargs)
+        key, entry, cached = self.cache.lookup(url, kwargs.pop("params", None))
+        if cached is not None:
+            return cached
+        kwargs["headers"] = {
+            **(kwargs.get("headers") or {}),
+            **(entry.validators() if entry else {}),
+        }
+        return self.cache.resolve(key, entry, self.request("GET", key, **kwargs))
+
+    def close(self) -> None:
+        self.client.close()
+
+    def __enter__(self) -> "HttpTransport":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class AsyncHttpTransport:
+    """
+    asyncio counterpart of HttpTransport built on httpx.AsyncClient
+
+    an AsyncClient is bound to the event loop it first runs on, so instead of
+    a process wide default each async client owns one for its lifetime.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        http2: Optional[bool] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
+        self.http2 = _resolve_http2(http2)
+        self.stats = PoolStats()
+        self.cache = cache
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.client = httpx.AsyncClient(
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=self.http2,
+            transport=transport,
+        )
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        host, state, extensions = _traced(
+            url, kwargs.pop("extensions", None), is_async=True
+        )
+        response = await self.client.request(
+            method, url, extensions=extensions, **kwargs
+        )
+        self.stats.record(host, state["reused"])
+        return response
+
+    async def get(self, url: str, use_cache: bool = True, **kwargs) -> httpx.Response:
+        if not use_cache or self.cache is None or self.cache.endpoint(url) is None:
+            return await self.request("GET", url, **kwargs)
+        key, entry, cached = self.cache.lookup(url, kwargs.pop("params", None))
+        if cached is not None:
+            return cached
+        kwargs["headers"] = {
+            **(kwargs.get("headers") or {}),
+            **(entry.validators() if entry else {}),
+        }
+        return self.cache.resolve(key, entry, await self.request("GET", key, **kwargs))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncHttpTransport":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """returns the process wide transport, created on first use"""
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            # market/event metadata is cached, HTTP_CACHE_PATH persists it across runs
+            _default_transport = HttpTransport(
+                cache=ResponseCache(path=os.getenv("HTTP_CACHE_PATH") or None)
+            )
+        return _default_transport
+
+
+def set_transport(transport: HttpTransport) -> None:
+    """replaces the process wide transport (e.g. to tune pool sizes at startup)"""
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = transport
@@ -1,4 +1,17 @@
 _DB_NAME = "polymarket.db"
+_WRITE_CHUNK_SIZE = 500
+
+# connection profile: WAL lets the sync writer and trader/cli readers share the
+# file, NORMAL is durable across app crashes (not power loss) in WAL mode.
+# busy_timeout comes first so the journal_mode switch waits on other writers
+_DB_PRAGMAS = {
+    "busy_timeout": 10000,  # ms
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative is KiB
+    "temp_store": "MEMORY",
+}
 
 _TRADE = "trade"
 _POLYMARKET_EVENT = "polymarket_event"
@@ -7,6 +20,10 @@ _ACTIVITY_USER = "activity_user"
 _VALUE_USER = "value_user"
 _TRADED_USER = "traded_user"
 _USER_POSITION = "user_position"
+_SETTLEMENT = "settlement"
+_SYNC_STATE = "sync_state"
+_EMBEDDING = "embedding"
+_LLM_RESPONSE = "llm_response"
 
 CREATE_TABLE_TRADE = f'''
     CREATE TABLE IF NOT EXISTS {_TRADE} (
@@ -38,6 +55,7 @@ CREATE_TABLE_POLYMARKET_EVENT = f'''
         ticker TEXT,
         slug TEXT,
         title TEXT,
+        description TEXT,
         start_date INTEGER,
         created_at INTEGER,
         end_date INTEGER,
@@ -210,13 +228,53 @@ CREATE_TABLE_USER_POSITION = f'''
     );
 '''
 
+CREATE_INDEX_POLYMARKET_EVENT_ID = f'''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_{_POLYMARKET_EVENT}_id ON {_POLYMARKET_EVENT} (id);
+'''
+
+CREATE_TABLE_SYNC_STATE = f'''
+    CREATE TABLE IF NOT EXISTS {_SYNC_STATE} (
+        name TEXT PRIMARY KEY,
+        high_water INTEGER,  -- max updatedAt (unix ms) seen by the last sync
+        synced_at INTEGER NOT NULL
+    );
+'''
+
+CREATE_TABLE_SETTLEMENT = f'''
+    CREATE TABLE IF NOT EXISTS {_SETTLEMENT} (
+        condition_id TEXT PRIMARY KEY,
+        payout_denominator INTEGER NOT NULL,
+        payout_numerators TEXT NOT NULL,  -- stored as JSON
+        checked_at INTEGER NOT NULL  -- unix timestamp of the last chain read
+    );
+'''
+
+CREATE_TABLE_EMBEDDING = f'''
+    CREATE TABLE IF NOT EXISTS {_EMBEDDING} (
+        model TEXT NOT NULL,
+        content_hash TEXT NOT NULL,  -- sha256 of the embedded text
+        vector BLOB NOT NULL,  -- packed float32
+        created_at INTEGER NOT NULL,
+        PRIMARY KEY (model, content_hash)
+    ) WITHOUT ROWID;
+'''
+
+CREATE_TABLE_LLM_RESPONSE = f'''
+    CREATE TABLE IF NOT EXISTS {_LLM_RESPONSE} (
+        cache_key TEXT PRIMARY KEY,  -- sha256 of model, sampling params and prompt
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at INTEGER NOT NULL
+    );
+'''
+
 INSERT_TRADE_TABLE = f"""
     INSERT INTO {_TRADE} (
         id, taker_order_id, market, asset_id, side, size, fee_rate_bps, price, status,
         match_time, last_update, outcome, maker_address, owner, transaction_hash,
         bucket_index, maker_orders, type
     )
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 """
 
 INSERT_ACTIVITY_USER_TABLE = f"""
@@ -287,4 +345,222 @@ INSERT_VALUE_USER_TABLE = f"""
         user, 
         value
     ) values (?, ?)
-"""
\ No newline at end of file
+"""
+
+UPSERT_SETTLEMENT_TABLE = f"""
+    INSERT INTO {_SETTLEMENT} (
+        condition_id,
+        payout_denominator,
+        payout_numerators,
+        checked_at
+    ) VALUES (?, ?, ?, ?)
+    ON CONFLICT(condition_id) DO UPDATE SET
+        payout_denominator = excluded.payout_denominator,
+        payout_numerators = excluded.payout_numerators,
+        checked_at = excluded.checked_at
+"""
+
+UPSERT_POLYMARKET_EVENT_TABLE = f"""
+    INSERT INTO {_POLYMARKET_EVENT} (
+        id, ticker, slug, title, description, start_date, created_at, end_date,
+        image, icon, active, closed, archived, new, featured, restricted,
+        liquidity, volume, updated_at_date, volume_24hr, enable_order_book,
+        liquidity_clob, comment_count, markets, tags
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        ticker = excluded.ticker,
+        slug = excluded.slug,
+        title = excluded.title,
+        description = excluded.description,
+        start_date = excluded.start_date,
+        created_at = excluded.created_at,
+        end_date = excluded.end_date,
+        image = excluded.image,
+        icon = excluded.icon,
+        active = excluded.active,
+        closed = excluded.closed,
+        archived = excluded.archived,
+        new = excluded.new,
+        featured = excluded.featured,
+        restricted = excluded.restricted,
+        liquidity = excluded.liquidity,
+        volume = excluded.volume,
+        updated_at_date = excluded.updated_at_date,
+        volume_24hr = excluded.volume_24hr,
+        enable_order_book = excluded.enable_order_book,
+        liquidity_clob = excluded.liquidity_clob,
+        comment_count = excluded.comment_count,
+        markets = excluded.markets,
+        tags = excluded.tags
+    WHERE excluded.updated_at_date IS NOT {_POLYMARKET_EVENT}.updated_at_date
+"""
+
+UPSERT_MARKET_TABLE = f"""
+    INSERT INTO {_MARKET} (
+        id, question, condition_id, slug, end_date, liquidity, start_date,
+        description, outcome, outcome_prices, volume, active, closed, updated_at,
+        archived, restricted, question_id, enable_order_book, clob_token_ids,
+        accepting_orders, neg_risk, funded, rewards_min_size, rewards_max_spread,
+        spread
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        question = excluded.question,
+        condition_id = excluded.condition_id,
+        slug = excluded.slug,
+        end_date = excluded.end_date,
+        liquidity = excluded.liquidity,
+        start_date = excluded.start_date,
+        description = excluded.description,
+        outcome = excluded.outcome,
+        outcome_prices = excluded.outcome_prices,
+        volume = excluded.volume,
+        active = excluded.active,
+        closed = excluded.closed,
+        updated_at = excluded.updated_at,
+        archived = excluded.archived,
+        restricted = excluded.restricted,
+        question_id = excluded.question_id,
+        enable_order_book = excluded.enable_order_book,
+        clob_token_ids = excluded.clob_token_ids,
+        accepting_orders = excluded.accepting_orders,
+        neg_risk = excluded.neg_risk,
+        funded = excluded.funded,
+        rewards_min_size = excluded.rewards_min_size,
+        rewards_max_spread = excluded.rewards_max_spread,
+        spread = excluded.spread
+"""
+
+UPSERT_SYNC_STATE_TABLE = f"""
+    INSERT INTO {_SYNC_STATE} (name, high_water, synced_at) VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        high_water = excluded.high_water,
+        synced_at = excluded.synced_at
+"""
+
+# natural keys for the data-api tables. rows that predate the keys may be
+# duplicated, the DEDUPE_* statements keep the latest copy before indexing
+DEDUPE_ACTIVITY_USER_TABLE = f"""
+    DELETE FROM {_ACTIVITY_USER}
+    WHERE id NOT IN (
+        SELECT MAX(id) FROM {_ACTIVITY_USER} GROUP BY transactionHash, asset, side
+    )
+"""
+
+CREATE_INDEX_ACTIVITY_USER_KEY = f'''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_{_ACTIVITY_USER}_key
+    ON {_ACTIVITY_USER} (transactionHash, asset, side);
+'''
+
+NORMALIZE_ACTIVITY_USER_WALLET = f"""
+    UPDATE {_ACTIVITY_USER} SET proxy_wallet = lower(proxy_wallet)
+    WHERE proxy_wallet != lower(proxy_wallet)
+"""
+
+# copy-trading reads filter on wallet/side and a timestamp window
+CREATE_INDEX_ACTIVITY_USER_WALLET_SIDE_TS = f'''
+    CREATE INDEX IF NOT EXISTS idx_{_ACTIVITY_USER}_wallet_side_ts
+    ON {_ACTIVITY_USER} (proxy_wallet, side, timestamp);
+'''
+
+CREATE_INDEX_ACTIVITY_USER_SIDE_TS = f'''
+    CREATE INDEX IF NOT EXISTS idx_{_ACTIVITY_USER}_side_ts
+    ON {_ACTIVITY_USER} (side, timestamp);
+'''
+
+DEDUPE_USER_POSITION_TABLE = f"""
+    DELETE FROM {_USER_POSITION}
+    WHERE id NOT IN (
+        SELECT MAX(id) FROM {_USER_POSITION} GROUP BY proxyWallet, asset
+    )
+"""
+
+CREATE_INDEX_USER_POSITION_KEY = f'''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_{_USER_POSITION}_key
+    ON {_USER_POSITION} (proxyWallet, asset);
+'''
+
+UPSERT_ACTIVITY_USER_TABLE = INSERT_ACTIVITY_USER_TABLE.rstrip().rstrip(";") + f"""
+    ON CONFLICT(transactionHash, asset, side) DO UPDATE SET
+        proxy_wallet = excluded.proxy_wallet,
+        timestamp = excluded.timestamp,
+        conditionId = excluded.conditionId,
+        type = excluded.type,
+        size = excluded.size,
+        usdcSize = excluded.usdcSize,
+        price = excluded.price,
+        outcomeIndex = excluded.outcomeIndex,
+        title = excluded.title,
+        slug = excluded.slug,
+        icon = excluded.icon,
+        event_slug = excluded.event_slug,
+        outcome = excluded.outcome,
+        name = excluded.name,
+        pseudonym = excluded.pseudonym,
+        bio = excluded.bio,
+        profile_image = excluded.profile_image,
+        profile_image_optimized = excluded.profile_image_optimized
+    WHERE (
+        excluded.proxy_wallet, excluded.timestamp, excluded.conditionId, excluded.type,
+        excluded.size, excluded.usdcSize, excluded.price, excluded.outcomeIndex,
+        excluded.title, excluded.slug, excluded.icon, excluded.event_slug, excluded.outcome,
+        excluded.name, excluded.pseudonym, excluded.bio, excluded.profile_image,
+        excluded.profile_image_optimized
+    ) IS NOT (
+        proxy_wallet, timestamp, conditionId, type, size, usdcSize, price, outcomeIndex,
+        title, slug, icon, event_slug, outcome, name, pseudonym, bio, profile_image,
+        profile_image_optimized
+    )
+"""
+
+UPSERT_USER_POSITION_TABLE = INSERT_USER_POSITION_TABLE.rstrip() + f"""
+    ON CONFLICT(proxyWallet, asset) DO UPDATE SET
+        conditionId = excluded.conditionId,
+        size = excluded.size,
+        avgPrice = excluded.avgPrice,
+        initialValue = excluded.initialValue,
+        currentValue = excluded.currentValue,
+        cashPnl = excluded.cashPnl,
+        percentPnl = excluded.percentPnl,
+        totalBought = excluded.totalBought,
+        realizedPnl = excluded.realizedPnl,
+        percentRealizedPnl = excluded.percentRealizedPnl,
+        curPrice = excluded.curPrice,
+        redeemable = excluded.redeemable,
+        mergeable = excluded.mergeable,
+        title = excluded.title,
+        slug = excluded.slug,
+        icon = excluded.icon,
+        eventSlug = excluded.eventSlug,
+        outcome = excluded.outcome,
+        outcomeIndex = excluded.outcomeIndex,
+        oppositeOutcome = excluded.oppositeOutcome,
+        oppositeAsset = excluded.oppositeAsset,
+        endDate = excluded.endDate,
+        negativeRisk = excluded.negativeRisk
+    WHERE (
+        excluded.conditionId, excluded.size, excluded.avgPrice, excluded.initialValue,
+        excluded.currentValue, excluded.cashPnl, excluded.percentPnl, excluded.totalBought,
+        excluded.realizedPnl, excluded.percentRealizedPnl, excluded.curPrice,
+        excluded.redeemable, excluded.mergeable, excluded.title, excluded.slug, excluded.icon,
+        excluded.eventSlug, excluded.outcome, excluded.outcomeIndex, excluded.oppositeOutcome,
+        excluded.oppositeAsset, excluded.endDate, excluded.negativeRisk
+    ) IS NOT (
+        conditionId, size, avgPrice, initialValue, currentValue, cashPnl, percentPnl,
+        totalBought, realizedPnl, percentRealizedPnl, curPrice, redeemable, mergeable,
+        title, slug, icon, eventSlug, outcome, outcomeIndex, oppositeOutcome, oppositeAsset,
+        endDate, negativeRisk
+    )
+"""
+
+INSERT_EMBEDDING_TABLE = f"""
+    INSERT OR IGNORE INTO {_EMBEDDING} (model, content_hash, vector, created_at)
+    VALUES (?, ?, ?, ?)
+"""
+
+UPSERT_LLM_RESPONSE_TABLE = f"""
+    INSERT INTO {_LLM_RESPONSE} (cache_key, model, response, created_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(cache_key) DO UPDATE SET
+        response = excluded.response,
+        created_at = excluded.created_at
+"""
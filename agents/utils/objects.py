@@ -47,6 +47,33 @@ class SimpleMarket(BaseModel):
     question_id: str
 
 
+class TradeCandidate(BaseModel):
+    """
+    a market evaluated by the superforecaster, ranked by edge
+
+    attributes:
+        market_id (int): gamma market id
+        question (str): market question
+        outcome (str): outcome the forecast is for
+        forecast (float): forecast probability of `outcome`
+        price (float): current market price of `outcome`
+        edge (float): forecast - price for a BUY, price - forecast for a SELL
+        side (str): BUY or SELL
+        size (float): fraction of funds from the trade answer
+        trade (str): raw forecast and trade completion
+    """
+    market_id: int
+    question: str
+    outcome: str
+    forecast: float
+    price: float
+    edge: float
+    side: str
+    size: float
+    trade: str
+    market: Optional[dict] = None
+
+
 class ClobReward(BaseModel):
     id: str  # returned as string in api but really an int?
     conditionId: str
@@ -213,6 +240,7 @@ class SimpleEvent(BaseModel):
     featured: bool
     restricted: bool
     markets: str
+    tags: str = ""
 
 
 class Source(BaseModel):
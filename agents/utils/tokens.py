@@ -0,0 +1,77 @@
+import functools
+
+from typing import Any, Callable, List, Optional
+
+from logger import logging
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# ollama models have no tiktoken encoding, cl100k is a close enough stand-in
+# for llama-family bpe vocabularies when budgeting prompts
+FALLBACK_ENCODING = "cl100k_base"
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoder(model: str):
+    """cached tiktoken encoder for `model`, None when tiktoken is unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    try:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        # the bpe file is downloaded on first use, offline hosts fall back to len // 4
+        logging.warning(
+            f"no tokenizer for {model} ({e}), estimating tokens from length"
+        )
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoder = get_encoder(model)
+    if encoder is None:
+        return len(text) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def pack_records(
+    records: List[Any],
+    budget: int,
+    model: str,
+    render: Callable[[Any], str] = str,
+    separator_tokens: int = 2,
+) -> List[List[Any]]:
+    """
+    first-fit decreasing bin packing of records into as few groups as possible,
+    each group costing at most `budget` tokens. a record larger than the budget
+    gets a group of its own
+    """
+    sized = sorted(
+        (
+            (count_tokens(render(r), model) + separator_tokens, i)
+            for i, r in enumerate(records)
+        ),
+        reverse=True,
+    )
+    bins = []  # [remaining budget, [record indexes]]
+    for cost, i in sized:
+        for b in bins:
+            if b[0] >= cost:
+                b[0] -= cost
+                b[1].append(i)
+                break
+        else:
+            if cost > budget:
+                logging.warning(
+                    f"record of {cost} tokens exceeds the {budget} token budget"
+                )
+            bins.append([budget - cost, [i]])
+    # keep the original record order inside each group
+    return [[records[i] for i in sorted(indexes)] for _, indexes in bins]
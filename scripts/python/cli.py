@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import typer
 from typing import Literal
 from typing_extensions import Annotated
@@ -10,7 +11,7 @@ from rich.console import Console
 from rich.prompt import Prompt
 from rich.table import Table
 
-from agents.polymarket.polymarket import Polymarket
+from agents.polymarket.polymarket import Polymarket, AsyncPolymarket
 from agents.connectors.chroma import PolymarketRAG
 from agents.connectors.news import News
 from agents.application.trade import Trader
@@ -25,6 +26,15 @@ newsapi_client = News()
 polymarket_rag = PolymarketRAG()
 
 
+def get_top_active_traders(limit: int) -> list:
+    """ leaderboard rows are enriched concurrently through AsyncPolymarket """
+    async def _fetch():
+        async with AsyncPolymarket(polymarket) as async_polymarket:
+            return await async_polymarket.get_top_active_traders(limit)
+
+    return asyncio.run(_fetch())
+
+
 @app.command()
 def get_all_markets(limit: int = 5, sort_by: str = "spread") -> None:
     """
@@ -82,7 +92,7 @@ def query_local_markets_rag(vector_db_directory: str, query: str) -> None:
 
 
 @app.command()
-def ask_superforecaster(event_title: str, market_question: str, outcome: str) -> None:
+def ask_superforecaster(event_title: str, market_question: str, outcome: str, stream: bool = False) -> None:
     """
     Ask a superforecaster about a trade
     """
@@ -91,9 +101,10 @@ def ask_superforecaster(event_title: str, market_question: str, outcome: str) ->
     )
     executor = Executor()
     response = executor.get_superforecast(
-        event_title=event_title, market_question=market_question, outcome=outcome
+        event_title=event_title, market_question=market_question, outcome=outcome, stream=stream
     )
-    print(f"Response:{response}")
+    if not stream:
+        print(f"Response:{response}")
 
 
 @app.command()
@@ -107,13 +118,14 @@ def create_market() -> None:
 
 
 @app.command()
-def ask_llm(user_input: str) -> None:
+def ask_llm(user_input: str, stream: bool = False) -> None:
     """
     Ask a question to the LLM and get a response.
     """
     executor = Executor()
-    response = executor.get_llm_response(user_input)
-    print(f"LLM Response: {response}")
+    response = executor.get_llm_response(user_input, stream=stream)
+    if not stream:
+        print(f"LLM Response: {response}")
 
 
 @app.command()
@@ -131,15 +143,15 @@ def run_autonomous_trader() -> None:
     """
     Let an autonomous system trade for you.
     """
-    trader = Trader()
-    trader.one_best_trade()
+    with Trader() as trader:
+        trader.one_best_trade()
 
 @app.command()
 def top_traders(limit: int=50) -> None:
     """
     Find top active traders by cumulative profit margin and current value
     """
-    top_traders = polymarket.get_top_active_traders(limit)
+    top_traders = get_top_active_traders(limit)
     table = Table(title="Top Traders on Polymarket")
 
     table.add_column("Name")
@@ -189,7 +201,7 @@ def addr_callback(ctx: typer.Context, value: str):
     ) as progress:
         progress.add_task(description="Fetching top traders...", total=None)
         
-        top_traders = polymarket.get_top_active_traders(30)
+        top_traders = get_top_active_traders(30)
         progress.add_task(description="Validating address...", total=None)
         if value not in [trader.proxyWallet for trader in top_traders]:
             raise typer.BadParameter("Proxy address is not top 100 traders on Polymarket.")
@@ -218,8 +230,8 @@ def copy_trader(
     """
     Copy a trader’s activity for the given time window.
     """
-    trader = Trader()
-    trader.copy_trader(addr, epoch)
+    with Trader() as trader:
+        trader.copy_trader(addr, epoch)
 
 
 
@@ -4,20 +4,17 @@ from agents.application.trade import Trader
 def get_user_activity_test(db: PolymarketDb, user: str):    
     pm = Polymarket()
     activity_user = pm.get_proxy_addr_activity(proxy_address=user, limit=1000)
-    for activity in activity_user:
-        db.write_activity_user(activity)
+    db.write_activity_users(activity_user)
 
 def get_user_positions_test(db: PolymarketDb, user: str) -> None:
     pm = Polymarket()
     user_position = pm.get_proxy_addr_positions(proxy_address=user)
-    for position in user_position:
-        db.write_user_position(position)
+    db.write_user_positions(user_position)
 
 def get_traded_user_test(db: PolymarketDb, user: str) -> None:
     pm = Polymarket()
     traded_user = pm.get_proxy_addr_traded_user(user)
-    for trades in traded_user:
-        db.write_traded_user(trades)
+    db.write_traded_user(traded_user)
 
 def get_all_markets_test():
     pm = Polymarket()
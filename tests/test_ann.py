@@ -0,0 +1,119 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from agents.connectors.ann import VectorIndex, hnswlib
+
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.vectors = rng.normal(size=(300, 16)).astype(np.float32)
+        self.ids = [str(i) for i in range(300)]
+
+    def _exact(self, query, k, allowed=None):
+        matrix = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        distances = 1 - matrix @ (query / np.linalg.norm(query))
+        order = [
+            int(i)
+            for i in np.argsort(distances)
+            if allowed is None or str(i) in allowed
+        ]
+        return [str(i) for i in order[:k]]
+
+    def _check(self, use_hnsw):
+        index = VectorIndex.build(
+            self.ids, self.vectors, payloads=self.ids, use_hnsw=use_hnsw
+        )
+        query = self.vectors[42] + 0.01
+        self.assertEqual(
+            [i for i, _ in index.search(query, k=5)], self._exact(query, 5)
+        )
+
+        allowed = {str(i) for i in range(0, 300, 3)}
+        self.assertEqual(
+            [i for i, _ in index.search(query, k=5, allowed_ids=allowed)],
+            self._exact(query, 5, allowed),
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            loaded = VectorIndex.load(directory, use_hnsw=use_hnsw)
+            self.assertEqual(loaded.search(query, k=5), index.search(query, k=5))
+            self.assertEqual(loaded.payloads, self.ids)
+            if not use_hnsw:
+                self.assertIsInstance(loaded.matrix, np.memmap)
+
+    def _check_updates(self, use_hnsw):
+        index = VectorIndex.build(
+            self.ids[:200],
+            self.vectors[:200],
+            payloads=self.ids[:200],
+            use_hnsw=use_hnsw,
+        )
+        rng = np.random.default_rng(11)
+        # move five vectors, add the remaining hundred, drop ten
+        self.vectors[:5] = rng.normal(size=(5, 16))
+        index.upsert(
+            self.ids[:5] + self.ids[200:],
+            np.vstack([self.vectors[:5], self.vectors[200:]]),
+            payloads=self.ids[:5] + self.ids[200:],
+        )
+        removed = [str(i) for i in range(100, 110)]
+        index.remove(removed)
+        live = set(self.ids) - set(removed)
+
+        self.assertEqual(len(index), 290)
+        for target in (2, 42, 250):
+            query = self.vectors[target] + 0.01
+            self.assertEqual(
+                [i for i, _ in index.search(query, k=5)], self._exact(query, 5, live)
+            )
+        self.assertEqual(index.payload("250"), "250")
+
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            loaded = VectorIndex.load(directory, use_hnsw=use_hnsw)
+            self.assertEqual(len(loaded), 290)
+            self.assertNotIn("105", loaded)
+            query = self.vectors[104] + 0.01
+            self.assertEqual(loaded.search(query, k=5), index.search(query, k=5))
+            # a memmapped snapshot can be updated and saved over itself
+            loaded.upsert(["105"], self.vectors[105:106], payloads=["105"])
+            loaded.save(directory)
+            self.assertIn("105", VectorIndex.load(directory, use_hnsw=use_hnsw))
+
+    def test_brute_force(self):
+        self._check(use_hnsw=False)
+        self._check_updates(use_hnsw=False)
+
+    @unittest.skipIf(hnswlib is None, "hnswlib not installed")
+    def test_hnsw(self):
+        self._check(use_hnsw=True)
+        self._check_updates(use_hnsw=True)
+
+    def test_upserts_grow_the_matrix_in_place(self):
+        index = VectorIndex.build(self.ids[:1], self.vectors[:1], use_hnsw=False)
+        capacities = [len(index._buffer)]
+        for i in range(1, 300):
+            index.upsert([self.ids[i]], self.vectors[i : i + 1])
+            self.assertTrue(np.shares_memory(index.matrix, index._buffer))
+            if len(index._buffer) != capacities[-1]:
+                capacities.append(len(index._buffer))
+        # capacity doubles instead of growing by the rows of each upsert
+        self.assertEqual(capacities, [1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.assertEqual(index.matrix.shape, (300, 16))
+        query = self.vectors[123] + 0.01
+        self.assertEqual(
+            [i for i, _ in index.search(query, k=5)], self._exact(query, 5)
+        )
+
+    def test_empty(self):
+        self.assertEqual(
+            VectorIndex.build([], [], use_hnsw=False).search([1.0, 0.0]), []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
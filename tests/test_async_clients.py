@@ -0,0 +1,140 @@
+import asyncio
+import unittest
+
+import httpx
+
+from agents.polymarket.gamma import AsyncGammaMarketClient
+from agents.polymarket.polymarket import AsyncPolymarket, Polymarket
+from agents.polymarket.transport import AsyncHttpTransport
+
+
+class FakeApi:
+    """async MockTransport handler, tracks how many requests overlap"""
+
+    def __init__(self, routes, delay=0.01):
+        self.routes = routes
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            for prefix, route in self.routes.items():
+                if str(request.url).startswith(prefix):
+                    return httpx.Response(200, json=route(request.url.params))
+            return httpx.Response(404, json={})
+        finally:
+            self.in_flight -= 1
+
+
+def _transport(api):
+    return AsyncHttpTransport(http2=False, transport=httpx.MockTransport(api))
+
+
+MARKETS = [{"id": i, "question": f"q{i}"} for i in range(1, 251)]
+
+
+def _markets(params):
+    ids = params.get_list("id")
+    if ids:
+        return [m for m in MARKETS if str(m["id"]) in ids]
+    offset, limit = int(params.get("offset", 0)), int(params["limit"])
+    return MARKETS[offset : offset + limit]
+
+
+class TestAsyncGammaMarketClient(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeApi({"https://gamma-api.polymarket.com/markets": _markets})
+
+    def _run(self, concurrency, fn):
+        async def run():
+            async with AsyncGammaMarketClient(
+                _transport(self.api), concurrency=concurrency
+            ) as gamma:
+                return await fn(gamma)
+
+        return asyncio.run(run())
+
+    def test_batches_are_fetched_concurrently_within_the_bound(self):
+        markets = self._run(
+            3, lambda gamma: gamma.get_markets_by_ids(range(1, 101), batch_size=10)
+        )
+        self.assertEqual([m["id"] for m in markets], list(range(1, 101)))
+        self.assertEqual(len(self.api.requests), 10)
+        self.assertEqual(self.api.max_in_flight, 3)
+
+    def test_current_markets_are_paged_concurrently(self):
+        markets = self._run(10, lambda gamma: gamma.get_all_current_markets(limit=20))
+        self.assertEqual(markets, MARKETS)
+        self.assertGreater(self.api.max_in_flight, 1)
+
+    def test_iter_all_current_markets_is_an_async_generator(self):
+        async def collect(gamma):
+            return [m["id"] async for m in gamma.iter_all_current_markets(limit=100)]
+
+        self.assertEqual(self._run(4, collect), list(range(1, 251)))
+
+
+class TestAsyncPolymarket(unittest.TestCase):
+    def setUp(self):
+        leaderboard = [
+            {
+                "proxyWallet": f"0x{i}",
+                "amount": 1.0,
+                "pseudonym": f"p{i}",
+                "name": f"n{i}",
+                "bio": "",
+                "profileImage": "",
+                "profileImageOptimized": "",
+            }
+            for i in range(12)
+        ]
+        self.api = FakeApi(
+            {
+                "https://lb-api.polymarket.com/profit": lambda params: leaderboard,
+                "https://data-api.polymarket.com/value": lambda params: [
+                    {"user": params["user"], "value": int(params["user"][2:]) * 100}
+                ],
+                "https://data-api.polymarket.com/traded": lambda params: {
+                    "user": params["user"],
+                    "traded": 7,
+                },
+            }
+        )
+        # only the endpoint attributes are used, skip the wallet/web3 setup
+        polymarket = Polymarket.__new__(Polymarket)
+        polymarket.gamma_markets_endpoint = "https://gamma-api.polymarket.com/markets"
+        polymarket.gamma_events_endpoint = "https://gamma-api.polymarket.com/events"
+        polymarket.data_api_url = "https://data-api.polymarket.com"
+        polymarket.data_api_trade = "/traded"
+        polymarket.data_api_value = "/value"
+        polymarket.data_api_positions = "/positions"
+        polymarket.data_api_activity = "/activity"
+        polymarket.lb_api_url = "https://lb-api.polymarket.com"
+        polymarket.lb_api_profit = "/profit"
+        self.polymarket = polymarket
+
+    def test_top_active_traders_fan_out_within_the_bound(self):
+        async def run():
+            async with AsyncPolymarket(
+                self.polymarket, _transport(self.api), concurrency=4
+            ) as client:
+                return await client.get_top_active_traders(limit=12, threshold=500)
+
+        traders = asyncio.run(run())
+        self.assertEqual(
+            [t.proxyWallet for t in traders], [f"0x{i}" for i in range(6, 12)]
+        )
+        self.assertTrue(all(t.trades == 7 for t in traders))
+        # 1 leaderboard request plus value and traded per row
+        self.assertEqual(len(self.api.requests), 25)
+        self.assertEqual(self.api.max_in_flight, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,356 @@
+import tempfile
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from agents.connectors.ann import VectorIndex
+from agents.connectors.chroma import (
+    BM25Index,
+    PolymarketRAG,
+    market_filter,
+    matches_where,
+    reciprocal_rank_fusion,
+)
+from agents.utils.objects import SimpleEvent
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _event(id, description, markets="1,2"):
+    return SimpleEvent(
+        id=id,
+        ticker="t",
+        slug="s",
+        title="title",
+        description=description,
+        end="2099-01-01",
+        active=True,
+        closed=False,
+        archived=False,
+        restricted=False,
+        new=False,
+        featured=False,
+        markets=markets,
+    )
+
+
+def _market(
+    id,
+    active=True,
+    end="2099-01-01T00:00:00Z",
+    liquidity=1000.0,
+    spread=0.01,
+    tags=None,
+    closed=False,
+):
+    return {
+        "id": id,
+        "question": "?",
+        "description": f"market {id}",
+        "active": active,
+        "closed": closed,
+        "end": end,
+        "liquidity": liquidity,
+        "spread": spread,
+        "clob_token_ids": None,
+        "tags": tags,
+        "outcomes": "['Yes', 'No']",
+        "outcome_prices": "['0.5', '0.5']",
+    }
+
+
+class TestPersistentCollections(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = CountingEmbeddings()
+        self.rag = PolymarketRAG(
+            local_db_directory=self.tmp.name, embedding_function=self.embeddings
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_changed_descriptions_are_embedded(self):
+        events = [_event(i, f"event number {i}") for i in range(5)]
+        self.rag.events(events, "query")
+        self.assertEqual(len(self.embeddings.embedded), 5)
+
+        self.embeddings.embedded.clear()
+        events[2] = _event(2, "rewritten description")
+        events[3] = _event(3, "event number 3", markets="7")
+        docs = self.rag.events(events, "query")
+        self.assertEqual(self.embeddings.embedded, ["rewritten description"])
+        self.assertTrue(all(doc.metadata["id"] in range(5) for doc, _ in docs))
+
+        store = self.rag._store(self.rag.events_directory, "events")
+        self.assertEqual(store.get(ids=["3"])["metadatas"][0]["markets"], "7")
+
+    def test_events_collection_tracks_current_universe(self):
+        self.rag.events([_event(i, f"event {i}") for i in range(4)], "query")
+        docs = self.rag.events([_event(1, "event 1"), _event(3, "event 3")], "query")
+
+        store = self.rag._store(self.rag.events_directory, "events")
+        self.assertEqual(sorted(store.get(include=[])["ids"]), ["1", "3"])
+        self.assertEqual(sorted(doc.metadata["id"] for doc, _ in docs), [1, 3])
+
+    def test_markets_query_is_scoped_to_the_cycle(self):
+        markets = [_market(i) for i in range(6)]
+        self.rag.markets(markets, "query")
+        docs = self.rag.markets(markets[:2], "query")
+        self.assertEqual(len(self.embeddings.embedded), 6)
+        self.assertEqual(sorted(doc.metadata["id"] for doc, _ in docs), [0, 1])
+
+
+class TestMarketFilters(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rag = PolymarketRAG(
+            local_db_directory=self.tmp.name, embedding_function=CountingEmbeddings()
+        )
+        self.markets = [
+            _market(0),
+            _market(1, active=False),
+            _market(2, end="2000-01-01T00:00:00Z"),
+            _market(3, liquidity=10.0),
+            _market(4, spread=0.2, tags=[{"slug": "politics"}]),
+            _market(5, tags=[{"slug": "sports"}]),
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _ids(self, where=None):
+        return sorted(
+            doc.metadata["id"]
+            for doc, _ in self.rag.markets(self.markets, "query", where=where)
+        )
+
+    def test_default_excludes_dead_markets(self):
+        self.assertEqual(self._ids(), [0, 3, 4, 5])
+
+    def test_liquidity_spread_and_tags(self):
+        self.assertEqual(
+            self._ids(market_filter(min_liquidity=100, max_spread=0.05)), [0, 5]
+        )
+        self.assertEqual(self._ids(market_filter(tags=["politics", "sports"])), [4, 5])
+
+    def _stored_ids(self):
+        store = self.rag._store(self.rag.markets_directory, "markets")
+        return sorted(int(i) for i in store.get(include=[])["ids"])
+
+    def test_untradeable_markets_are_pruned(self):
+        self._ids()
+        self.assertEqual(self._stored_ids(), [0, 3, 4, 5])
+        # market 3 closes, market 4 is no longer in the cycle but still stored
+        self.markets = [_market(0), _market(3, closed=True), _market(5)]
+        self.assertEqual(self._ids(), [0, 5])
+        self.assertEqual(self._stored_ids(), [0, 4, 5])
+        for doc, _ in self.rag.hybrid_markets(self.markets, "market", k=4):
+            self.assertNotEqual(doc.metadata["id"], 3)
+        if self.rag.use_ann:
+            index = self.rag.ann_index(self.rag.markets_directory, "markets")
+            self.assertNotIn("3", index)
+            self.assertEqual(len(index), 3)
+
+
+class TestHybridRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = CountingEmbeddings()
+        self.rag = PolymarketRAG(
+            local_db_directory=self.tmp.name, embedding_function=self.embeddings
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bm25_ranks_rare_terms_higher(self):
+        index = BM25Index()
+        index.add(1, "election results in the senate race")
+        index.add(2, "bitcoin price above 100k")
+        index.add(3, "senate vote on bitcoin bill")
+        self.assertEqual([i for i, _ in index.search("bitcoin price")], [2, 3])
+        index.remove(2)
+        self.assertEqual([i for i, _ in index.search("bitcoin price")], [3])
+
+    def test_rrf_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+        self.assertEqual(fused[0][0], "b")
+
+    def test_only_the_lexical_shortlist_is_embedded(self):
+        events = [_event(i, f"filler text number {i}") for i in range(50)]
+        events[7] = _event(7, "will the fed cut interest rates")
+        events[9] = _event(9, "fed chair testimony on rates")
+
+        docs = self.rag.hybrid_events(events, "fed rates", k=2, shortlist=5)
+        self.assertEqual(sorted(doc.metadata["id"] for doc, _ in docs), [7, 9])
+        self.assertEqual(
+            sorted(self.embeddings.embedded),
+            sorted([events[7].description, events[9].description]),
+        )
+        self.assertEqual(docs[0][0].metadata["markets"], "1,2")
+
+    def test_cold_collection_embeds_at_most_the_shortlist(self):
+        events = [_event(i, f"filler text number {i}") for i in range(50)]
+        self.rag.hybrid_events(events, "filler number", shortlist=10)
+        self.assertEqual(len(self.embeddings.embedded), 10)
+
+        # no lexical match at all, the vector fallback is capped too
+        self.embeddings.embedded.clear()
+        fresh = [_event(i, f"unrelated words {i}") for i in range(100, 150)]
+        docs = self.rag.hybrid_events(fresh, "zebra", k=3, shortlist=10)
+        self.assertEqual(len(self.embeddings.embedded), 10)
+        self.assertEqual(len(docs), 3)
+
+    def test_bm25_index_follows_the_collection(self):
+        events = [_event(i, f"event {i}") for i in range(3)]
+        self.rag.hybrid_events(events, "query")
+        index = self.rag.lexical_index(
+            self.rag._store(self.rag.events_directory, "events")
+        )
+        self.assertEqual(len(index), 3)
+
+        self.rag.hybrid_events([_event(0, "bitcoin halving"), events[1]], "query")
+        self.assertEqual(len(index), 2)
+        self.assertEqual([i for i, _ in index.search("bitcoin")], ["0"])
+
+    def test_hybrid_markets_respect_filters(self):
+        markets = [_market(0), _market(1, active=False)]
+        markets[1]["description"] = markets[0]["description"] = "ethereum etf approval"
+        docs = self.rag.hybrid_markets(markets, "ethereum etf")
+        self.assertEqual([doc.metadata["id"] for doc, _ in docs], [0])
+
+
+class UnitEmbeddings(CountingEmbeddings):
+    """unit vectors, so chroma's l2 ranking equals the ann index's cosine ranking"""
+
+    def _vector(self, text):
+        vector = super()._vector(text)
+        norm = sum(v * v for v in vector) ** 0.5
+        return [v / norm for v in vector]
+
+
+class TestAnnIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = UnitEmbeddings()
+        self.rag = PolymarketRAG(
+            local_db_directory=self.tmp.name,
+            embedding_function=self.embeddings,
+            use_ann=True,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ann_matches_chroma(self):
+        events = [_event(i, f"event number {i} " + "x" * i) for i in range(20)]
+        ann = self.rag.events(events, "event number 7 xxxxxxx")
+        self.rag.use_ann = False
+        exact = self.rag.events(events, "event number 7 xxxxxxx")
+        self.assertEqual(
+            [d.metadata["id"] for d, _ in ann], [d.metadata["id"] for d, _ in exact]
+        )
+
+    def test_snapshot_is_updated_in_place(self):
+        events = [_event(i, f"event {i}") for i in range(5)]
+        self.rag.events(events, "event")
+        reopened = PolymarketRAG(
+            local_db_directory=self.tmp.name,
+            embedding_function=self.embeddings,
+            use_ann=True,
+        )
+        index = reopened.ann_index(reopened.events_directory, "events")
+        self.assertEqual(len(index), 5)
+
+        reopened.events(events[:3] + [_event(3, "event 3 rewritten")], "event")
+        self.assertIs(reopened.ann_index(reopened.events_directory, "events"), index)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.payload("3")[0], "event 3 rewritten")
+
+        # a metadata-only change keeps every vector and only swaps the payload
+        matrix = index.matrix
+        reopened.events(
+            events[:3] + [_event(3, "event 3 rewritten", markets="9")], "event"
+        )
+        self.assertIs(index.matrix, matrix)
+        self.assertEqual(index.payload("3")[1]["markets"], "9")
+
+        fresh = PolymarketRAG(
+            local_db_directory=self.tmp.name,
+            embedding_function=self.embeddings,
+            use_ann=True,
+        )
+        self.assertEqual(len(fresh.ann_index(fresh.events_directory, "events")), 4)
+
+    def test_snapshot_is_saved_once_per_call(self):
+        events = [_event(i, f"event {i}") for i in range(5)]
+        self.rag.events(events, "event")
+        index = self.rag.ann_index(self.rag.events_directory, "events")
+        saves = []
+        save = index.save
+        index.save = lambda directory: saves.append(save(directory))
+        self.rag.events(events[:4] + [_event(5, "event 5")], "event")
+        # an upsert and a prune, written together
+        self.assertEqual(len(saves), 1)
+
+        # writes outside a retrieval call wait for save_ann / close
+        store = self.rag._store(self.rag.events_directory, "events")
+        self.rag.delete_documents(store, ["5"])
+        directory = self.rag._ann_directory(self.rag.events_directory, "events")
+        self.assertFalse(VectorIndex.exists(directory))
+        self.rag.close()
+        self.assertEqual(len(saves), 2)
+        self.assertEqual(len(VectorIndex.load(directory)), 4)
+
+    def test_writes_without_ann_drop_the_snapshot(self):
+        self.rag.events([_event(i, f"event {i}") for i in range(5)], "event")
+        plain = PolymarketRAG(
+            local_db_directory=self.tmp.name, embedding_function=self.embeddings
+        )
+        plain.events([_event(i, f"event {i}") for i in range(2)], "event")
+
+        reopened = PolymarketRAG(
+            local_db_directory=self.tmp.name,
+            embedding_function=self.embeddings,
+            use_ann=True,
+        )
+        self.assertEqual(
+            len(reopened.ann_index(reopened.events_directory, "events")), 2
+        )
+
+
+class TestAnnMarketFilters(TestMarketFilters):
+    """the filtered market path gives the same answers on the ann index"""
+
+    def setUp(self):
+        super().setUp()
+        self.rag.use_ann = True
+
+    def test_filters_run_on_the_ann_index(self):
+        self._ids()
+        self.assertIn((self.rag.markets_directory, "markets"), self.rag._ann)
+        self.assertTrue(
+            matches_where(
+                {"a": 1, "b": "x"},
+                [{"a": {"$gte": 1}}, {"$or": [{"b": "y"}, {"b": "x"}]}],
+            )
+        )
+        self.assertFalse(matches_where({"a": 1}, [{"c": {"$lte": 5}}]))
+
+
+if __name__ == "__main__":
+    unittest.main()
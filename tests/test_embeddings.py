@@ -0,0 +1,101 @@
+import threading
+import time
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from agents.connectors.embeddings import BatchedEmbeddings, CachedEmbeddings
+from agents.connectors.polymarket_db import PolymarketDb
+
+
+class CountingEmbeddings(Embeddings):
+    model = "fake"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[len(t) / 3, 0.1] for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [len(text) / 3, 0.1]
+
+
+class SlowEmbeddings(CountingEmbeddings):
+    def __init__(self, fail_first=0):
+        super().__init__()
+        self.fail_first = fail_first
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            if self.fail_first:
+                self.fail_first -= 1
+                raise ConnectionError("endpoint busy")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self._lock:
+            self.in_flight -= 1
+        return super().embed_documents(texts)
+
+
+class TestBatchedEmbeddings(unittest.TestCase):
+    def test_batches_run_concurrently_and_keep_order(self):
+        embedder = SlowEmbeddings()
+        batched = BatchedEmbeddings(embedder, batch_size=3, max_workers=4)
+        texts = ["x" * i for i in range(1, 12)]
+
+        self.assertEqual(
+            batched.embed_documents(texts), [[len(t) / 3, 0.1] for t in texts]
+        )
+        self.assertEqual(sorted(len(c) for c in embedder.calls), [2, 3, 3, 3])
+        self.assertGreater(embedder.max_in_flight, 1)
+        self.assertEqual(batched.docs, 11)
+        self.assertGreater(batched.docs_per_sec(), 0)
+
+    def test_failed_batches_are_retried(self):
+        embedder = SlowEmbeddings(fail_first=2)
+        batched = BatchedEmbeddings(embedder, batch_size=2, max_workers=2, backoff=0)
+        self.assertEqual(len(batched.embed_documents(["a", "b", "c"])), 3)
+        self.assertEqual(batched.retries, 2)
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.db = PolymarketDb(":memory:")
+        self.embedder = CountingEmbeddings()
+        self.cache = CachedEmbeddings(self.embedder, db=self.db)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_misses_are_batched_and_deduplicated(self):
+        vectors = self.cache.embed_documents(["a", "bb", "a", "ccc"])
+        self.assertEqual(self.embedder.calls, [["a", "bb", "ccc"]])
+        self.assertEqual(vectors[0], vectors[2])
+
+        again = self.cache.embed_documents(["ccc", "dddd", "a"])
+        self.assertEqual(self.embedder.calls[-1], ["dddd"])
+        self.assertEqual(again[0], vectors[3])
+
+    def test_survives_restart_through_sqlite(self):
+        vectors = self.cache.embed_documents(["x", "yy"])
+        cold = CachedEmbeddings(self.embedder, db=self.db)
+        self.assertEqual(cold.embed_documents(["yy", "x"]), vectors[::-1])
+        self.assertEqual(len(self.embedder.calls), 1)
+        self.assertEqual(cold.hit_ratio(), 1.0)
+
+    def test_keyed_by_model(self):
+        self.cache.embed_documents(["x"])
+        other = CachedEmbeddings(self.embedder, db=self.db, model="other")
+        other.embed_documents(["x"])
+        self.assertEqual(len(self.embedder.calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
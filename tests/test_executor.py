@@ -0,0 +1,427 @@
+import threading
+import time
+import unittest
+
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from langchain_core.documents import Document
+
+from agents.application.executor import Executor, parse_forecast, parse_trade_fields
+from agents.application.prompts import Prompter
+from agents.connectors.chroma import market_metadata
+from agents.connectors.llm_cache import LLMResponseCache
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.polymarket.polymarket import Polymarket
+
+
+class EchoLLM(LLM):
+    """answers with a short tag, tracks how many calls overlap"""
+
+    delay: float = 0.05
+    calls: List[str] = []
+    in_flight: int = 0
+    max_in_flight: int = 0
+    lock: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _call(
+        self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> str:
+        with self.lock:
+            self.calls.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return "merged" if "Analyst 1" in prompt else f"answer {len(self.calls)}"
+
+
+def _executor(token_limit=2000, cache=None):
+    executor = Executor.__new__(Executor)
+    executor.cache = cache
+    executor.bypass_cache = False
+    executor.temperature = 0.8
+    executor.prompter = Prompter()
+    executor.llm = EchoLLM(calls=[], lock=threading.Lock())
+    executor.model = "llama3.1"
+    executor.num_predict = 100
+    executor.token_limit = token_limit
+    executor.max_concurrency = 4
+    return executor
+
+
+class TestMapReduce(unittest.TestCase):
+    def test_chunks_run_concurrently_then_reduce(self):
+        executor = _executor()
+        chunks = [([{"id": i}], [{"id": i * 10}]) for i in range(4)]
+
+        start = time.perf_counter()
+        result = executor.map_reduce_polymarket(chunks, "which election market?")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(result, "merged")
+        self.assertEqual(len(executor.llm.calls), 5)
+        self.assertEqual(executor.llm.max_in_flight, 4)
+        # one concurrent round plus the reduce, not five serial calls
+        self.assertLess(elapsed, 5 * executor.llm.delay)
+
+    def test_single_chunk_skips_reduce(self):
+        executor = _executor()
+        self.assertEqual(executor.map_reduce_polymarket([([], [])], "q"), "answer 1")
+        self.assertEqual(len(executor.llm.calls), 1)
+
+    def test_reduce_in_rounds_when_answers_overflow(self):
+        executor = _executor(token_limit=900)
+        partials = ["p" * 1000 for _ in range(6)]
+        self.assertEqual(executor.reduce_answers(partials, "q"), "merged")
+        self.assertGreater(len(executor.llm.calls), 1)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.db = PolymarketDb(":memory:")
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_repeated_prompts_cost_no_inference(self):
+        executor = _executor(cache=LLMResponseCache(self.db))
+        first = executor.get_superforecast("event", "will it rain?", "Yes")
+        self.assertEqual(
+            executor.get_superforecast("event", "will it rain?", "Yes"), first
+        )
+        self.assertEqual(len(executor.llm.calls), 1)
+        self.assertEqual(executor.cache.stats()["hits"], 1)
+
+        executor.get_superforecast("event", "will it snow?", "Yes")
+        self.assertEqual(len(executor.llm.calls), 2)
+
+    def test_bypass_and_parameters(self):
+        executor = _executor(cache=LLMResponseCache(self.db))
+        executor._invoke("prompt")
+        executor._invoke("prompt", bypass=True)
+        executor.temperature = 0.0
+        executor._invoke("prompt")
+        self.assertEqual(len(executor.llm.calls), 3)
+
+    def test_persists_and_expires(self):
+        LLMResponseCache(self.db).put("k", "llama3.1", "cached answer")
+        self.assertEqual(LLMResponseCache(self.db).get("k"), "cached answer")
+        self.db.cursor.execute("UPDATE llm_response SET created_at = created_at - 100")
+        self.assertIsNone(LLMResponseCache(self.db, ttl=50).get("k"))
+
+    def test_expired_rows_are_purged_on_open(self):
+        cache = LLMResponseCache(self.db, ttl=50)
+        cache.put("old", "llama3.1", "stale")
+        cache.put("new", "llama3.1", "fresh")
+        self.db.cursor.execute(
+            "UPDATE llm_response SET created_at = created_at - 100 WHERE cache_key = 'old'"
+        )
+
+        LLMResponseCache(self.db, ttl=50)
+        self.db.cursor.execute("SELECT cache_key FROM llm_response")
+        self.assertEqual([r[0] for r in self.db.cursor.fetchall()], ["new"])
+
+
+class TokenLLM(LLM):
+    """streams a fixed answer token by token, counts tokens produced"""
+
+    answer: str = (
+        "price:0.55,\n size:0.1,\n side:BUY,\n" + "and then a long explanation " * 20
+    )
+    produced: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "token"
+
+    def _call(
+        self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> str:
+        return self.answer
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for i in range(0, len(self.answer), 3):
+            self.produced += 1
+            yield GenerationChunk(text=self.answer[i : i + 3])
+
+
+class TestStreaming(unittest.TestCase):
+    def test_parse_trade_fields(self):
+        self.assertIsNone(parse_trade_fields("price:0.5, size:0."))
+        self.assertIsNone(parse_trade_fields("price:0.5, size:0.1, side"))
+        self.assertEqual(
+            parse_trade_fields("price:'0.5', size:0.1, side: sell,"),
+            {"price": 0.5, "size": 0.1, "side": "SELL"},
+        )
+        # a finished answer may end on a number
+        answer = "side: BUY\nprice: 0.5\nsize: 0.1"
+        self.assertIsNone(parse_trade_fields(answer))
+        self.assertEqual(
+            parse_trade_fields(answer, final=True),
+            {"price": 0.5, "size": 0.1, "side": "BUY"},
+        )
+        # sentence punctuation after a number is not part of it
+        self.assertEqual(
+            parse_trade_fields("price: 0.52.\nsize: 0.1.\nside: BUY"),
+            {"price": 0.52, "size": 0.1, "side": "BUY"},
+        )
+
+    def test_stops_once_the_trade_is_parsed(self):
+        executor = _executor()
+        executor.llm = TokenLLM()
+        text = executor._stream("trade?", stop_when=parse_trade_fields, echo=False)
+
+        self.assertEqual(
+            parse_trade_fields(text), {"price": 0.55, "size": 0.1, "side": "BUY"}
+        )
+        self.assertLess(executor.llm.produced, len(TokenLLM().answer) // 3 // 4)
+
+    def test_streamed_answers_are_cached(self):
+        db = PolymarketDb(":memory:")
+        executor = _executor(cache=LLMResponseCache(db))
+        executor.llm = TokenLLM()
+        first = executor._stream("q", echo=False)
+        produced = executor.llm.produced
+        self.assertEqual(executor._stream("q", echo=False), first)
+        self.assertEqual(executor.llm.produced, produced)
+
+    def test_early_stopped_answers_are_cached_per_condition(self):
+        db = PolymarketDb(":memory:")
+        executor = _executor(cache=LLMResponseCache(db))
+        executor.llm = TokenLLM()
+        truncated = executor._stream("q", stop_when=parse_trade_fields, echo=False)
+        produced = executor.llm.produced
+        self.assertLess(len(truncated), len(TokenLLM().answer))
+
+        # the next cycle on the unchanged prompt costs no inference
+        self.assertEqual(
+            executor._stream("q", stop_when=parse_trade_fields, echo=False), truncated
+        )
+        self.assertEqual(executor.llm.produced, produced)
+        # a full-answer call is never served the truncated text
+        self.assertEqual(executor._invoke("q"), TokenLLM().answer)
+
+
+class MarketLLM(LLM):
+    """forecasts from a per-question table, trades BUY on the forecast outcome"""
+
+    forecasts: dict = {}
+    prompts: List[str] = []
+    lock: Any = None
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "market"
+
+    def _call(
+        self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> str:
+        with self.lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        if "genius trade" in prompt:
+            return "price:0.5,\n size:0.1,\n side:BUY,\n"
+        for question, answer in self.forecasts.items():
+            if question in prompt:
+                return answer
+        return "no idea"
+
+
+def _market_object(id, question, prices):
+    metadata = {
+        "id": id,
+        "question": question,
+        "outcomes": "['Yes', 'No']",
+        "outcome_prices": str(prices),
+    }
+    return (Document(page_content=f"about {question}", metadata=metadata), 0.1)
+
+
+class TestBestTrade(unittest.TestCase):
+    def test_parse_forecast(self):
+        self.assertEqual(
+            parse_forecast("I believe x has a likelihood `0.7` for outcome of `Yes`."),
+            (0.7, "Yes"),
+        )
+        self.assertEqual(
+            parse_forecast("a likelihood of 35% for outcome of No"), (0.35, "No")
+        )
+        self.assertIsNone(parse_forecast("no idea"))
+
+    def _pipelined(self, forecasts, events, k=5, llm=MarketLLM):
+        class Markets:
+            def __init__(self):
+                self.ranked = []
+
+            def hybrid_markets(self, markets, query, k=4):
+                # the running pool of fetched markets, untradeable ones never reach scoring
+                self.ranked.append(len(markets))
+                tradeable = [m for m in markets if m["question"] != "fog"]
+                return [
+                    _market_object(m["id"], m["question"], m["prices"])
+                    for m in tradeable
+                ][:k]
+
+        executor = _executor()
+        executor.chroma = Markets()
+        executor.llm = llm(lock=threading.Lock(), forecasts=forecasts, prompts=[])
+        executor.event_markets = events.get
+        return executor, executor.pipelined_best_trade(list(events), k=k)
+
+    def test_ranks_top_k_by_edge(self):
+        forecasts = {
+            "rain": "I believe rain has a likelihood `0.6` for outcome of `Yes`.",
+            "snow": "I believe snow has a likelihood `0.9` for outcome of `Yes`.",
+            "hail": "I believe hail has a likelihood `0.8` for outcome of `No`.",
+            "wind": "I believe wind has a likelihood `0.1` for outcome of `Yes`.",
+            "sleet": "I believe sleet has a likelihood `0.99` for outcome of `Yes`.",
+        }
+        events = {
+            "weather": [
+                {"id": 1, "question": "rain", "prices": ["0.5", "0.5"]},
+                {"id": 2, "question": "snow", "prices": ["0.7", "0.3"]},
+                {"id": 3, "question": "hail", "prices": ["0.6", "0.4"]},
+            ],
+            "winter": [
+                {"id": 4, "question": "wind", "prices": ["0.5", "0.5"]},
+                {"id": 5, "question": "fog", "prices": ["0.5", "0.5"]},
+                {"id": 6, "question": "sleet", "prices": ["0.1", "0.9"]},
+            ],
+        }
+        executor, best = self._pipelined(forecasts, events, k=5)
+
+        # re-ranked as each event arrives, the last pass sees every market
+        self.assertEqual(sorted(executor.chroma.ranked), [3, 6])
+        self.assertEqual(
+            (best.market_id, best.outcome, round(best.edge, 2)), (6, "Yes", 0.89)
+        )
+        self.assertGreater(executor.llm.max_in_flight, 1)
+
+    def test_only_the_top_k_are_scored(self):
+        forecasts = {
+            "sleet": "I believe sleet has a likelihood `0.99` for outcome of `Yes`."
+        }
+        markets = [
+            {"id": i, "question": q, "prices": ["0.1", "0.9"]}
+            for i, q in enumerate(["rain", "snow", "sleet"])
+        ]
+        executor, best = self._pipelined(forecasts, {"weather": markets}, k=2)
+
+        # sleet would win but ranks third, so it is never sent to the llm
+        self.assertIsNone(best)
+        self.assertFalse(any("sleet" in p for p in executor.llm.prompts))
+        self.assertTrue(any("snow" in p for p in executor.llm.prompts))
+
+    def test_scoring_overlaps_fetching(self):
+        forecasts = {
+            "rain": "I believe rain has a likelihood `0.9` for outcome of `Yes`."
+        }
+        markets = {
+            "weather": [{"id": 1, "question": "rain", "prices": ["0.5", "0.5"]}],
+            "winter": [{"id": 2, "question": "snow", "prices": ["0.5", "0.5"]}],
+        }
+        scoring = threading.Event()
+
+        class Events(dict):
+            def get(self, event):
+                # winter only arrives once weather's market is being scored
+                if event == "winter":
+                    scoring.wait(timeout=5)
+                return self[event]
+
+        class Recording(MarketLLM):
+            def _call(self, prompt, stop=None, **kwargs):
+                scoring.set()
+                return super()._call(prompt, stop, **kwargs)
+
+        started = time.perf_counter()
+        executor, best = self._pipelined(forecasts, Events(markets), llm=Recording)
+        self.assertLess(time.perf_counter() - started, 4)
+        self.assertEqual(best.market_id, 1)
+        self.assertTrue(any("snow" in p for p in executor.llm.prompts))
+
+    def test_nothing_actionable(self):
+        events = {"weather": [{"id": 1, "question": "rain", "prices": ["0.5", "0.5"]}]}
+        self.assertIsNone(self._pipelined({}, events)[1])
+
+
+# trimmed gamma /markets/{id} payload, the endpoint returns no tags
+GAMMA_MARKET = {
+    "id": "253591",
+    "question": "Will the Fed cut rates in September?",
+    "conditionId": "0x3b7f5c0a",
+    "slug": "fed-cut-september",
+    "endDate": "2099-09-18T00:00:00Z",
+    "liquidity": "52311.4",
+    "description": "Resolves Yes if the FOMC lowers the target range in September.",
+    "outcomes": '["Yes", "No"]',
+    "outcomePrices": '["0.62", "0.38"]',
+    "active": True,
+    "closed": False,
+    "funded": True,
+    "rewardsMinSize": 100,
+    "rewardsMaxSpread": 3.5,
+    "spread": 0.01,
+    "acceptingOrders": True,
+    "clobTokenIds": '["7154", "8211"]',
+}
+
+
+class TestEventMarkets(unittest.TestCase):
+    def setUp(self):
+        class Gamma:
+            def get_markets_by_ids(self, ids):
+                return [dict(GAMMA_MARKET, id=i) for i in ids]
+
+        self.executor = _executor()
+        self.executor.gamma = Gamma()
+        self.executor.polymarket = Polymarket.__new__(Polymarket)
+        metadata = {"id": 7, "markets": "253591,253592", "tags": "politics,fed-rates"}
+        self.event = (Document(page_content="fed", metadata=metadata), 0.1)
+
+    def test_markets_inherit_event_tags(self):
+        markets = self.executor.event_markets(self.event)
+        self.assertEqual([m["id"] for m in markets], [253591, 253592])
+        metadata = market_metadata(markets[0])
+        self.assertTrue(metadata["tag_politics"] and metadata["tag_fed-rates"])
+
+    def test_batched_mapping_keeps_tags_per_event(self):
+        other = (
+            Document(
+                page_content="nba", metadata={"id": 8, "markets": "9", "tags": "sports"}
+            ),
+            0.2,
+        )
+        markets = self.executor.map_filtered_events_to_markets([self.event, other])
+        self.assertEqual(
+            {m["id"]: m["tags"] for m in markets},
+            {
+                253591: ["politics", "fed-rates"],
+                253592: ["politics", "fed-rates"],
+                9: ["sports"],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
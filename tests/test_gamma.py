@@ -0,0 +1,86 @@
+import threading
+import unittest
+
+import httpx
+
+from agents.polymarket.gamma import GammaMarketClient
+from agents.polymarket.response_cache import ResponseCache
+from agents.polymarket.transport import HttpTransport
+
+
+class FakeGammaApi:
+    """serves /markets?id=.. and /markets/<id> from a dict, records every request"""
+
+    def __init__(self, markets):
+        self.markets = {str(m["id"]): m for m in markets}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.requests.append(request.url)
+        path = request.url.path.rstrip("/")
+        if path == "/markets":
+            ids = request.url.params.get_list("id")
+            return httpx.Response(
+                200, json=[self.markets[i] for i in ids if i in self.markets]
+            )
+        market = self.markets.get(path.rsplit("/", 1)[-1])
+        return httpx.Response(
+            200 if market else 404, json=market or {"error": "not found"}
+        )
+
+
+class TestMarketsByIds(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeGammaApi([{"id": i, "question": f"q{i}"} for i in range(1, 121)])
+        self.gamma = GammaMarketClient(
+            HttpTransport(http2=False, transport=httpx.MockTransport(self.api))
+        )
+
+    def test_batches_and_dedupes(self):
+        ids = ["3", 1, "2", "3", " 1", "999"] + list(range(4, 121))
+        markets = self.gamma.get_markets_by_ids(ids, batch_size=50)
+
+        self.assertEqual([m["id"] for m in markets], [3, 1, 2] + list(range(4, 121)))
+        # 120 unique ids (plus one unknown) in batches of 50
+        self.assertEqual(len(self.api.requests), 3)
+        self.assertEqual(
+            sum(len(u.params.get_list("id")) for u in self.api.requests), 121
+        )
+
+    def test_cached_markets_are_not_requested_again(self):
+        self.gamma.get_markets_by_ids([1, 2, 3])
+        self.gamma.get_market(4)
+        self.api.requests.clear()
+
+        markets = self.gamma.get_markets_by_ids([4, 3, 5])
+        self.assertEqual([m["id"] for m in markets], [4, 3, 5])
+        self.assertEqual([u.params.get_list("id") for u in self.api.requests], [["5"]])
+        self.assertEqual(self.gamma.get_market(1)["question"], "q1")
+        self.assertEqual(len(self.api.requests), 1)
+
+    def test_expired_markets_are_refetched(self):
+        self.gamma.market_cache.ttl = 0
+        self.gamma.get_markets_by_ids([1])
+        self.gamma.get_markets_by_ids([1])
+        self.assertEqual(len(self.api.requests), 2)
+
+    def test_id_lookups_bypass_the_response_cache(self):
+        cache = ResponseCache()
+        self.gamma.http.cache = cache
+        self.gamma.market_cache.ttl = 0
+        for _ in range(2):
+            self.gamma.get_markets_by_ids([1])
+            self.gamma.get_market(2)
+        self.assertEqual(len(self.api.requests), 4)
+        self.assertEqual(cache.snapshot(), {})
+
+        # listings still go through it
+        self.gamma.get_markets(querystring_params={"limit": 2})
+        self.gamma.get_markets(querystring_params={"limit": 2})
+        self.assertEqual(len(self.api.requests), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
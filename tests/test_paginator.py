@@ -0,0 +1,75 @@
+import threading
+import unittest
+
+from agents.polymarket.paginator import OffsetPaginator
+
+
+class FakeEndpoint:
+    def __init__(self, size, fail_offsets=()):
+        self.records = [{"id": str(i)} for i in range(size)]
+        self.fail_offsets = set(fail_offsets)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, offset, limit):
+        with self._lock:
+            self.calls.append((offset, limit))
+            if offset in self.fail_offsets:
+                self.fail_offsets.discard(offset)
+                raise ConnectionError("flaky page")
+        return self.records[offset : offset + limit]
+
+
+class TestOffsetPaginator(unittest.TestCase):
+    def test_fetches_everything_in_order(self):
+        endpoint = FakeEndpoint(1234)
+        items = OffsetPaginator(endpoint, page_size=100, window=4).fetch_all()
+
+        self.assertEqual(items, endpoint.records)
+        # windows of 4 pages end exactly on the short page at 1200
+        pages = sorted(o for o, limit in endpoint.calls)
+        self.assertEqual(pages, list(range(0, 1300, 100)))
+
+    def test_small_universe_needs_no_probing(self):
+        endpoint = FakeEndpoint(250)
+        self.assertEqual(
+            OffsetPaginator(endpoint, page_size=100).fetch_all(), endpoint.records
+        )
+        # the first page plus at most one speculative window, all full-size requests
+        self.assertTrue(all(limit == 100 for _, limit in endpoint.calls))
+        self.assertLessEqual(len(endpoint.calls), 1 + 8)
+
+    def test_single_short_page(self):
+        endpoint = FakeEndpoint(42)
+        self.assertEqual(
+            OffsetPaginator(endpoint, page_size=100).fetch_all(), endpoint.records
+        )
+        self.assertEqual(endpoint.calls, [(0, 100)])
+
+    def test_exact_multiple_of_page_size(self):
+        endpoint = FakeEndpoint(300)
+        self.assertEqual(
+            OffsetPaginator(endpoint, page_size=100).fetch_all(), endpoint.records
+        )
+
+    def test_retries_failed_pages(self):
+        endpoint = FakeEndpoint(500, fail_offsets=[200, 400])
+        paginator = OffsetPaginator(endpoint, page_size=100, backoff=0)
+        self.assertEqual(paginator.fetch_all(), endpoint.records)
+
+    def test_deduplicates_by_key(self):
+        pages = {0: [{"id": "a"}, {"id": "b"}], 2: [{"id": "b"}], 3: []}
+        paginator = OffsetPaginator(
+            lambda offset, limit: pages.get(offset, [])[:limit], page_size=2
+        )
+        self.assertEqual(paginator.fetch_all(), [{"id": "a"}, {"id": "b"}])
+
+    def test_streams_first_page_before_the_rest(self):
+        endpoint = FakeEndpoint(1000)
+        first = next(OffsetPaginator(endpoint, page_size=100).iter_pages())
+        self.assertEqual(first, endpoint.records[:100])
+        self.assertEqual(endpoint.calls, [(0, 100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+
+from agents.application.pipeline import Pipeline, Stage
+
+
+def _sleeper(delay, fn=lambda x: x):
+    def run(item):
+        time.sleep(delay)
+        return fn(item)
+
+    return run
+
+
+class TestPipeline(unittest.TestCase):
+    def test_stages_overlap(self):
+        pipeline = Pipeline(
+            [
+                Stage("fetch", _sleeper(0.02), workers=2),
+                Stage("embed", _sleeper(0.02)),
+                Stage("score", _sleeper(0.02, lambda x: x * 10), workers=2),
+            ]
+        )
+        results = pipeline.run(range(10))
+
+        self.assertEqual(sorted(results), [i * 10 for i in range(10)])
+        # run one after another the stages would take 10 * 3 * 0.02s
+        self.assertLess(pipeline.wall, 0.45)
+        self.assertEqual([s.items for s in pipeline.stages], [10, 10, 10])
+        self.assertIn("score", pipeline.report())
+
+    def test_fan_out_drops_and_errors(self):
+        def explode(item):
+            if item == 3:
+                raise ValueError("bad item")
+            return item
+
+        pipeline = Pipeline(
+            [
+                Stage("split", lambda n: [n, n + 100, None], fan_out=True),
+                Stage("keep", lambda x: x if x % 2 else None, workers=3),
+                Stage("check", explode),
+            ]
+        )
+        results = pipeline.run([1, 2, 3])
+
+        self.assertEqual(sorted(results), [1, 101, 103])
+        self.assertEqual(pipeline.stages[0].outputs, 6)
+        self.assertEqual(pipeline.stages[2].errors, 1)
+
+    def test_bounded_queues_apply_backpressure(self):
+        produced = []
+        consumed = []
+        lag = []
+        lock = threading.Lock()
+
+        def source():
+            for i in range(20):
+                with lock:
+                    lag.append(len(produced) - len(consumed))
+                    produced.append(i)
+                yield i
+
+        def slow(item):
+            time.sleep(0.005)
+            with lock:
+                consumed.append(item)
+            return item
+
+        pipeline = Pipeline([Stage("slow", slow, queue_size=2)])
+        self.assertEqual(len(pipeline.run(source())), 20)
+        # queue of 2 plus the item in flight
+        self.assertLessEqual(max(lag), 4)
+
+    def test_batch_stage_sees_every_item_once(self):
+        batches = []
+
+        def top_two(items):
+            batches.append(len(items))
+            return sorted(items, reverse=True)[:2]
+
+        pipeline = Pipeline(
+            [
+                Stage(
+                    "fetch",
+                    _sleeper(0.005, lambda n: [n, n + 10]),
+                    workers=3,
+                    fan_out=True,
+                ),
+                Stage("rank", top_two, batch=True, fan_out=True),
+                Stage("score", lambda x: x * 2, workers=2),
+            ]
+        )
+        self.assertEqual(sorted(pipeline.run(range(5))), [26, 28])
+        self.assertEqual(batches, [10])
+        self.assertEqual(pipeline.stages[1].items, 1)
+
+        with self.assertRaises(ValueError):
+            Stage("rank", top_two, workers=2, batch=True)
+
+    def test_source_failure_still_drains(self):
+        def source():
+            yield 1
+            raise RuntimeError("feed broke")
+
+        pipeline = Pipeline([Stage("echo", lambda x: x, workers=2)])
+        self.assertEqual(pipeline.run(source()), [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
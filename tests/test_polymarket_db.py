@@ -0,0 +1,387 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+from agents.connectors.polymarket_db import PolymarketDb, PolymarketDbWriter
+from agents.connectors.polymarket_sync import PolymarketSync
+from agents.utils.objects import ActivityUser, TradedUser
+import agents.utils.consts as consts
+
+
+def _event(id, updated_at, closed=False):
+    return {
+        "id": str(id),
+        "ticker": f"t{id}",
+        "slug": f"s{id}",
+        "title": f"event {id}",
+        "description": f"description {id}",
+        "endDate": "2099-01-01T00:00:00Z",
+        "updatedAt": updated_at,
+        "active": True,
+        "closed": closed,
+        "archived": False,
+        "new": False,
+        "featured": False,
+        "restricted": False,
+        "markets": [{"id": str(id * 10), "question": "?", "updatedAt": updated_at}],
+    }
+
+
+def _activity(i, title="title", wallet="0xabc", side="BUY", condition=None):
+    return ActivityUser(
+        proxyWallet=wallet,
+        timestamp=1700000000 + i,
+        conditionId=condition or f"0xc{i}",
+        type="TRADE",
+        size=1.0,
+        usdcSize=0.5,
+        transactionHash=f"0xt{i}",
+        price=0.5,
+        asset=f"{i}",
+        side=side,
+        outcomeIndex=0,
+        title=title,
+        slug="s",
+        icon="i",
+        eventSlug="e",
+        outcome="Yes",
+        name="n",
+        pseudonym="p",
+        bio="",
+        profileImage="",
+        profileImageOptimized="",
+    )
+
+
+class FakeGamma:
+    def __init__(self, events):
+        self.events = events
+        self.requests = []
+
+    def get_events(self, querystring_params={}):
+        self.requests.append(dict(querystring_params))
+        events = self.events
+        if querystring_params.get("order") == "updatedAt":
+            events = sorted(events, key=lambda e: e["updatedAt"], reverse=True)
+        else:
+            events = [e for e in events if not e["closed"]]
+        offset = querystring_params["offset"]
+        return events[offset : offset + querystring_params["limit"]]
+
+
+class FailingCursor:
+    """raises a database level error on the n-th executemany"""
+
+    def __init__(self, cursor, fail_on):
+        self.cursor = cursor
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def executemany(self, sql, rows):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.cursor.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class TestConnectionProfile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "polymarket.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_tuned_profile(self):
+        db = PolymarketDb(self.path)
+        pragmas = db.read_pragmas()
+        self.assertEqual(pragmas["journal_mode"], "wal")
+        self.assertEqual(pragmas["synchronous"], 1)  # NORMAL
+        self.assertEqual(pragmas["temp_store"], 2)  # MEMORY
+        db.close()
+
+    def test_default_profile(self):
+        db = PolymarketDb(self.path, pragmas={})
+        self.assertEqual(
+            db.connection.execute("PRAGMA journal_mode").fetchone()[0], "delete"
+        )
+        db.close()
+
+    def test_reader_during_open_write(self):
+        writer = PolymarketDb(self.path)
+        writer.create_db_tables()
+        writer.write_activity_users([_activity(0)])
+        reader = PolymarketDb(self.path)
+
+        writer.cursor.execute("BEGIN IMMEDIATE")
+        writer.cursor.execute(
+            consts.INSERT_ACTIVITY_USER_TABLE, writer._activity_user_row(_activity(1))
+        )
+        # WAL readers see the last committed snapshot instead of blocking
+        self.assertEqual(len(reader.read_activity_user()), 1)
+        writer.connection.commit()
+        self.assertEqual(len(reader.read_activity_user()), 2)
+        reader.close()
+        writer.close()
+
+
+class TestBulkWrites(unittest.TestCase):
+    def setUp(self):
+        self.db = PolymarketDb(":memory:", chunk_size=3)
+        self.db.create_db_tables()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_write_activity_users(self):
+        inserted, skipped = self.db.write_activity_users(
+            _activity(i) for i in range(10)
+        )
+        self.assertEqual((inserted, skipped), (10, 0))
+        self.assertEqual(len(self.db.read_activity_user()), 10)
+
+    def test_bad_rows_are_skipped_not_fatal(self):
+        rows = [_activity(0), _activity(1, title="x" * 600), None, _activity(2)]
+        self.assertEqual(self.db.write_activity_users(rows), (2, 2))
+        self.assertEqual(len(self.db.read_activity_user()), 2)
+
+    def test_failing_chunk_rolls_back_the_whole_batch(self):
+        self.db.write_activity_users(_activity(i) for i in range(3))
+        self.db.cursor = FailingCursor(self.db.cursor, fail_on=2)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.write_activity_users(_activity(i) for i in range(10, 20))
+        self.db.cursor = self.db.cursor.cursor
+
+        # the first chunk of the failed batch was not committed on its own
+        self.assertFalse(self.db.connection.in_transaction)
+        self.assertEqual(len(self.db.read_activity_user()), 3)
+
+    def test_single_row_writers_delegate(self):
+        self.db.write_traded_user(TradedUser(user="0xabc", traded=3))
+        self.assertEqual(
+            self.db.write_traded_users([TradedUser(user="0xdef", traded=1)]), (1, 0)
+        )
+        self.db.cursor.execute("SELECT user, traded FROM traded_user ORDER BY user")
+        self.assertEqual(self.db.cursor.fetchall(), [("0xabc", 3), ("0xdef", 1)])
+        with self.assertRaises(ValueError):
+            self.db.write_activity_user(None)
+
+    def test_rewrites_are_idempotent(self):
+        self.db.write_activity_users(_activity(i) for i in range(5))
+        self.assertEqual(
+            self.db.write_activity_users(_activity(i) for i in range(5)), (0, 5)
+        )
+
+        changed = _activity(3).model_copy(update={"name": "renamed"})
+        self.assertEqual(self.db.write_activity_users([changed, _activity(5)]), (2, 0))
+        self.assertEqual(len(self.db.read_activity_user()), 6)
+
+    def test_existing_duplicates_are_collapsed(self):
+        db = PolymarketDb(":memory:")
+        db._init_activity_user = lambda: db.cursor.execute(
+            consts.CREATE_TABLE_ACTIVITY_USER
+        )
+        db.create_db_tables()
+        for _ in range(3):
+            db.cursor.execute(
+                consts.INSERT_ACTIVITY_USER_TABLE, db._activity_user_row(_activity(0))
+            )
+        del db._init_activity_user
+
+        db.create_db_tables()
+        self.assertEqual(len(db.read_activity_user()), 1)
+        self.assertEqual(db.write_activity_users([_activity(0)]), (0, 1))
+        db.close()
+
+
+class TestWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "polymarket.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_flush_makes_writes_visible(self):
+        with PolymarketDbWriter(self.path, max_queue=4, batch_size=50) as writer:
+            for i in range(20):
+                writer.write_activity_users([_activity(i), None])
+            writer.write_traded_users([TradedUser(user="0xabc", traded=3)])
+            writer.flush()
+            self.assertEqual((writer.written, writer.errors), (21, 0))
+
+            db = PolymarketDb(self.path)
+            self.assertEqual(len(db.read_activity_user()), 20)
+            db.close()
+
+    def test_close_drains_the_queue(self):
+        writer = PolymarketDbWriter(self.path)
+        writer.write_activity_users(_activity(i) for i in range(5))
+        writer.close()
+        self.assertEqual(writer.written, 5)
+        with self.assertRaises(ValueError):
+            writer.write_activity_users([_activity(6)])
+
+    def test_open_failure_is_raised_in_the_caller(self):
+        missing = os.path.join(self.tmp.name, "missing", "polymarket.db")
+        with self.assertRaises(sqlite3.OperationalError):
+            PolymarketDbWriter(missing)
+
+    def test_dead_writer_does_not_hang_callers(self):
+        writer = PolymarketDbWriter(self.path, poll_interval=0.01)
+        # a malformed item kills the drain loop
+        writer._queue.put("not a write")
+        writer._thread.join(5)
+        self.assertFalse(writer._thread.is_alive())
+
+        with self.assertRaises(RuntimeError):
+            writer.flush()
+        with self.assertRaises(RuntimeError):
+            writer.write_activity_users([_activity(0)])
+        writer.close()
+
+    def test_failed_batches_are_raised_from_flush(self):
+        def locked(db, rows):
+            raise sqlite3.OperationalError("database is locked")
+
+        with mock.patch.object(PolymarketDb, "write_user_positions", locked):
+            writer = PolymarketDbWriter(self.path)
+            writer.write_user_positions([object()])
+            writer.write_activity_users([_activity(0)])
+            with self.assertRaises(RuntimeError) as raised:
+                writer.flush(timeout=5)
+            self.assertIsInstance(raised.exception.__cause__, sqlite3.OperationalError)
+            self.assertEqual((writer.errors, writer.written), (1, 1))
+            # reported once, a later flush only covers new writes
+            writer.flush(timeout=5)
+
+            writer.write_user_positions([object()])
+            with self.assertRaises(RuntimeError):
+                writer.close()
+
+    def test_flush_times_out(self):
+        release = threading.Event()
+        slow = lambda db, rows: (release.wait(5), (len(rows), 0))[1]
+        with mock.patch.object(PolymarketDb, "write_activity_users", slow):
+            with PolymarketDbWriter(self.path, poll_interval=0.01) as writer:
+                writer.write_activity_users([_activity(0)])
+                with self.assertRaises(TimeoutError):
+                    writer.flush(timeout=0.05)
+                release.set()
+                writer.flush(timeout=5)
+                self.assertEqual(writer.written, 1)
+
+
+class TestActivityReads(unittest.TestCase):
+    def setUp(self):
+        self.db = PolymarketDb(":memory:")
+        self.db.create_db_tables()
+        self.db.write_activity_users(
+            [_activity(i, wallet="0xabc") for i in range(0, 10)]
+            + [_activity(i, wallet="0xdef") for i in range(10, 15)]
+            + [_activity(i, wallet="0xabc", side="SELL") for i in range(15, 20)]
+        )
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_filters_are_bound(self):
+        rows = list(
+            self.db.iter_activity_user(
+                proxy_wallet="0xabc", side="BUY", start=1700000004, batch_size=2
+            )
+        )
+        self.assertEqual([r.timestamp - 1700000000 for r in rows], [9, 8, 7, 6, 5])
+        rows = list(
+            self.db.iter_activity_user(side="BUY", start=1700000008, end=1700000011)
+        )
+        self.assertEqual([r.timestamp - 1700000000 for r in rows], [11, 10, 9])
+
+    def test_reads_use_index(self):
+        plan = self.db.cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM activity_user "
+            "WHERE proxy_wallet = ? AND side = ? AND timestamp > ? ORDER BY timestamp DESC",
+            ("0xabc", "BUY", 0),
+        ).fetchall()
+        self.assertIn(
+            "idx_activity_user_wallet_side_ts", " ".join(str(r) for r in plan)
+        )
+
+    def test_latest_per_condition(self):
+        self.db.write_activity_users([_activity(30, condition="0xc1")])
+        rows = self.db.read_activity_positions_by_user_timestamp(
+            1700000000, proxy_wallet="0xabc"
+        )
+        self.assertEqual(rows[0].timestamp, 1700000030)
+        self.assertEqual(len(rows), 9)
+
+    def test_wallets_are_stored_lowercase(self):
+        self.db.write_activity_users([_activity(40, wallet="0xAbCdEf")])
+        stored = self.db.cursor.execute(
+            "SELECT proxy_wallet FROM activity_user WHERE timestamp = ?", (1700000040,)
+        ).fetchone()
+        self.assertEqual(stored[0], "0xabcdef")
+        rows = self.db.read_activity_positions_by_user_timestamp(
+            1700000000, proxy_wallet="0xABCDEF"
+        )
+        self.assertEqual([r.timestamp for r in rows], [1700000040])
+
+
+class TestPolymarketSync(unittest.TestCase):
+    def setUp(self):
+        self.db = PolymarketDb(":memory:")
+        self.gamma = FakeGamma(
+            [_event(i, f"2024-07-01T00:00:0{i}.5Z") for i in range(1, 6)]
+        )
+        self.sync = PolymarketSync(self.db, self.gamma, page_size=2)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_full_then_delta(self):
+        self.assertEqual(self.sync.sync_events(), 5)
+        self.assertEqual(
+            [e.id for e in self.db.read_tradeable_events()], [1, 2, 3, 4, 5]
+        )
+
+        self.gamma.requests.clear()
+        self.gamma.events[1] = _event(2, "2024-07-02T00:00:00Z", closed=True)
+        self.gamma.events.append(_event(6, "2024-07-03T00:00:00Z"))
+
+        self.assertEqual(self.sync.sync_events(), 2)
+        self.assertEqual(
+            [e.id for e in self.db.read_tradeable_events()], [1, 3, 4, 5, 6]
+        )
+        # delta stops at the first page that reaches the high-water mark
+        self.assertEqual(len(self.gamma.requests), 2)
+
+    def test_warm_cycle_is_one_request(self):
+        self.sync.sync_events()
+        self.gamma.requests.clear()
+
+        self.assertEqual(self.sync.sync_events(), 0)
+        self.assertEqual(len(self.gamma.requests), 1)
+
+    def test_events_carry_tag_slugs(self):
+        self.gamma.events[0]["tags"] = [{"slug": "politics"}, {"slug": "elections"}]
+        self.sync.sync_events()
+        events = self.db.read_tradeable_events()
+        self.assertEqual([e.tags for e in events[:2]], ["politics,elections", ""])
+
+    def test_nested_markets_are_mirrored(self):
+        self.sync.sync_events()
+        self.db.cursor.execute("SELECT id FROM market ORDER BY id")
+        self.assertEqual(
+            [r[0] for r in self.db.cursor.fetchall()], [10, 20, 30, 40, 50]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
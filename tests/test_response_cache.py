@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+import httpx
+
+from agents.polymarket.response_cache import ResponseCache
+from agents.polymarket.transport import AsyncHttpTransport, HttpTransport
+
+
+GAMMA = "https://gamma-api.polymarket.com"
+TTLS = {GAMMA + "/markets": 60, GAMMA + "/events": 0.05}
+
+
+class FakeApi:
+    """answers with an etag per path, 304 when If-None-Match still matches"""
+
+    def __init__(self):
+        self.version = 1
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.requests.append(request)
+        etag = f'"v{self.version}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        body = {
+            "path": request.url.path,
+            "query": str(request.url.query, "ascii"),
+            "version": self.version,
+        }
+        return httpx.Response(200, json=body, headers={"ETag": etag})
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeApi()
+        self.cache = ResponseCache(ttls=TTLS)
+        self.http = HttpTransport(
+            http2=False, transport=httpx.MockTransport(self.api), cache=self.cache
+        )
+
+    def tearDown(self):
+        self.http.close()
+
+    def test_fresh_responses_skip_the_network(self):
+        first = self.http.get(
+            GAMMA + "/markets", params={"id": ["1", "2"], "active": True}
+        )
+        second = self.http.get(
+            GAMMA + "/markets", params={"id": ["1", "2"], "active": True}
+        )
+        self.http.get(GAMMA + "/markets", params={"id": ["3"]})
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second.json()["query"], "id=1&id=2&active=true")
+        self.assertEqual(len(self.api.requests), 2)
+        self.assertEqual(
+            self.cache.snapshot()[GAMMA + "/markets"],
+            {"hits": 1, "revalidated": 0, "misses": 2},
+        )
+        self.assertAlmostEqual(self.cache.hit_ratio(), 1 / 3)
+
+    def test_default_ttls_keep_order_state_short(self):
+        cache = ResponseCache()
+        for url in ("/markets?clob_token_ids=1", "/markets?id=1", "/markets/12"):
+            self.assertGreater(cache.ttl(GAMMA + url), 0)
+            self.assertLessEqual(cache.ttl(GAMMA + url), 30)
+        self.assertEqual(cache.ttl("https://clob.polymarket.com/markets/0xabc"), 0)
+        self.assertLessEqual(cache.ttl(GAMMA + "/events?limit=100"), 30)
+
+    def test_uncached_endpoints_always_go_out(self):
+        for _ in range(2):
+            self.http.get(
+                "https://data-api.polymarket.com/activity", params={"user": "0x1"}
+            )
+        self.assertEqual(len(self.api.requests), 2)
+        self.assertEqual(self.cache.snapshot(), {})
+
+    def test_stale_entries_are_revalidated(self):
+        self.http.get(GAMMA + "/events")
+        self.cache.get(GAMMA + "/events").expires_at = 0
+        response = self.http.get(GAMMA + "/events")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 1)
+        self.assertEqual(self.api.requests[-1].headers["If-None-Match"], '"v1"')
+        self.assertEqual(self.cache.revalidated[GAMMA + "/events"], 1)
+
+        self.api.version = 2
+        self.cache.get(GAMMA + "/events").expires_at = 0
+        self.assertEqual(self.http.get(GAMMA + "/events").json()["version"], 2)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(ttls=TTLS, maxsize=2)
+        with HttpTransport(
+            http2=False, transport=httpx.MockTransport(self.api), cache=cache
+        ) as http:
+            for market_id in ("1", "2", "3", "1"):
+                http.get(GAMMA + f"/markets/{market_id}")
+        self.assertEqual(len(self.api.requests), 4)
+        self.assertEqual(len(cache.lru), 2)
+
+    def test_persists_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "http.db")
+            for _ in range(2):
+                cache = ResponseCache(ttls=TTLS, path=path)
+                with HttpTransport(
+                    http2=False, transport=httpx.MockTransport(self.api), cache=cache
+                ) as http:
+                    self.assertEqual(
+                        http.get(GAMMA + "/markets/7").json()["path"], "/markets/7"
+                    )
+                cache.close()
+            self.assertEqual(len(self.api.requests), 1)
+
+    def test_async_transport(self):
+        cache = ResponseCache(ttls=TTLS)
+
+        async def run():
+            async with AsyncHttpTransport(
+                http2=False, transport=httpx.MockTransport(self.api), cache=cache
+            ) as http:
+                await http.get(GAMMA + "/markets", params={"limit": 2})
+                return await http.get(GAMMA + "/markets", params={"limit": 2})
+
+        self.assertEqual(asyncio.run(run()).json()["query"], "limit=2")
+        self.assertEqual(len(self.api.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
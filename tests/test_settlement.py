@@ -0,0 +1,211 @@
+import json
+import os
+import unittest
+
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from agents.connectors.polymarket_db import PolymarketDb
+from agents.polymarket.polymarket import Polymarket
+from agents.polymarket.settlement import SettlementCache, SettlementResolver
+
+
+CTF_ADDRESS = "0x4D97DCd97eC945f40cF65F87097ACe5EA0476045"
+CTF_ABI_PATH = os.path.join(os.path.dirname(__file__), "..", "ConditionalToken.json")
+
+SETTLED = "0x" + "11" * 32
+OPEN = "0x" + "22" * 32
+# readable with a plain eth_call but failing inside the multicall
+FLAKY = "0x" + "33" * 32
+# never readable
+BROKEN = "0x" + "44" * 32
+# header readable in the multicall, payout numerators only with a plain eth_call
+PARTIAL = "0x" + "55" * 32
+
+
+def _selector(signature: str) -> bytes:
+    return bytes(Web3.keccak(text=signature)[:4])
+
+
+class MulticallProvider(BaseProvider):
+    """answers Multicall3.aggregate3 eth_calls from an in-memory ctf state"""
+
+    conditions = {
+        bytes.fromhex(SETTLED[2:]): (1, [1, 0]),
+        bytes.fromhex(OPEN[2:]): (0, [0, 0]),
+        bytes.fromhex(FLAKY[2:]): (2, [0, 2]),
+        bytes.fromhex(PARTIAL[2:]): (1, [0, 1]),
+    }
+
+    def __init__(self, multicall_down=False):
+        super().__init__()
+        self.eth_calls = 0
+        self.direct_calls = 0
+        self.multicall_down = multicall_down
+
+    def _multicall_answer(self, call_data: bytes) -> tuple:
+        if bytes.fromhex(FLAKY[2:]) in call_data:
+            return (False, b"")
+        numerators = call_data[:4] == _selector("payoutNumerators(bytes32,uint256)")
+        if numerators and bytes.fromhex(PARTIAL[2:]) in call_data:
+            return (False, b"")
+        try:
+            return (True, self._answer(call_data))
+        except KeyError:
+            return (False, b"")
+
+    def _answer(self, call_data: bytes) -> bytes:
+        selector, args = call_data[:4], call_data[4:]
+        if selector == _selector("payoutDenominator(bytes32)"):
+            (condition_id,) = decode(["bytes32"], args)
+            return encode(["uint256"], [self.conditions[condition_id][0]])
+        if selector == _selector("getOutcomeSlotCount(bytes32)"):
+            (condition_id,) = decode(["bytes32"], args)
+            return encode(["uint256"], [len(self.conditions[condition_id][1])])
+        if selector == _selector("payoutNumerators(bytes32,uint256)"):
+            condition_id, i = decode(["bytes32", "uint256"], args)
+            return encode(["uint256"], [self.conditions[condition_id][1][i]])
+        raise ValueError("unexpected call")
+
+    def make_request(self, method, params):
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x89"}
+        if method == "eth_call":
+            data = bytes.fromhex(params[0]["data"][2:])
+            if params[0]["to"].lower() == CTF_ADDRESS.lower():
+                self.direct_calls += 1
+                result = self._answer(data)
+                return {"jsonrpc": "2.0", "id": 1, "result": "0x" + result.hex()}
+            self.eth_calls += 1
+            if self.multicall_down:
+                return {
+                    "jsonrpc": "2.0",
+                    "id": 1,
+                    "error": {"code": -32000, "message": "down"},
+                }
+            (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+            results = [self._multicall_answer(call_data) for _, _, call_data in calls]
+            result = encode(["(bool,bytes)[]"], [results])
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x" + result.hex()}
+        raise NotImplementedError(method)
+
+
+class TestSettlementResolver(unittest.TestCase):
+    def setUp(self):
+        self.provider = MulticallProvider()
+        w3 = Web3(self.provider)
+        with open(CTF_ABI_PATH) as f:
+            ctf = w3.eth.contract(address=CTF_ADDRESS, abi=json.load(f))
+        self.resolver = SettlementResolver(w3, ctf, chunk_size=3)
+
+    def test_resolve_batches_reads(self):
+        settlements = self.resolver.resolve([SETTLED, OPEN, SETTLED, None])
+
+        self.assertEqual(settlements, {SETTLED: (1, [1, 0]), OPEN: (0, [])})
+        # 4 header reads in chunks of 3 + 2 numerator reads in one chunk
+        self.assertEqual(self.provider.eth_calls, 3)
+
+    def test_is_settled(self):
+        self.assertTrue(self.resolver.is_settled(SETTLED))
+        self.assertFalse(self.resolver.is_settled(OPEN))
+
+    def test_failed_multicall_reads_fall_back_per_condition(self):
+        settlements = self.resolver.resolve([SETTLED, FLAKY, BROKEN])
+
+        self.assertEqual(settlements, {SETTLED: (1, [1, 0]), FLAKY: (2, [0, 2])})
+        self.assertTrue(self.resolver.is_settled(FLAKY))
+        # unreadable is unknown, not unsettled
+        self.assertIsNone(self.resolver.is_settled(BROKEN))
+
+    def test_failed_numerators_fall_back_per_condition(self):
+        settlements = self.resolver.resolve([SETTLED, PARTIAL])
+
+        self.assertEqual(settlements, {SETTLED: (1, [1, 0]), PARTIAL: (1, [0, 1])})
+        self.assertGreater(self.provider.direct_calls, 0)
+
+    def test_multicall_outage_falls_back_per_condition(self):
+        provider = MulticallProvider(multicall_down=True)
+        w3 = Web3(provider)
+        with open(CTF_ABI_PATH) as f:
+            ctf = w3.eth.contract(address=CTF_ADDRESS, abi=json.load(f))
+        resolver = SettlementResolver(w3, ctf)
+
+        self.assertEqual(
+            resolver.resolve([SETTLED, OPEN]), {SETTLED: (1, [1, 0]), OPEN: (0, [])}
+        )
+        self.assertGreater(provider.direct_calls, 0)
+
+    def test_resolve_empty(self):
+        self.assertEqual(self.resolver.resolve([]), {})
+        self.assertEqual(self.provider.eth_calls, 0)
+
+
+class TestSettlementCache(unittest.TestCase):
+    def setUp(self):
+        self.provider = MulticallProvider()
+        self.w3 = Web3(self.provider)
+        with open(CTF_ABI_PATH) as f:
+            self.ctf = self.w3.eth.contract(address=CTF_ADDRESS, abi=json.load(f))
+        self.db = PolymarketDb(":memory:")
+
+    def tearDown(self):
+        self.db.close()
+
+    def _resolver(self, unsettled_ttl):
+        cache = SettlementCache(self.db, unsettled_ttl=unsettled_ttl)
+        return SettlementResolver(self.w3, self.ctf, cache=cache)
+
+    def test_repeat_scan_skips_chain(self):
+        resolver = self._resolver(unsettled_ttl=60)
+        first = resolver.resolve([SETTLED, OPEN])
+        calls = self.provider.eth_calls
+
+        self.assertEqual(resolver.resolve([SETTLED, OPEN]), first)
+        self.assertEqual(self.provider.eth_calls, calls)
+
+    def test_partial_numerators_are_never_cached(self):
+        self._resolver(unsettled_ttl=60).resolve([PARTIAL])
+        cached = SettlementCache(self.db).get_many([PARTIAL])
+        self.assertEqual(cached, {PARTIAL: (1, [0, 1])})
+
+    def test_settled_conditions_survive_restart(self):
+        self._resolver(unsettled_ttl=0).resolve([SETTLED, OPEN])
+        calls = self.provider.eth_calls
+
+        # fresh LRU, same database: settled rows are permanent, open ones expired
+        settlements = self._resolver(unsettled_ttl=0).resolve([SETTLED, OPEN])
+        self.assertEqual(settlements[SETTLED], (1, [1, 0]))
+        self.assertEqual(self.provider.eth_calls, calls + 1)
+
+
+class FlakyBatchResolver:
+    """a batch read that errors, single reads that work (or raise)"""
+
+    def resolve(self, condition_ids):
+        condition_ids = list(condition_ids)
+        if len(condition_ids) > 1:
+            raise ConnectionError("rpc error")
+        if condition_ids[0] == BROKEN:
+            raise ConnectionError("rpc error")
+        return {SETTLED: {SETTLED: (1, [1, 0])}, OPEN: {OPEN: (0, [])}}.get(
+            condition_ids[0], {}
+        )
+
+    def is_settled(self, condition_id):
+        settlement = self.resolve([condition_id]).get(condition_id)
+        return None if settlement is None else settlement[0] > 0
+
+
+class TestPolymarketSettlements(unittest.TestCase):
+    def test_failed_batch_falls_back_per_market(self):
+        polymarket = Polymarket.__new__(Polymarket)
+        polymarket._settlement = FlakyBatchResolver()
+        markets = [{"conditionId": c} for c in (SETTLED, OPEN, BROKEN, FLAKY)]
+
+        # one failing market no longer drops the page, unknown ones are skipped
+        self.assertEqual(polymarket._unsettled(markets), [{"conditionId": OPEN}])
+
+
+if __name__ == "__main__":
+    unittest.main()
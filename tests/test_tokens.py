@@ -0,0 +1,36 @@
+import unittest
+
+from agents.utils.tokens import count_tokens, pack_records
+
+
+class TestPackRecords(unittest.TestCase):
+    model = "llama3.1"
+
+    def test_groups_fit_the_budget(self):
+        records = [
+            {"id": i, "description": "x" * (40 * (i % 7 + 1))} for i in range(60)
+        ]
+        budget = 400
+        groups = pack_records(records, budget, self.model)
+
+        self.assertEqual(sorted(r["id"] for g in groups for r in g), list(range(60)))
+        for group in groups:
+            self.assertLessEqual(
+                sum(count_tokens(str(r), self.model) + 2 for r in group), budget
+            )
+            self.assertEqual([r["id"] for r in group], sorted(r["id"] for r in group))
+
+        total = sum(count_tokens(str(r), self.model) + 2 for r in records)
+        # first-fit decreasing stays close to the lower bound
+        self.assertLessEqual(len(groups), -(-total // budget) + 1)
+
+    def test_oversized_record_gets_its_own_group(self):
+        groups = pack_records(["y" * 4000, "a", "b"], 100, self.model)
+        self.assertEqual(groups, [["y" * 4000], ["a", "b"]])
+
+    def test_empty(self):
+        self.assertEqual(pack_records([], 100, self.model), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agents.polymarket.transport import HttpTransport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/markets"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_keepalive_connection(self):
+        with HttpTransport(http2=False) as http:
+            for _ in range(3):
+                self.assertEqual(http.get(self.url).json(), [])
+
+            host = f"127.0.0.1:{self.server.server_port}"
+            self.assertEqual(http.stats.snapshot()[host], {"hits": 2, "misses": 1})
+            self.assertAlmostEqual(http.stats.hit_ratio(host), 2 / 3)
+
+    def test_no_keepalive_always_misses(self):
+        with HttpTransport(max_keepalive_connections=0, http2=False) as http:
+            http.get(self.url)
+            http.get(self.url)
+            self.assertEqual(http.stats.hit_ratio(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()